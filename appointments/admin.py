@@ -1,13 +1,79 @@
 from django.contrib import admin
-from .models import Appointment, MedicalRecord, TimeSlot, Review
+from .models import Appointment, AppointmentStatusChange, MedicalRecord, MedicalRecordAttachment, TimeSlot, Review
+from .paginators import EstimatedCountPaginator
+from users.models import DoctorProfile, UserProfile
+
+# Related rows each model's __str__ reads; they are selected together with
+# the object of a change form and the choices of foreign-key widgets
+STR_RELATED = {
+    Appointment: ('patient', 'doctor__user_profile__user'),
+    MedicalRecord: ('patient',),
+    TimeSlot: ('doctor__user_profile__user',),
+    Review: ('patient', 'doctor__user_profile__user'),
+    DoctorProfile: ('user_profile__user',),
+    UserProfile: ('user',),
+}
+
+
+class RelatedStrMixin:
+    """
+    Selects what __str__ needs for the admin's own objects and for the
+    objects shown in its foreign-key widgets
+    """
+
+    def get_queryset(self, request):
+        # The changelist skips list_select_related once anything is selected,
+        # so it is included here
+        related = STR_RELATED.get(self.model, ())
+        if isinstance(self.list_select_related, (list, tuple)):
+            related += tuple(self.list_select_related)
+        return super().get_queryset(request).select_related(*related)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        related = STR_RELATED.get(db_field.related_model)
+        if related and 'queryset' not in kwargs:
+            kwargs['queryset'] = db_field.related_model._default_manager.select_related(*related)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class AppointmentStatusChangeInline(admin.TabularInline):
+    model = AppointmentStatusChange
+    fields = ['from_status', 'to_status', 'changed_by', 'changed_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('changed_by')
+
+
+class MedicalRecordAttachmentInline(admin.TabularInline):
+    model = MedicalRecordAttachment
+    fields = ['filename', 'content_type', 'size', 'sha256', 'uploaded_by', 'created_at']
+    readonly_fields = fields
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('uploaded_by')
 
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(RelatedStrMixin, admin.ModelAdmin):
     list_display = ['patient', 'get_doctor_name', 'appointment_date', 'appointment_time', 'status', 'created_at']
     list_filter = ['status', 'appointment_date', 'created_at']
     search_fields = ['patient__username', 'patient__email', 'doctor__user_profile__user__username']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [AppointmentStatusChangeInline]
+    list_select_related = ['patient', 'doctor__user_profile__user']
+    autocomplete_fields = ['patient', 'doctor']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Appointment Details', {
@@ -28,11 +94,19 @@ class AppointmentAdmin(admin.ModelAdmin):
 
 
 @admin.register(MedicalRecord)
-class MedicalRecordAdmin(admin.ModelAdmin):
+class MedicalRecordAdmin(RelatedStrMixin, admin.ModelAdmin):
     list_display = ['patient', 'get_doctor_name', 'appointment', 'created_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['patient__username', 'doctor__user_profile__user__username', 'diagnosis']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [MedicalRecordAttachmentInline]
+    list_select_related = (
+        'patient', 'doctor__user_profile__user',
+        'appointment__patient', 'appointment__doctor__user_profile__user',
+    )
+    autocomplete_fields = ['patient', 'doctor', 'appointment']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Patient Information', {
@@ -56,10 +130,14 @@ class MedicalRecordAdmin(admin.ModelAdmin):
 
 
 @admin.register(TimeSlot)
-class TimeSlotAdmin(admin.ModelAdmin):
+class TimeSlotAdmin(RelatedStrMixin, admin.ModelAdmin):
     list_display = ['get_doctor_name', 'date', 'start_time', 'end_time', 'is_booked']
     list_filter = ['is_booked', 'date']
     search_fields = ['doctor__user_profile__user__username']
+    list_select_related = ['doctor__user_profile__user']
+    autocomplete_fields = ['doctor']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_doctor_name(self, obj):
         return f"Dr. {obj.doctor.user_profile.user.get_full_name()}"
@@ -67,11 +145,15 @@ class TimeSlotAdmin(admin.ModelAdmin):
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(RelatedStrMixin, admin.ModelAdmin):
     list_display = ['patient', 'get_doctor_name', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['patient__username', 'doctor__user_profile__user__username', 'comment']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['patient', 'doctor__user_profile__user']
+    autocomplete_fields = ['patient', 'doctor', 'appointment']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_doctor_name(self, obj):
         return f"Dr. {obj.doctor.user_profile.user.get_full_name()}"
@@ -0,0 +1,345 @@
+"""
+Medical record attachment storage.
+
+Files are stored on local disk by content (SHA-256) under ATTACHMENT_ROOT:
+
+    uploads/<upload id>.part     uploads in progress
+    blobs/<ab>/<cd>/<sha256>     finished files, one per distinct content
+
+An upload is started with its filename and total size, then sent in chunks
+that are written at their offset in the part file straight from the
+request stream, so a chunk is never held in memory whole. A client that
+loses its connection asks for the upload's offset and continues from
+there. When the last byte arrives the part file is hashed; if a blob with
+the same content already exists the part file is dropped and the new
+attachment points at the existing blob, so repeated uploads of a file take
+no extra disk.
+
+Blobs are not deleted with their last attachment, which would race with an
+upload of the same content finishing at the same time. purge_attachments
+removes unreferenced blobs (and abandoned uploads) after a grace period
+instead.
+
+Downloads stream the blob with FileResponse and honour single-range
+Range requests.
+"""
+import hashlib
+import os
+import re
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+
+from .models import AttachmentUpload, MedicalRecordAttachment
+
+CHUNK_SIZE = 1024 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UploadError(Exception):
+    """
+    Raised when a chunk doesn't fit the upload; status is the HTTP status
+    to answer with
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class LocalAttachmentStore:
+    """
+    Content-addressed attachment files on the local filesystem
+    """
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        if self._root is not None:
+            return str(self._root)
+        return str(getattr(settings, 'ATTACHMENT_ROOT', os.path.join(settings.DATA_DIR, 'attachments')))
+
+    def part_path(self, upload_id):
+        return os.path.join(self.root, 'uploads', f'{upload_id}.part')
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, 'blobs', sha256[:2], sha256[2:4], sha256)
+
+    def write(self, upload_id, offset, stream, length):
+        """
+        Copy length bytes from stream into the part file at offset and
+        return the number of bytes written (fewer if the stream ends early)
+        """
+        path = self.part_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+        written = 0
+        try:
+            while written < length:
+                chunk = stream.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                os.pwrite(fd, chunk, offset + written)
+                written += len(chunk)
+        finally:
+            os.close(fd)
+        return written
+
+    def digest(self, upload_id, size):
+        """
+        Return the SHA-256 of a complete part file
+        """
+        path = self.part_path(upload_id)
+        # Drop anything a failed chunk left past the end
+        os.truncate(path, size)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as part:
+            for chunk in iter(lambda: part.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def commit(self, upload_id, sha256):
+        """
+        Move a complete part file to its blob, or drop it if the blob exists
+        """
+        path = self.part_path(upload_id)
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            os.remove(path)
+            # Keeps the blob out of purge_attachments' grace period
+            os.utime(blob)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(path, blob)
+
+    def discard(self, upload_id):
+        try:
+            os.remove(self.part_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def open(self, sha256):
+        return open(self.blob_path(sha256), 'rb')
+
+    def blobs(self):
+        """
+        Yield (sha256, path, modified time) for every stored blob
+        """
+        for directory, _, filenames in os.walk(os.path.join(self.root, 'blobs')):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                yield filename, path, os.path.getmtime(path)
+
+
+attachment_store = LocalAttachmentStore()
+
+
+def get_max_size():
+    return getattr(settings, 'ATTACHMENT_MAX_SIZE', 2 * 1024 ** 3)
+
+
+def start_upload(record, filename, size, content_type=None, sha256='', uploaded_by_id=None):
+    if size > get_max_size():
+        raise UploadError(f'Attachments can be at most {get_max_size()} bytes', status=413)
+    return AttachmentUpload.objects.create(
+        record=record,
+        filename=os.path.basename(filename),
+        content_type=content_type or 'application/octet-stream',
+        size=size,
+        sha256=(sha256 or '').lower(),
+        uploaded_by_id=uploaded_by_id,
+    )
+
+
+def parse_content_range(header, size):
+    """
+    Return (offset, length) from a "bytes first-last/total" header
+    """
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError('Content-Range must be "bytes first-last/total"')
+    first, last, total = (int(value) for value in match.groups())
+    if total != size or last < first or last >= size:
+        raise UploadError(f'Content-Range does not fit an upload of {size} bytes', status=416)
+    return first, last - first + 1
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Append a chunk to an upload and return the upload, or the finished
+    MedicalRecordAttachment once the last byte has arrived
+
+    Chunks must start at the upload's current offset; a chunk that was cut
+    short still counts for the bytes that arrived.
+    """
+    if offset != upload.offset:
+        raise UploadError(f'Expected a chunk at offset {upload.offset}', status=409)
+    if stream is None:
+        raise UploadError('The chunk is empty')
+
+    with transaction.atomic():
+        # The row is locked at the offset the chunk starts at before anything
+        # is written, so of two clients sending the same chunk the second
+        # waits and then finds the upload moved on
+        try:
+            AttachmentUpload.objects.select_for_update().only('pk').get(pk=upload.pk, offset=offset)
+        except AttachmentUpload.DoesNotExist:
+            upload.refresh_from_db(fields=['offset'])
+            raise UploadError(f'Expected a chunk at offset {upload.offset}', status=409)
+
+        written = attachment_store.write(upload.id, offset, stream, length)
+        AttachmentUpload.objects.filter(pk=upload.pk).update(offset=offset + written, updated_at=timezone.now())
+    upload.offset = offset + written
+
+    if upload.offset < upload.size:
+        return upload
+    return finish_upload(upload)
+
+
+def finish_upload(upload):
+    sha256 = attachment_store.digest(upload.id, upload.size)
+    if upload.sha256 and upload.sha256 != sha256:
+        cancel_upload(upload)
+        raise UploadError('The uploaded file does not match its SHA-256; please upload it again', status=422)
+    attachment_store.commit(upload.id, sha256)
+
+    with transaction.atomic():
+        attachment = MedicalRecordAttachment.objects.create(
+            record_id=upload.record_id,
+            filename=upload.filename,
+            content_type=upload.content_type,
+            size=upload.size,
+            sha256=sha256,
+            uploaded_by_id=upload.uploaded_by_id,
+        )
+        upload.delete()
+    return attachment
+
+
+def cancel_upload(upload):
+    upload.delete()
+    attachment_store.discard(upload.id)
+
+
+def parse_range(header, size):
+    """
+    Return the (first, last) byte positions of a single "bytes=" range,
+    None to send the whole file, or raise ValueError if unsatisfiable
+    """
+    match = RANGE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        # Missing, malformed or multi-range headers get the whole file
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        raise ValueError
+    return first, last
+
+
+class RangeFile:
+    """
+    Read-only view of length bytes of a file starting at offset
+    """
+
+    def __init__(self, file, offset, length):
+        self.file = file
+        self.file.seek(offset)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class AttachmentResponse(FileResponse):
+    block_size = 64 * 1024
+
+
+def attachment_etag(attachment):
+    return f'"{attachment.sha256}"'
+
+
+def attachment_response(attachment, range_header=None, if_range=None, as_attachment=True):
+    """
+    Stream an attachment, or the part of it asked for by a Range header
+    """
+    etag = attachment_etag(attachment)
+    size = attachment.size
+    if if_range and if_range.strip() != etag:
+        # The client's copy is of other content: send it all again
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size) if range_header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = attachment_store.open(attachment.sha256)
+    if byte_range is None:
+        response = AttachmentResponse(
+            file, as_attachment=as_attachment, filename=attachment.filename,
+            content_type=attachment.content_type
+        )
+    else:
+        first, last = byte_range
+        response = AttachmentResponse(
+            RangeFile(file, first, last - first + 1), status=206, as_attachment=as_attachment,
+            filename=attachment.filename, content_type=attachment.content_type
+        )
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private'
+    return response
+
+
+def purge(upload_max_age, blob_grace):
+    """
+    Delete uploads untouched for upload_max_age and unreferenced blobs
+    older than blob_grace (both timedeltas); returns the two counts
+    """
+    stale = AttachmentUpload.objects.filter(updated_at__lt=timezone.now() - upload_max_age)
+    uploads = 0
+    for upload in stale.iterator():
+        cancel_upload(upload)
+        uploads += 1
+
+    cutoff = time.time() - blob_grace.total_seconds()
+    candidates = {sha256: path for sha256, path, modified in attachment_store.blobs() if modified < cutoff}
+    referenced = set()
+    hashes = list(candidates)
+    for offset in range(0, len(hashes), 500):
+        referenced.update(MedicalRecordAttachment.objects.filter(
+            sha256__in=hashes[offset:offset + 500]
+        ).values_list('sha256', flat=True))
+
+    blobs = 0
+    for sha256, path in candidates.items():
+        if sha256 not in referenced:
+            os.remove(path)
+            blobs += 1
+    return uploads, blobs
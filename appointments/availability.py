@@ -0,0 +1,194 @@
+"""
+In-memory availability index used for booking conflict checks.
+
+Each (doctor, date) pair maps to a 1440-bit integer where bit N is set when an
+active (PENDING/CONFIRMED) appointment starts at minute N of the day. A day is
+loaded from the database once and then kept in sync from the Appointment
+signals, so "is this slot free?" and "which slots are free?" are answered
+without a query on the hot booking path.
+
+The database stays the source of truth: entries expire after
+AVAILABILITY_INDEX_TTL seconds so that bookings made by other worker
+processes are picked up, and the unique constraint on Appointment still
+rejects any booking that slips through a stale entry.
+"""
+import threading
+import time as time_module
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+ACTIVE_STATUSES = ('PENDING', 'CONFIRMED')
+
+
+def get_slot_minutes():
+    return getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+
+def minute_of_day(value):
+    """
+    Return the bit position for a time, or None if it is not minute-aligned
+    """
+    if value.second or value.microsecond:
+        return None
+    return value.hour * 60 + value.minute
+
+
+def time_of_minute(minute):
+    return (datetime.min + timedelta(minutes=minute)).time()
+
+
+def schedule_minutes(doctor, date, slot_minutes=None):
+    """
+    Return the slot start minutes of a doctor's weekly schedule on a date
+    """
+    if date.strftime('%A') not in (doctor.available_days or []):
+        return []
+
+    slot_minutes = slot_minutes or get_slot_minutes()
+    start = _as_time(doctor.available_time_start)
+    end = _as_time(doctor.available_time_end)
+    first = start.hour * 60 + start.minute
+    last = end.hour * 60 + end.minute
+    return list(range(first, last - slot_minutes + 1, slot_minutes))
+
+
+def _as_time(value):
+    # TimeField defaults are declared as strings and stay that way on
+    # unsaved instances.
+    if isinstance(value, str):
+        return datetime.strptime(value, '%H:%M').time()
+    return value
+
+
+class AvailabilityIndex:
+    """
+    Bounded, thread-safe map of (doctor_id, date) -> occupancy bitmap
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'AVAILABILITY_INDEX_TTL', 60)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'AVAILABILITY_INDEX_MAX_ENTRIES', 50000)
+
+    def _load(self, doctor_id, date):
+        from .models import Appointment
+
+        bitmap = 0
+        times = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date=date,
+            status__in=ACTIVE_STATUSES
+        ).values_list('appointment_time', flat=True)
+        for value in times:
+            bitmap |= 1 << (value.hour * 60 + value.minute)
+        return bitmap
+
+    def _get(self, doctor_id, date):
+        key = (doctor_id, date)
+        now = time_module.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        bitmap = self._load(doctor_id, date)
+
+        with self._lock:
+            self._entries[key] = (bitmap, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return bitmap
+
+    def _update(self, doctor_id, date, minute, occupied):
+        key = (doctor_id, date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Not cached yet; the next lookup loads it from the database.
+                return
+            bitmap, expires = entry
+            if occupied:
+                bitmap |= 1 << minute
+            else:
+                bitmap &= ~(1 << minute)
+            self._entries[key] = (bitmap, expires)
+
+    def bitmap(self, doctor_id, date):
+        return self._get(doctor_id, date)
+
+    def is_free(self, doctor_id, date, time):
+        """
+        Check whether no active appointment starts at the given time
+        """
+        minute = minute_of_day(time)
+        if minute is None:
+            from .models import Appointment
+
+            return not Appointment.objects.filter(
+                doctor_id=doctor_id,
+                appointment_date=date,
+                appointment_time=time,
+                status__in=ACTIVE_STATUSES
+            ).exists()
+        return not (self._get(doctor_id, date) >> minute) & 1
+
+    def free_slots(self, doctor, date, slot_minutes=None):
+        """
+        List free slot start times for a doctor on a date
+        """
+        candidates = schedule_minutes(doctor, date, slot_minutes)
+        if not candidates:
+            return []
+
+        bitmap = self._get(doctor.id, date)
+        return [
+            time_of_minute(minute)
+            for minute in candidates
+            if not (bitmap >> minute) & 1
+        ]
+
+    def occupy(self, doctor_id, date, time):
+        minute = minute_of_day(time)
+        if minute is None:
+            self.invalidate(doctor_id, date)
+        else:
+            self._update(doctor_id, date, minute, True)
+
+    def release(self, doctor_id, date, time):
+        minute = minute_of_day(time)
+        if minute is None:
+            self.invalidate(doctor_id, date)
+        else:
+            self._update(doctor_id, date, minute, False)
+
+    def invalidate(self, doctor_id, date):
+        with self._lock:
+            self._entries.pop((doctor_id, date), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+availability_index = AvailabilityIndex()
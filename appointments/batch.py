@@ -0,0 +1,96 @@
+"""
+Batch appointment operations.
+
+apply_status_change() moves a set of appointments through the status state
+machine (appointments.transitions) in one transaction: the rows are read
+once, the allowed ones are written with a single UPDATE guarded by their
+current status, and the derived state is adjusted in bulk. Appointments
+that can't make the transition are reported per item and left untouched.
+
+book_appointments() books a list of appointments in one transaction with a
+savepoint per item, so one taken slot doesn't undo the rest.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .booking import book_appointment
+from .models import Appointment
+from .transitions import ACTIONS, STATE_FIELDS, apply_side_effects, check_role, sources
+
+MAX_BATCH_SIZE = 1000
+
+
+class BatchConflict(Exception):
+    """
+    Raised when rows changed between being read and being updated
+    """
+
+
+def _result(appointment_id, error=None, status=None):
+    if error:
+        return {'id': appointment_id, 'success': False, 'error': error}
+    return {'id': appointment_id, 'success': True, 'status': status}
+
+
+def apply_status_change(queryset, action, ids=None, notes=None, changed_by_id=None, role=None):
+    """
+    Apply a transitions.ACTIONS action to the appointments in queryset
+    (limited to ids if given) and return one result per appointment
+
+    queryset must already be scoped to what the user may see; ids outside
+    it are reported as not found. Raises TransitionNotPermitted if role may
+    not take the action.
+    """
+    check_role(action, role)
+    new_status = ACTIONS[action][0]
+    allowed = sources(new_status)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+
+    with transaction.atomic():
+        rows = {
+            row['id']: row
+            for row in queryset.order_by('id').select_for_update().values(*STATE_FIELDS)
+        }
+        targets = [row for row in rows.values() if row['status'] in allowed]
+
+        if targets:
+            changes = {'status': new_status, 'updated_at': timezone.now()}
+            if notes is not None:
+                changes['notes'] = notes
+            updated = Appointment.objects.filter(
+                id__in=[row['id'] for row in targets], status__in=allowed
+            ).update(**changes)
+            if updated != len(targets):
+                raise BatchConflict
+
+            apply_side_effects(targets, new_status, changed_by_id)
+
+    results = []
+    for appointment_id in (ids if ids is not None else rows):
+        row = rows.get(appointment_id)
+        if row is None:
+            results.append(_result(appointment_id, 'Not found'))
+        elif row['status'] not in allowed:
+            results.append(_result(appointment_id, f"Cannot {action} a {row['status'].lower()} appointment"))
+        else:
+            results.append(_result(appointment_id, status=new_status))
+    return results
+
+
+def book_appointments(items):
+    """
+    Book each item (a dict of Appointment fields) and return one result per
+    item; items that fail validation or hit a taken slot are skipped
+    """
+    results = []
+    with transaction.atomic():
+        for index, fields in enumerate(items):
+            try:
+                appointment = book_appointment(**fields)
+            except ValidationError as error:
+                results.append({'index': index, 'success': False, 'error': ' '.join(error.messages)})
+            else:
+                results.append({'index': index, 'success': True, 'id': appointment.id})
+    return results
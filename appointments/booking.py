@@ -0,0 +1,80 @@
+"""
+Contention-safe booking.
+
+A booking runs in one short transaction that first claims the doctor's
+TimeSlot with a conditional UPDATE (is_booked False -> True) and then
+inserts the appointment. The conditional UPDATE makes concurrent bookers of
+the same slot queue on its row, so only one of them can claim it, and the
+partial unique constraint on active (PENDING/CONFIRMED) appointments
+rejects any double booking that gets past it, including for times that have
+no TimeSlot row at all. Cancelled and completed appointments no longer
+block their slot.
+
+Slots are released again by the Appointment signals when an appointment
+is cancelled, moved or deleted.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .availability import ACTIVE_STATUSES
+from .models import Appointment, TimeSlot
+
+SLOT_TAKEN_MESSAGE = "This time slot is already booked"
+
+
+def claim_slot(doctor_id, date, time):
+    """
+    Mark the doctor's TimeSlot at date/time as booked
+
+    Returns whether a slot was claimed (False if the doctor has no TimeSlot
+    at that time) and raises ValidationError if it is already booked.
+    """
+    claimed = TimeSlot.objects.filter(
+        doctor_id=doctor_id, date=date, start_time=time, is_booked=False
+    ).update(is_booked=True)
+    if claimed:
+        return True
+    if TimeSlot.objects.filter(doctor_id=doctor_id, date=date, start_time=time).exists():
+        raise ValidationError(SLOT_TAKEN_MESSAGE)
+    return False
+
+
+def release_slot(doctor_id, date, time):
+    """
+    Mark the doctor's TimeSlot at date/time as free again
+    """
+    return TimeSlot.objects.filter(
+        doctor_id=doctor_id, date=date, start_time=time, is_booked=True
+    ).update(is_booked=False)
+
+
+def release_slots(slots, batch_size=300):
+    """
+    Set-based release_slot() for many (doctor_id, date, time) keys
+    """
+    slots = list(slots)
+    released = 0
+    for offset in range(0, len(slots), batch_size):
+        condition = Q()
+        for doctor_id, date, time in slots[offset:offset + batch_size]:
+            condition |= Q(doctor_id=doctor_id, date=date, start_time=time)
+        released += TimeSlot.objects.filter(condition, is_booked=True).update(is_booked=False)
+    return released
+
+
+def book_appointment(**fields):
+    """
+    Create an appointment and claim its time slot in one transaction
+
+    Raises ValidationError if the slot is taken or the appointment is
+    invalid; nothing is written in that case.
+    """
+    appointment = Appointment(**fields)
+    with transaction.atomic():
+        if appointment.status in ACTIVE_STATUSES:
+            claim_slot(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+            # Tells the post_save signal the slot is already claimed
+            appointment._slot_claimed = True
+        appointment.save()
+    return appointment
@@ -0,0 +1,102 @@
+"""
+Conditional GETs for user-scoped lists.
+
+Dashboards fetch the same appointment, record and review lists on every
+navigation. Viewsets using ConditionalListMixin tag those responses with a
+weak ETag computed from one aggregate over the filtered queryset, the
+latest updated_at and the row count, and answer a matching If-None-Match
+with 304 Not Modified before anything is serialized. The count is also
+handed to KeysetPagination, so a full response costs no extra query.
+
+Cursor pages and NDJSON streams are served without a validator: the
+aggregate covers the whole list, and running it on every keyset page would
+bring back the per-page COUNT that cursor mode exists to avoid.
+
+The tag also covers the requesting user, the full path (filters, page,
+?fields=) and the response media type, so it never matches another user's
+or another page's response. An edit bumps updated_at and a delete changes
+the count; changes to related rows (a doctor's name, say) do not, and show
+up once the list's own rows next change.
+"""
+import hashlib
+from functools import partial
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def list_validator(queryset):
+    """
+    Return (latest updated_at, row count) for a queryset in one query
+    """
+    values = queryset.order_by().aggregate(latest=Max('updated_at'), count=Count('pk'))
+    return values['latest'], values['count']
+
+
+def list_etag(request, latest, count):
+    """
+    Weak ETag for a list response with the given validator
+    """
+    media_type = getattr(request, 'accepted_media_type', '')
+    content = repr((request.user.pk, request.get_full_path(), media_type, latest and latest.isoformat(), count))
+    return 'W/"%s"' % hashlib.md5(content.encode(), usedforsecurity=False).hexdigest()
+
+
+def etag_matches(request, etag):
+    """
+    Weak comparison of etag with the request's If-None-Match
+    """
+    candidates = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in candidates:
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == opaque for candidate in candidates)
+
+
+class ConditionalListMixin:
+    """
+    Answers If-None-Match on a viewset's list (and list-like actions that
+    go through conditional_response) with 304 Not Modified; the model
+    needs an updated_at field
+    """
+
+    def conditional_response(self, queryset, build, paginated=True):
+        """
+        Return 304 if the client's copy of queryset's list is current,
+        else build()'s response; successful responses carry the ETag.
+        Pass paginated=False for actions that return the whole list
+        """
+        if not self.is_conditional(paginated):
+            return build()
+
+        latest, count = list_validator(queryset)
+        # Page-number pagination reuses the count instead of running its own
+        self.list_count = count
+        etag = list_etag(self.request, latest, count)
+        if etag_matches(self.request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def is_conditional(self, paginated=True):
+        """
+        Whether the response gets a validator: not for streams or cursor pages
+        """
+        if getattr(self, 'wants_stream', None) and self.wants_stream():
+            return False
+        if not paginated:
+            return True
+        wants_cursor = getattr(self.paginator, 'wants_cursor', None)
+        return not (wants_cursor and wants_cursor(self.request, self))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.filter_queryset(self.get_queryset()), partial(super().list, request, *args, **kwargs)
+        )
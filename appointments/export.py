@@ -0,0 +1,161 @@
+"""
+Streaming export of medical history.
+
+An export is the appointments, medical records and reviews in a scope (a
+patient, a doctor, or everything), written one section after the other.
+Every row is tagged with its type and refers to the others by id
+(appointment_id), so a section never has to be held in memory to be
+joined with another. Rows are read with values() and
+QuerySet.iterator(chunk_size=...), encoded as NDJSON or CSV and optionally
+gzip-compressed as they are produced, so memory stays flat however many
+rows are exported.
+"""
+import csv
+import io
+import json
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Appointment, MedicalRecord, Review
+
+FORMATS = ('ndjson', 'csv')
+CHUNK_SIZE = 2000
+# Encoded output is handed on in pieces of about this many bytes
+BUFFER_SIZE = 64 * 1024
+# Spreadsheets run a CSV cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# section -> (model, exported fields); the related usernames are exported
+# as patient_username and doctor_username
+SECTIONS = {
+    'appointment': (Appointment, (
+        'id', 'patient_id', 'patient__username', 'doctor_id', 'doctor__user_profile__user__username',
+        'appointment_date', 'appointment_time', 'status', 'reason', 'notes', 'created_at', 'updated_at',
+    )),
+    'medical_record': (MedicalRecord, (
+        'id', 'patient_id', 'patient__username', 'doctor_id', 'doctor__user_profile__user__username',
+        'appointment_id', 'diagnosis', 'prescription', 'lab_results', 'notes', 'attachments',
+        'created_at', 'updated_at',
+    )),
+    'review': (Review, (
+        'id', 'patient_id', 'patient__username', 'doctor_id', 'doctor__user_profile__user__username',
+        'appointment_id', 'rating', 'comment', 'created_at', 'updated_at',
+    )),
+}
+
+
+def column_name(field):
+    if field == 'patient__username':
+        return 'patient_username'
+    if field == 'doctor__user_profile__user__username':
+        return 'doctor_username'
+    return field
+
+
+def csv_columns():
+    """
+    The union of every section's columns, in order, after "type"
+    """
+    columns = ['type']
+    for _, fields in SECTIONS.values():
+        for field in fields:
+            if column_name(field) not in columns:
+                columns.append(column_name(field))
+    return columns
+
+
+def export_rows(patient_id=None, doctor_id=None, scope=None):
+    """
+    Yield (type, row dict) for everything in the export, section by section
+
+    patient_id and doctor_id narrow the export; scope is an extra Q applied
+    to every section (e.g. what the requesting user may see).
+    """
+    for section, (model, fields) in SECTIONS.items():
+        queryset = model.objects.all()
+        if scope is not None:
+            queryset = queryset.filter(scope)
+        if patient_id is not None:
+            queryset = queryset.filter(patient_id=patient_id)
+        if doctor_id is not None:
+            queryset = queryset.filter(doctor_id=doctor_id)
+
+        names = [column_name(field) for field in fields]
+        rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        for row in rows:
+            yield section, dict(zip(names, row))
+
+
+def buffered(pieces):
+    """
+    Join small byte strings into pieces of about BUFFER_SIZE
+    """
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def encode_ndjson(rows):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for section, row in rows:
+        yield (encoder.encode(dict(type=section, **row)) + '\n').encode('utf-8')
+
+
+def csv_cell(value):
+    """
+    Quote free text that a spreadsheet would read as a formula
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def encode_csv(rows):
+    columns = csv_columns()
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for section, row in rows:
+        if 'attachments' in row:
+            row['attachments'] = json.dumps(row['attachments'])
+        writer.writerow({'type': section, **{name: csv_cell(value) for name, value in row.items()}})
+        if text.tell() >= BUFFER_SIZE:
+            yield text.getvalue().encode('utf-8')
+            text.seek(0)
+            text.truncate()
+    yield text.getvalue().encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """
+    gzip-compress a stream of byte strings as it is produced
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(output_format='ndjson', compress=False, **filters):
+    """
+    Return an iterator of encoded (and optionally gzipped) export bytes
+    """
+    rows = export_rows(**filters)
+    if output_format == 'csv':
+        chunks = encode_csv(rows)
+    else:
+        chunks = buffered(encode_ndjson(rows))
+    if compress:
+        chunks = gzip_stream(chunks)
+    return chunks
@@ -0,0 +1,194 @@
+"""
+Read-optimized, values()-based serialization.
+
+FlatSerializer compiles a ModelSerializer class once into a flat list of
+values() lookups plus a plan for rebuilding the serializer's exact JSON
+shape from each row, nested serializers included. Reads then skip model
+instantiation, related-object descriptors and per-row DRF field dispatch.
+
+SerializerMethodFields cannot be compiled automatically; a serializer lists
+them in `compiled_method_fields` as MethodFields giving the lookups each one
+reads and a function building its value.
+FlatReadMixin serves a viewset's list actions from a compiled serializer.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _identity(value):
+    return value
+
+
+def _is_plain_iso_datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return (
+        not hasattr(field, 'timezone') and
+        isinstance(output_format, str) and output_format.lower() == ISO_8601
+    )
+
+
+class MethodField:
+    """
+    Compiled replacement for a SerializerMethodField
+
+    paths are values() lookups relative to the serializer's model; build is
+    called with a get(path) function and returns the field's value.
+    """
+
+    def __init__(self, paths, build):
+        self.paths = paths
+        self.build = build
+
+
+def full_name_or_username(user_path):
+    """
+    Mirror `user.get_full_name() or user.username` for a related user
+    """
+    prefix = f'{user_path}__' if user_path else ''
+    first, last, username = (f'{prefix}first_name', f'{prefix}last_name', f'{prefix}username')
+
+    def build(get):
+        return f"{get(first)} {get(last)}".strip() or get(username)
+
+    return MethodField([first, last, username], build)
+
+
+class FlatSerializer:
+    """
+    values()-based row builder compiled from a ModelSerializer class or
+    instance (an instance may already have a trimmed set of fields)
+    """
+
+    def __init__(self, serializer):
+        if isinstance(serializer, type):
+            serializer = serializer()
+        self.paths = []
+        self.plan = self._compile(serializer, '')
+
+    def _add_path(self, path):
+        if path not in self.paths:
+            self.paths.append(path)
+        return path
+
+    def _compile(self, serializer, prefix):
+        plan = []
+        methods = getattr(serializer, 'compiled_method_fields', {})
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in methods:
+                    raise ImproperlyConfigured(
+                        f"{type(serializer).__name__}.compiled_method_fields has no entry for '{name}'"
+                    )
+                method = methods[name]
+                paths = [self._add_path(prefix + path) for path in method.paths]
+                plan.append((name, 'method', (dict(zip(method.paths, paths)), method.build)))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                # values() already returns the related object's primary key
+                path = self._add_path(prefix + field.source.replace('.', '__'))
+                plan.append((name, 'field', (path, _identity)))
+            elif isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+                raise ImproperlyConfigured(f"Cannot compile related field '{name}' of {type(serializer).__name__}")
+            elif isinstance(field, serializers.BaseSerializer):
+                nested_prefix = prefix + field.source.replace('.', '__') + '__'
+                pk_path = self._add_path(nested_prefix + 'id')
+                plan.append((name, 'nested', (pk_path, self._compile(field, nested_prefix))))
+            elif isinstance(field, serializers.DateTimeField) and _is_plain_iso_datetime(field):
+                # Resolve the current timezone once per batch instead of once
+                # per value, which dominates DateTimeField.to_representation.
+                path = self._add_path(prefix + field.source.replace('.', '__'))
+                plan.append((name, 'datetime', (path, field.to_representation)))
+            else:
+                path = self._add_path(prefix + field.source.replace('.', '__'))
+                plan.append((name, 'field', (path, field.to_representation)))
+
+        return plan
+
+    def _build(self, plan, row, tz):
+        data = {}
+        for name, kind, spec in plan:
+            if kind == 'field':
+                path, to_representation = spec
+                value = row[path]
+                data[name] = None if value is None else to_representation(value)
+            elif kind == 'datetime':
+                path, to_representation = spec
+                value = row[path]
+                if value is None:
+                    data[name] = None
+                elif tz is not None and timezone.is_aware(value):
+                    value = value.astimezone(tz).isoformat()
+                    data[name] = value[:-6] + 'Z' if value.endswith('+00:00') else value
+                else:
+                    data[name] = to_representation(value)
+            elif kind == 'nested':
+                pk_path, nested_plan = spec
+                data[name] = None if row[pk_path] is None else self._build(nested_plan, row, tz)
+            else:
+                paths, build = spec
+                data[name] = build(lambda path: row[paths[path]])
+        return data
+
+    def values(self, queryset, extra=()):
+        """
+        Project a queryset onto the columns this serializer needs, plus any
+        extra ones the caller reads from the rows
+        """
+        return queryset.values(*self.paths, *(path for path in extra if path not in self.paths))
+
+    def iter_serialize(self, rows):
+        tz = serializers.DateTimeField().default_timezone()
+        for row in rows:
+            yield self._build(self.plan, row, tz)
+
+    def serialize(self, rows):
+        return list(self.iter_serialize(rows))
+
+
+class FlatReadMixin:
+    """
+    Serve list-like actions from get_flat_serializer() instead of the
+    viewset's serializer class
+
+    Must come before NDJSONStreamMixin in the bases so streamed responses use
+    the fast path too.
+    """
+    flat_read_actions = ('list',)
+
+    def get_flat_serializer(self):
+        return None
+
+    def use_flat_serializer(self):
+        return self.action in self.flat_read_actions and self.get_flat_serializer() is not None
+
+    def iter_representations(self, queryset):
+        if not self.use_flat_serializer():
+            yield from super().iter_representations(queryset)
+            return
+        flat = self.get_flat_serializer()
+        yield from flat.iter_serialize(flat.values(queryset).iterator(chunk_size=self.stream_chunk_size))
+
+    def list_response(self, queryset):
+        if not self.use_flat_serializer() or self.wants_stream():
+            return super().list_response(queryset)
+        flat = self.get_flat_serializer()
+        return Response(flat.serialize(flat.values(queryset)))
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_flat_serializer() or self.wants_stream():
+            return super().list(request, *args, **kwargs)
+
+        # Cursor pagination reads the ordering columns back from each row
+        flat = self.get_flat_serializer()
+        ordering = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', None) or ()]
+        rows = flat.values(self.filter_queryset(self.get_queryset()), ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(flat.serialize(page))
+        return Response(flat.serialize(rows))
@@ -0,0 +1,125 @@
+"""
+Compact free/busy calendars.
+
+A doctor's calendar for a date range is built from two queries (the
+doctor's TimeSlots and active appointments in the range) and returned as
+one string per day with a character per slot-length cell of the day:
+
+    .  off: outside the schedule and no time slot
+    F  free: an open time slot (or, on days without time slots, a slot of
+       the doctor's weekly schedule)
+    X  busy: a booked time slot with no visible appointment, or a free
+       cell that has already started
+    B  booked: an active (PENDING/CONFIRMED) appointment starts here
+
+With the default 30-minute slots a day is 48 characters. Days can also be
+run-length encoded ("18.4F1B2F23."), which is shorter for mostly empty
+days.
+"""
+import hashlib
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .availability import ACTIVE_STATUSES, get_slot_minutes, schedule_minutes
+from .models import Appointment, TimeSlot
+
+OFF, FREE, BUSY, BOOKED = '.', 'F', 'X', 'B'
+LEGEND = {OFF: 'off', FREE: 'free', BUSY: 'busy', BOOKED: 'booked'}
+ENCODINGS = ('cells', 'rle')
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def run_length(cells):
+    return ''.join(f'{len(list(run))}{state}' for state, run in groupby(cells))
+
+
+def doctor_calendar(doctor, start, end, encoding='cells', slot_minutes=None):
+    """
+    Return {date: encoded day} for a doctor from start to end (inclusive)
+    """
+    slot_minutes = slot_minutes or get_slot_minutes()
+    cells_per_day = -(-24 * 60 // slot_minutes)
+    now = timezone.localtime()
+    current_cell = (_minutes(now) + slot_minutes - 1) // slot_minutes
+
+    slots = {}
+    for date, start_time, end_time, is_booked in TimeSlot.objects.filter(
+        doctor=doctor, date__gte=start, date__lte=end
+    ).values_list('date', 'start_time', 'end_time', 'is_booked'):
+        slots.setdefault(date, []).append((_minutes(start_time), _minutes(end_time), is_booked))
+
+    booked = {}
+    for date, time in Appointment.objects.filter(
+        doctor=doctor, status__in=ACTIVE_STATUSES, appointment_date__gte=start, appointment_date__lte=end
+    ).values_list('appointment_date', 'appointment_time'):
+        booked.setdefault(date, set()).add(_minutes(time) // slot_minutes)
+
+    calendar = {}
+    date = start
+    while date <= end:
+        cells = [OFF] * cells_per_day
+        if date in slots:
+            for first, last, is_booked in slots[date]:
+                # A slot ending at midnight has end_time 00:00
+                last = last or 24 * 60
+                for cell in range(first // slot_minutes, -(-last // slot_minutes)):
+                    cells[cell] = BUSY if is_booked else FREE
+        else:
+            for minute in schedule_minutes(doctor, date, slot_minutes):
+                cells[minute // slot_minutes] = FREE
+
+        if date < now.date():
+            past = cells_per_day
+        elif date == now.date():
+            past = current_cell
+        else:
+            past = 0
+        for cell in range(past):
+            if cells[cell] == FREE:
+                cells[cell] = BUSY
+
+        for cell in booked.get(date, ()):
+            cells[cell] = BOOKED
+
+        calendar[date] = run_length(cells) if encoding == 'rle' else ''.join(cells)
+        date += timedelta(days=1)
+    return calendar
+
+
+def calendar_etag(doctor, start, end, encoding='cells', slot_minutes=None):
+    """
+    Weak ETag for a doctor's calendar from start to end, computed without
+    building it: the doctor's schedule, the latest change to and number of
+    the range's TimeSlots and active appointments, and how far into the
+    range the current time is (started cells turn busy)
+    """
+    slot_minutes = slot_minutes or get_slot_minutes()
+    now = timezone.localtime()
+    if now.date() < start:
+        elapsed = None
+    elif now.date() > end:
+        elapsed = end
+    else:
+        elapsed = (now.date(), (_minutes(now) + slot_minutes - 1) // slot_minutes)
+
+    # Claiming or releasing a slot is a queryset update that leaves
+    # updated_at alone, hence the booked count
+    slots = TimeSlot.objects.filter(doctor=doctor, date__gte=start, date__lte=end).aggregate(
+        latest=Max('updated_at'), count=Count('pk'), booked=Count('pk', filter=Q(is_booked=True)),
+    )
+    appointments = Appointment.objects.filter(
+        doctor=doctor, status__in=ACTIVE_STATUSES, appointment_date__gte=start, appointment_date__lte=end
+    ).aggregate(latest=Max('updated_at'), count=Count('pk'))
+
+    content = repr((
+        doctor.pk, doctor.available_days, doctor.available_time_start, doctor.available_time_end,
+        start, end, encoding, slot_minutes, LEGEND, elapsed,
+        sorted(slots.items()), sorted(appointments.items()),
+    ))
+    return 'W/"%s"' % hashlib.md5(content.encode(), usedforsecurity=False).hexdigest()
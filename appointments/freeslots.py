@@ -0,0 +1,245 @@
+"""
+Earliest-free-slot lookups across doctors.
+
+Each doctor's free, not yet past TimeSlots are kept in memory as a list
+sorted by (date, start_time). "The K earliest free slots" for a set of
+doctors is then a k-way heap merge of those lists that stops after K
+matches, instead of sorting every free slot row in the database.
+
+A slot is free when no active (PENDING/CONFIRMED) appointment starts at
+it, the same rule the availability index (appointments.availability)
+applies to the doctor's schedule, so the two never disagree about a time
+that has a TimeSlot. The lists are updated wherever the availability
+index is: by the Appointment signals and status transitions once they
+commit. TimeSlot rows created, edited or deleted through the ORM drop the
+doctor's list so it is reloaded.
+
+A doctor's list is loaded on first use (two queries for all doctors
+missing from the index). As with the availability index, entries expire
+after FREE_SLOT_INDEX_TTL seconds so that changes made by other worker
+processes are picked up, and at most FREE_SLOT_INDEX_MAX_SLOTS slots are
+held across all doctors, least recently used doctors being dropped first.
+"""
+import heapq
+import threading
+import time as time_module
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .availability import ACTIVE_STATUSES
+
+RELEASE_BATCH_SIZE = 300
+
+
+def free_time_slots(queryset):
+    """
+    Narrow a TimeSlot queryset to slots no active appointment starts at
+    """
+    from .models import Appointment
+
+    return queryset.exclude(Exists(Appointment.objects.filter(
+        doctor_id=OuterRef('doctor_id'),
+        appointment_date=OuterRef('date'),
+        appointment_time=OuterRef('start_time'),
+        status__in=ACTIVE_STATUSES,
+    )))
+
+
+class FreeSlotIndex:
+    """
+    Bounded, thread-safe map of doctor_id -> sorted free slots, each a
+    (date, start_time, end_time, doctor_id, slot_id) tuple; max_slots
+    bounds the slots held across all doctors
+    """
+
+    def __init__(self, ttl=None, max_entries=None, max_slots=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_slots = max_slots
+        self._entries = OrderedDict()
+        self._slots = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'FREE_SLOT_INDEX_TTL', 60)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'FREE_SLOT_INDEX_MAX_ENTRIES', 20000)
+
+    @property
+    def max_slots(self):
+        if self._max_slots is not None:
+            return self._max_slots
+        return getattr(settings, 'FREE_SLOT_INDEX_MAX_SLOTS', 50000)
+
+    def _load(self, doctor_ids):
+        from .models import Appointment, TimeSlot
+
+        today = timezone.now().date()
+        # The same rule as free_time_slots(), applied to the whole range in
+        # Python rather than as a correlated subquery per slot
+        booked = set(Appointment.objects.filter(
+            doctor_id__in=doctor_ids,
+            appointment_date__gte=today,
+            status__in=ACTIVE_STATUSES
+        ).values_list('doctor_id', 'appointment_date', 'appointment_time'))
+
+        slots = {doctor_id: [] for doctor_id in doctor_ids}
+        rows = TimeSlot.objects.filter(
+            doctor_id__in=doctor_ids,
+            date__gte=today
+        ).order_by('doctor_id', 'date', 'start_time', 'id').values_list(
+            'date', 'start_time', 'end_time', 'doctor_id', 'id'
+        )
+        for row in rows.iterator(chunk_size=5000):
+            if (row[3], row[0], row[1]) not in booked:
+                slots[row[3]].append(row)
+        return slots
+
+    def _pop(self, doctor_id):
+        # Callers hold the lock
+        entry = self._entries.pop(doctor_id, None)
+        if entry is not None:
+            self._slots -= len(entry[0])
+
+    def _get_many(self, doctor_ids):
+        now = time_module.monotonic()
+        found = {}
+        missing = []
+
+        with self._lock:
+            for doctor_id in doctor_ids:
+                entry = self._entries.get(doctor_id)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(doctor_id)
+                    found[doctor_id] = entry[0]
+                else:
+                    missing.append(doctor_id)
+
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                for doctor_id, slots in loaded.items():
+                    self._pop(doctor_id)
+                    self._entries[doctor_id] = (slots, now + self.ttl)
+                    self._slots += len(slots)
+                while self._entries and (
+                        len(self._entries) > self.max_entries or self._slots > self.max_slots):
+                    self._pop(next(iter(self._entries)))
+            found.update(loaded)
+        return found
+
+    def earliest(self, doctor_ids, limit, after=None, time_from=None, time_to=None):
+        """
+        Return up to limit free slots of the given doctors, earliest first
+
+        after is a datetime (default now) before which slots are skipped;
+        time_from/time_to restrict slots to a time-of-day window.
+        """
+        after = timezone.localtime(after) if after else timezone.localtime()
+        start = (after.date(), after.time())
+        lists = list(self._get_many(list(doctor_ids)).values())
+
+        def matches(slot):
+            return (time_from is None or slot[1] >= time_from) and (time_to is None or slot[2] <= time_to)
+
+        def next_match(slots, position):
+            if time_from is None and time_to is None:
+                return position
+            while position < len(slots) and not matches(slots[position]):
+                position += 1
+            return position
+
+        found = []
+        with self._lock:
+            # One heap entry per doctor: (its next matching slot, list, position)
+            heap = []
+            for number, slots in enumerate(lists):
+                # Lists are loaded from today on, so usually nothing is skipped
+                position = 0 if slots and slots[0] >= start else bisect_left(slots, start)
+                position = next_match(slots, position)
+                if position < len(slots):
+                    heap.append((slots[position], number, position))
+            heapq.heapify(heap)
+
+            while heap and len(found) < limit:
+                slot, number, position = heap[0]
+                found.append(slot)
+                slots = lists[number]
+                position = next_match(slots, position + 1)
+                if position < len(slots):
+                    heapq.heapreplace(heap, (slots[position], number, position))
+                else:
+                    heapq.heappop(heap)
+        return found
+
+    def occupy(self, doctor_id, date, time):
+        """
+        Drop a claimed slot from its doctor's list
+        """
+        with self._lock:
+            entry = self._entries.get(doctor_id)
+            if entry is None:
+                return
+            slots = entry[0]
+            position = bisect_left(slots, (date, time))
+            while position < len(slots) and slots[position][:2] == (date, time):
+                del slots[position]
+                self._slots -= 1
+
+    def release(self, slots):
+        """
+        Put released (doctor_id, date, time) slots back into the lists of
+        the doctors that are loaded, reading the slot rows in one query
+        """
+        from .models import TimeSlot
+
+        with self._lock:
+            slots = [slot for slot in slots if slot[0] in self._entries]
+        if not slots:
+            return
+
+        rows = []
+        for offset in range(0, len(slots), RELEASE_BATCH_SIZE):
+            condition = Q()
+            for doctor_id, date, time in slots[offset:offset + RELEASE_BATCH_SIZE]:
+                condition |= Q(doctor_id=doctor_id, date=date, start_time=time)
+            rows += free_time_slots(TimeSlot.objects.filter(condition)).values_list(
+                'date', 'start_time', 'end_time', 'doctor_id', 'id'
+            )
+
+        with self._lock:
+            for row in rows:
+                entry = self._entries.get(row[3])
+                if entry is None:
+                    continue
+                doctor_slots = entry[0]
+                position = bisect_left(doctor_slots, row)
+                if position == len(doctor_slots) or doctor_slots[position] != row:
+                    insort(doctor_slots, row)
+                    self._slots += 1
+
+    def invalidate(self, doctor_id):
+        with self._lock:
+            self._pop(doctor_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._slots = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+free_slot_index = FreeSlotIndex()
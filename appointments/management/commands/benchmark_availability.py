@@ -0,0 +1,121 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointments.availability import AvailabilityIndex, ACTIVE_STATUSES, time_of_minute
+from appointments.models import Appointment
+from users.models import DoctorProfile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark slot conflict checks: database query vs in-memory availability index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--days', type=int, default=5)
+        parser.add_argument('--lookups', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back, so the
+        # benchmark never leaves data behind.
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        doctor_ids, dates = self.seed(options['doctors'], options['days'], rng)
+        slots = list(range(9 * 60, 17 * 60, 30))
+        lookups = [
+            (rng.choice(doctor_ids), rng.choice(dates), time_of_minute(rng.choice(slots)))
+            for _ in range(options['lookups'])
+        ]
+
+        def query_path(doctor_id, date, value):
+            return not Appointment.objects.filter(
+                doctor_id=doctor_id,
+                appointment_date=date,
+                appointment_time=value,
+                status__in=ACTIVE_STATUSES
+            ).exists()
+
+        index = AvailabilityIndex(ttl=3600)
+        results = {}
+        for name, check in (('query', query_path), ('index', index.is_free)):
+            start = time.perf_counter()
+            with count_queries() as counter:
+                answers = [check(*lookup) for lookup in lookups]
+            elapsed = time.perf_counter() - start
+            results[name] = answers
+            self.stdout.write(
+                f"{name:>6}: {elapsed * 1000:9.1f} ms total, "
+                f"{elapsed / len(lookups) * 1e6:8.2f} us/lookup, "
+                f"{counter['queries']:6d} queries"
+            )
+
+        if results['query'] != results['index']:
+            self.stderr.write(self.style.ERROR('Index answers differ from the database'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Index answers match the database'))
+
+    def seed(self, doctor_count, day_count, rng):
+        suffix = timezone.now().strftime('%H%M%S%f')
+        doctor_ids = []
+        for i in range(doctor_count):
+            user = User.objects.create(username=f'bench_doctor_{suffix}_{i}')
+            profile = user.profile
+            profile.role = 'DOCTOR'
+            profile.save()
+            doctor_ids.append(DoctorProfile.objects.create(
+                user_profile=profile,
+                specialization='GENERAL',
+                license_number=f'BENCH-{suffix}-{i}',
+            ).id)
+
+        patient = User.objects.create(username=f'bench_patient_{suffix}')
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        dates = [tomorrow + timedelta(days=d) for d in range(day_count)]
+
+        appointments = []
+        for doctor_id in doctor_ids:
+            for date in dates:
+                for minute in range(9 * 60, 17 * 60, 30):
+                    if rng.random() < 0.5:
+                        appointments.append(Appointment(
+                            patient=patient,
+                            doctor_id=doctor_id,
+                            appointment_date=date,
+                            appointment_time=time_of_minute(minute),
+                            status=rng.choice(['PENDING', 'CONFIRMED', 'CANCELLED']),
+                        ))
+        Appointment.objects.bulk_create(appointments, batch_size=1000)
+        self.stdout.write(
+            f"Seeded {doctor_count} doctors, {len(appointments)} appointments over {day_count} days"
+        )
+        return doctor_ids, dates
+
+
+@contextmanager
+def count_queries():
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
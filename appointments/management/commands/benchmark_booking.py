@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from appointments.availability import ACTIVE_STATUSES, time_of_minute
+from appointments.booking import book_appointment
+from appointments.models import Appointment, TimeSlot
+from appointments.transitions import transition
+from users.models import DoctorProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer a small pool of time slots with concurrent bookings and cancellations, '
+        'then check that no slot was double-booked and report throughput'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=200, help='Booking attempts per thread')
+        parser.add_argument('--slots', type=int, default=16)
+        parser.add_argument('--patients', type=int, default=40)
+        parser.add_argument('--cancel-rate', type=float, default=0.3,
+                            help='Fraction of successful bookings cancelled right away')
+        parser.add_argument('--retries', type=int, default=5,
+                            help='Retries when the database reports a lock timeout')
+        parser.add_argument('--seed', type=int, default=12)
+
+    def handle(self, *args, **options):
+        # Worker threads use their own connections, so the data can't live in
+        # a rolled-back transaction; it is deleted again at the end instead.
+        users = []
+        try:
+            users, doctor, slots, patient_ids = self.seed(options)
+            outcomes, elapsed = self.run(doctor, slots, patient_ids, options)
+            self.report(doctor, slots, outcomes, elapsed)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, doctor, slots, patient_ids, options):
+        outcomes = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def worker(number):
+            rng = random.Random(options['seed'] + number)
+            local = Counter()
+            barrier.wait()
+            try:
+                for _ in range(options['attempts']):
+                    slot = rng.choice(slots)
+                    local[self.attempt(doctor, slot, rng.choice(patient_ids), rng, options)] += 1
+            finally:
+                connection.close()
+                with lock:
+                    outcomes.update(local)
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes, time.perf_counter() - start
+
+    def attempt(self, doctor, slot, patient_id, rng, options):
+        for _ in range(options['retries'] + 1):
+            try:
+                appointment = book_appointment(
+                    patient_id=patient_id,
+                    doctor=doctor,
+                    appointment_date=slot.date,
+                    appointment_time=slot.start_time,
+                )
+            except ValidationError:
+                return 'rejected'
+            except OperationalError:
+                time.sleep(rng.uniform(0.001, 0.01))
+                continue
+
+            if rng.random() < options['cancel_rate']:
+                transition(appointment, 'cancel')
+                return 'booked+cancelled'
+            return 'booked'
+        return 'lock timeout'
+
+    def report(self, doctor, slots, outcomes, elapsed):
+        attempts = sum(outcomes.values())
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f'{outcome:>17}: {count}')
+        self.stdout.write(
+            f'{attempts} attempts in {elapsed:.2f}s: {attempts / elapsed:.0f} attempts/s, '
+            f'{(outcomes["booked"] + outcomes["booked+cancelled"]) / elapsed:.0f} bookings/s'
+        )
+
+        active = dict(
+            Appointment.objects.filter(doctor=doctor).values_list('appointment_time').annotate(
+                active=Count('id', filter=Q(status__in=ACTIVE_STATUSES))
+            )
+        )
+        double_booked = [time_value for time_value, count in active.items() if count > 1]
+        out_of_sync = [
+            slot for slot in TimeSlot.objects.filter(pk__in=[slot.pk for slot in slots])
+            if slot.is_booked != bool(active.get(slot.start_time))
+        ]
+
+        self.stdout.write(f'double-booked slots: {len(double_booked)}, slots out of sync: {len(out_of_sync)}')
+        if double_booked or out_of_sync:
+            raise CommandError('Booking invariants violated')
+        self.stdout.write(self.style.SUCCESS('No double bookings; every TimeSlot matches its appointments'))
+
+    def seed(self, options):
+        suffix = timezone.now().strftime('%H%M%S%f')
+        date = timezone.now().date() + timedelta(days=1)
+
+        doctor_user = User.objects.create(username=f'bench_booking_doctor_{suffix}')
+        profile = doctor_user.profile
+        profile.role = 'DOCTOR'
+        profile.save()
+        doctor = DoctorProfile.objects.create(
+            user_profile=profile, specialization='GENERAL', license_number=f'BOOK-{suffix}'
+        )
+
+        patients = User.objects.bulk_create([
+            User(username=f'bench_booking_patient_{suffix}_{i}') for i in range(options['patients'])
+        ])
+        slots = TimeSlot.objects.bulk_create([
+            TimeSlot(
+                doctor=doctor,
+                date=date,
+                start_time=time_of_minute(8 * 60 + i * 30),
+                end_time=time_of_minute(8 * 60 + i * 30 + 30),
+            )
+            for i in range(options['slots'])
+        ])
+        return [doctor_user] + patients, doctor, slots, [patient.pk for patient in patients]
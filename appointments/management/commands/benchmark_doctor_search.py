@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import UserProfile, DoctorProfile
+from users.search import rebuild_search_index, search_doctor_ids
+
+FIRST_NAMES = ['Anna', 'Ben', 'Carla', 'David', 'Elena', 'Farid', 'Grace', 'Hugo', 'Ines', 'Jonas',
+               'Kira', 'Liam', 'Maya', 'Noah', 'Olga', 'Pavel', 'Rosa', 'Sami', 'Tara', 'Viktor']
+LAST_NAMES = ['Smith', 'Garcia', 'Muller', 'Rossi', 'Novak', 'Kowalski', 'Silva', 'Jensen', 'Dubois',
+              'Tanaka', 'Okafor', 'Haddad', 'Larsen', 'Costa', 'Ivanova', 'Schmidt', 'Moreau', 'Berg']
+BIO_WORDS = ['heart', 'skin', 'migraine', 'asthma', 'diabetes', 'sports', 'injury', 'children',
+             'anxiety', 'allergy', 'arthritis', 'sleep', 'nutrition', 'vaccination', 'rehabilitation']
+QUERIES = ['smi', 'card', 'anna gar', 'migraine', 'derm skin', 'pedi children', 'ortho sports injury',
+           'psych anxiety', 'general', 'ko', 'elena novak', 'asthma allergy']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Seed doctors in a rolled-back transaction and time full-text doctor searches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=20, help='Runs of each query')
+        parser.add_argument('--seed', type=int, default=15)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        start = time.perf_counter()
+        self.seed(options['doctors'], random.Random(options['seed']))
+        seeded = time.perf_counter()
+        indexed = rebuild_search_index()
+        self.stdout.write(
+            f'Seeded {options["doctors"]} doctors in {seeded - start:.1f}s, '
+            f'indexed {indexed} in {time.perf_counter() - seeded:.1f}s'
+        )
+
+        worst = 0
+        for query in QUERIES:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                ids = search_doctor_ids(query, limit=20)
+                timings.append((time.perf_counter() - started) * 1000)
+            worst = max(worst, statistics.median(timings))
+            self.stdout.write(
+                f'{query!r:>24}: {len(ids):3d} results, median {statistics.median(timings):6.2f} ms, '
+                f'max {max(timings):6.2f} ms'
+            )
+        self.stdout.write(f'Slowest median: {worst:.2f} ms')
+
+    def seed(self, count, rng):
+        suffix = timezone.now().strftime('%H%M%S%f')
+        specializations = [code for code, _ in DoctorProfile.SPECIALIZATION_CHOICES]
+        users = User.objects.bulk_create([
+            User(
+                username=f'search_{suffix}_{i}',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+            )
+            for i in range(count)
+        ], batch_size=5000)
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='DOCTOR') for user in users
+        ], batch_size=5000)
+        DoctorProfile.objects.bulk_create([
+            DoctorProfile(
+                user_profile=profile,
+                specialization=rng.choice(specializations),
+                license_number=f'SEARCH-{suffix}-{i}',
+                bio=' '.join(rng.sample(BIO_WORDS, 4)),
+            )
+            for i, profile in enumerate(profiles)
+        ], batch_size=5000)
@@ -0,0 +1,160 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from appointments.availability import time_of_minute
+from appointments.freeslots import free_slot_index, free_time_slots
+from appointments.models import Appointment, TimeSlot
+from users.models import UserProfile, DoctorProfile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed doctors, time slots and appointments in a rolled-back transaction and compare '
+        'earliest-free-slot lookups from the free slot index against a database sort'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--slots-per-day', type=int, default=8)
+        parser.add_argument('--booked', type=float, default=0.7, help='Fraction of slots with an appointment')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=16)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            free_slot_index.clear()
+
+    def run(self, options):
+        start = time.perf_counter()
+        count = self.seed(options, random.Random(options['seed']))
+        self.stdout.write(f'Seeded {options["doctors"]} doctors and {count} slots in {time.perf_counter() - start:.1f}s')
+
+        free_slot_index.clear()
+        # Room for every seeded slot, so the timed lookups never reload
+        settings = override_settings(FREE_SLOT_INDEX_MAX_SLOTS=count)
+        settings.enable()
+        try:
+            self.run_cases(options)
+        finally:
+            settings.disable()
+
+    def run_cases(self, options):
+        cases = [
+            ('specialization', {'specialization': 'CARDIOLOGY'}, {}),
+            ('all doctors', {}, {}),
+            ('afternoons', {}, {'time_from': time_of_minute(14 * 60)}),
+        ]
+        for label, doctor_filter, window in cases:
+            doctor_ids = list(
+                DoctorProfile.objects.filter(is_available=True, **doctor_filter).values_list('id', flat=True)
+            )
+
+            started = time.perf_counter()
+            free_slot_index.earliest(doctor_ids, options['limit'], **window)
+            cold = (time.perf_counter() - started) * 1000
+
+            indexed = self.time(options['repeat'], lambda: free_slot_index.earliest(doctor_ids, options['limit'], **window))
+            database = self.time(options['repeat'], lambda: self.database_earliest(doctor_filter, window, options['limit']))
+
+            expected = [(slot[0], slot[1]) for slot in self.database_earliest(doctor_filter, window, options['limit'])]
+            found = [(slot[0], slot[1]) for slot in free_slot_index.earliest(doctor_ids, options['limit'], **window)]
+            if expected != found:
+                raise CommandError(f'{label}: index returned {found}, database {expected}')
+
+            self.stdout.write(
+                f'{label:>15}: index {indexed:7.3f} ms (first load {cold:7.1f} ms), '
+                f'database {database:7.2f} ms, {database / indexed:.0f}x'
+            )
+
+    def time(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def database_earliest(self, doctor_filter, window, limit):
+        now = timezone.localtime()
+        queryset = free_time_slots(TimeSlot.objects.filter(
+            date__gte=now.date(), doctor__is_available=True,
+            **{f'doctor__{field}': value for field, value in doctor_filter.items()}
+        )).exclude(date=now.date(), start_time__lt=now.time())
+        if 'time_from' in window:
+            queryset = queryset.filter(start_time__gte=window['time_from'])
+        return list(
+            queryset.order_by('date', 'start_time', 'end_time', 'doctor_id', 'id').values_list(
+                'date', 'start_time', 'end_time', 'doctor_id', 'id'
+            )[:limit]
+        )
+
+    def seed(self, options, rng):
+        suffix = timezone.now().strftime('%H%M%S%f')
+        today = timezone.now().date()
+        specializations = [code for code, _ in DoctorProfile.SPECIALIZATION_CHOICES]
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_slots_{suffix}_{i}') for i in range(options['doctors'])
+        ], batch_size=5000)
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='DOCTOR') for user in users
+        ], batch_size=5000)
+        doctors = DoctorProfile.objects.bulk_create([
+            DoctorProfile(
+                user_profile=profile,
+                specialization=rng.choice(specializations),
+                license_number=f'SLOTS-{suffix}-{i}',
+            )
+            for i, profile in enumerate(profiles)
+        ], batch_size=5000)
+
+        patient = User.objects.create(username=f'bench_slots_{suffix}_patient')
+
+        def create(slots):
+            TimeSlot.objects.bulk_create(slots, batch_size=5000)
+            Appointment.objects.bulk_create([
+                Appointment(patient=patient, doctor_id=slot.doctor_id, appointment_date=slot.date,
+                            appointment_time=slot.start_time, status='CONFIRMED')
+                for slot in slots if slot.is_booked
+            ], batch_size=5000)
+
+        slots = []
+        count = 0
+        for doctor in doctors:
+            first = rng.choice([7, 8, 9, 10]) * 60
+            for day in range(1, options['days'] + 1):
+                for i in range(options['slots_per_day']):
+                    start = first + i * 60
+                    slots.append(TimeSlot(
+                        doctor=doctor,
+                        date=today + timedelta(days=day),
+                        start_time=time_of_minute(start),
+                        end_time=time_of_minute(start + 30),
+                        is_booked=rng.random() < options['booked'],
+                    ))
+            if len(slots) >= 20000:
+                create(slots)
+                count += len(slots)
+                slots = []
+        create(slots)
+        return count + len(slots)
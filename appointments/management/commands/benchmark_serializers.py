@@ -0,0 +1,97 @@
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from appointments.models import Appointment
+from appointments.serializers import AppointmentSerializer, get_appointment_flat_serializer
+from users.models import UserProfile, DoctorProfile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AppointmentSerializer against the values()-based fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        mismatch = False
+        try:
+            with transaction.atomic():
+                self.seed(max(options['sizes']))
+                mismatch = self.run(options['sizes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if mismatch:
+            raise CommandError('Fast path output differs from AppointmentSerializer')
+
+    def run(self, sizes, repeat):
+        queryset = Appointment.objects.select_related('patient', 'doctor__user_profile__user').order_by('id')
+        flat = get_appointment_flat_serializer()
+        mismatch = False
+
+        self.stdout.write(f"{'rows':>6} {'serializer ms':>14} {'fast path ms':>13} {'speedup':>8}")
+        for size in sizes:
+            def serializer_path():
+                return AppointmentSerializer(list(queryset[:size]), many=True).data
+
+            def fast_path():
+                return flat.serialize(flat.values(queryset[:size]))
+
+            # Compare the rendered JSON so the check covers key order and formatting
+            if json.dumps(serializer_path(), cls=JSONEncoder) != json.dumps(fast_path(), cls=JSONEncoder):
+                self.stderr.write(self.style.ERROR(f'Output differs at {size} rows'))
+                mismatch = True
+
+            timings = [self.time(path, repeat) for path in (serializer_path, fast_path)]
+            self.stdout.write(
+                f'{size:>6} {timings[0]:>14.2f} {timings[1]:>13.2f} {timings[0] / timings[1]:>7.1f}x'
+            )
+        return mismatch
+
+    def time(self, func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def seed(self, count, doctors=20, patients=100):
+        suffix = timezone.now().strftime('%H%M%S%f')
+        users = User.objects.bulk_create([
+            User(username=f'bench_{suffix}_{i}', first_name=f'First{i}', last_name=f'Last{i}')
+            for i in range(doctors + patients)
+        ])
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='DOCTOR' if i < doctors else 'PATIENT')
+            for i, user in enumerate(users)
+        ])
+        doctor_profiles = DoctorProfile.objects.bulk_create([
+            DoctorProfile(user_profile=profile, specialization='GENERAL', license_number=f'BENCH-{suffix}-{i}',
+                          available_days=['Monday', 'Wednesday'], bio='Experienced clinician')
+            for i, profile in enumerate(profiles[:doctors])
+        ])
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=users[doctors + i % patients],
+                doctor=doctor_profiles[i % doctors],
+                appointment_date=tomorrow + timedelta(days=i // (doctors * 16)),
+                appointment_time=f'{9 + (i // doctors) % 16 // 2:02d}:{(i // doctors) % 2 * 30:02d}',
+                reason='Routine checkup',
+            )
+            for i in range(count)
+        ], batch_size=1000)
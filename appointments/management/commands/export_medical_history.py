@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from appointments.export import FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a patient's, a doctor's or the whole clinic's appointments, medical records "
+        "and reviews to a file as NDJSON or CSV"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, help='Only this patient (user id)')
+        parser.add_argument('--doctor', type=int, help='Only this doctor (doctor profile id)')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='gzip the output (implied by a .gz output name)')
+        parser.add_argument('--output', '-o', default='-', help='Output file, or - for stdout')
+
+    def handle(self, *args, **options):
+        compress = options['gzip'] or options['output'].endswith('.gz')
+        chunks = export_stream(
+            options['format'],
+            compress,
+            patient_id=options['patient'],
+            doctor_id=options['doctor'],
+        )
+
+        written = 0
+        if options['output'] == '-':
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+            out.flush()
+        else:
+            with open(options['output'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                    written += len(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Wrote {written} bytes to {options["output"]}'))
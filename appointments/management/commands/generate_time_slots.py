@@ -0,0 +1,47 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.scheduling import generate_time_slots, WEEKDAYS
+from users.models import DoctorProfile
+
+
+class Command(BaseCommand):
+    help = "Expand doctors' weekly schedules into time slots for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument('start_date', type=date.fromisoformat)
+        parser.add_argument('end_date', type=date.fromisoformat)
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Doctor profile id (repeatable); defaults to all available doctors')
+        parser.add_argument('--slot-minutes', type=int, help='Slot length; defaults to APPOINTMENT_SLOT_MINUTES')
+        parser.add_argument('--weekday', action='append', dest='weekdays', choices=WEEKDAYS,
+                            help="Override the doctors' available days (repeatable)")
+        parser.add_argument('--every-weeks', type=int, default=1, help='Repeat the schedule every N weeks')
+        parser.add_argument('--exclude-date', type=date.fromisoformat, action='append', dest='exclude_dates',
+                            default=[], help='Date to skip, e.g. a public holiday (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['end_date'] < options['start_date']:
+            raise CommandError('end_date must be on or after start_date')
+        if options['every_weeks'] < 1:
+            raise CommandError('--every-weeks must be at least 1')
+
+        doctors = DoctorProfile.objects.filter(is_available=True)
+        if options['doctors']:
+            doctors = DoctorProfile.objects.filter(id__in=options['doctors'])
+
+        started = time.perf_counter()
+        created = generate_time_slots(
+            doctors.only('id', 'available_days', 'available_time_start', 'available_time_end'),
+            options['start_date'],
+            options['end_date'],
+            slot_minutes=options['slot_minutes'],
+            weekdays=options['weekdays'],
+            interval_weeks=options['every_weeks'],
+            exclude_dates=options['exclude_dates'],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} time slots in {elapsed:.2f}s'))
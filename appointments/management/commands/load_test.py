@@ -0,0 +1,306 @@
+import json
+import logging
+import math
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from appointments.models import Appointment, TimeSlot
+from users.authentication import ClaimsRefreshToken
+from users.models import DoctorProfile
+
+SEARCH_TERMS = ['heart', 'skin', 'children', 'sports injury', 'anxiety', 'migraine', 'Smith', 'Garcia', 'allergy']
+# Popular doctors are asked for more often
+DOCTOR_SKEW = 1.0
+
+
+class Scenario:
+    """
+    One kind of request in the mix: build(ctx, rng) returns
+    (method, path, data); statuses are the answers that count as success
+    """
+
+    def __init__(self, name, weight, role, build, statuses=(200,), write=False):
+        self.name = name
+        self.weight = weight
+        self.role = role
+        self.build = build
+        self.statuses = statuses
+        self.write = write
+
+
+def pick_doctor(ctx, rng):
+    return rng.choices(ctx['doctor_ids'], ctx['doctor_weights'])[0]
+
+
+def future_date(rng, days=14):
+    return (timezone.localdate() + timedelta(days=rng.randint(0, days))).isoformat()
+
+
+SCENARIOS = [
+    Scenario('appointments.list', 14, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/appointments/appointments/', None)),
+    Scenario('appointments.upcoming', 10, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/appointments/appointments/upcoming/', None)),
+    Scenario('appointments.doctor_list', 7, 'DOCTOR', lambda ctx, rng: (
+        'get', '/api/appointments/appointments/', {'status': rng.choice(['PENDING', 'CONFIRMED'])})),
+    Scenario('appointments.stats', 4, 'DOCTOR', lambda ctx, rng: (
+        'get', '/api/appointments/appointments/stats/', None)),
+    Scenario('doctors.list', 10, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/users/doctors/', {'specialization': rng.choice(ctx['specializations'])})),
+    Scenario('doctors.search', 7, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/users/doctors/search/', {'q': rng.choice(SEARCH_TERMS)})),
+    Scenario('doctors.free_slots', 9, 'PATIENT', lambda ctx, rng: (
+        'get', f'/api/users/doctors/{pick_doctor(ctx, rng)}/free_slots/', {'date': future_date(rng)})),
+    Scenario('doctors.calendar', 5, 'PATIENT', lambda ctx, rng: (
+        'get', f'/api/users/doctors/{pick_doctor(ctx, rng)}/calendar/', {'start': future_date(rng)})),
+    Scenario('time_slots.earliest', 8, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/appointments/time-slots/earliest/', {'specialization': rng.choice(ctx['specializations'])})),
+    Scenario('medical_records.list', 6, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/appointments/medical-records/', None)),
+    Scenario('reviews.doctor_stats', 5, 'PATIENT', lambda ctx, rng: (
+        'get', f'/api/appointments/reviews/doctor/{pick_doctor(ctx, rng)}/stats/', None)),
+    Scenario('users.me', 6, 'PATIENT', lambda ctx, rng: (
+        'get', '/api/users/me/', None)),
+    # Followed by appointments.cancel when the slot was still free
+    Scenario('appointments.book', 5, 'PATIENT', lambda ctx, rng: (
+        'post', '/api/appointments/appointments/', rng.choice(ctx['free_slots'])), statuses=(201, 400), write=True),
+]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the API routes in-process with a weighted mix of patient and doctor '
+        'requests against the current database (see seed_data) and report p50/p95/p99 '
+        'latency and requests per second per endpoint; --baseline compares against '
+        'an earlier --output and fails on regressions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests to measure')
+        parser.add_argument('--duration', type=float, help='Run for this many seconds instead of --requests')
+        parser.add_argument('--warmup', type=int, default=200, help='Unmeasured requests run first')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads')
+        parser.add_argument('--users', type=int, default=50, help='Patients and doctors to act as')
+        parser.add_argument('--read-only', action='store_true', help='Leave out booking and cancelling')
+        parser.add_argument('--seed', type=int, default=21)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against results written earlier with --output')
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help='Fail when an endpoint\'s p95 is this many percent above the baseline')
+        parser.add_argument('--min-samples', type=int, default=30,
+                            help='Endpoints with fewer requests are not compared')
+        parser.add_argument('--max-error-rate', type=float, default=0.01)
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in SCENARIOS if not (options['read_only'] and scenario.write)]
+        ctx = self.context(options)
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on; timings include query logging')
+
+        # Expected 4xx answers (a slot booked in the meantime) aren't logged
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            self.run(ctx, scenarios, options, options['warmup'], None, seed_offset=1000)
+            results, elapsed = self.run(ctx, scenarios, options, options['requests'], options['duration'])
+        finally:
+            request_logger.setLevel(level)
+
+        report = self.report(results, elapsed, options)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+        failures = []
+        total = report['total']
+        if total['requests'] and total['errors'] / total['requests'] > options['max_error_rate']:
+            failures.append(f'{total["errors"]} of {total["requests"]} requests failed')
+        if options['baseline']:
+            failures += self.compare(report, options)
+        if failures:
+            raise CommandError('; '.join(failures))
+
+    def context(self, options):
+        """
+        Load the users, doctors and free slots the requests are built from
+        """
+        rng = random.Random(options['seed'])
+        tokens = {}
+        for role in ('PATIENT', 'DOCTOR'):
+            ids = list(User.objects.filter(profile__role=role, is_active=True).values_list('id', flat=True))
+            if not ids:
+                raise CommandError(f'No {role.lower()} users found; run seed_data first')
+            users = User.objects.select_related('profile__doctor_profile').filter(
+                id__in=rng.sample(ids, min(options['users'], len(ids)))
+            )
+            tokens[role] = [(user.id, str(ClaimsRefreshToken.for_user(user).access_token)) for user in users]
+
+        doctor_ids = list(DoctorProfile.objects.filter(is_available=True).order_by('id').values_list('id', flat=True))
+        if not doctor_ids:
+            raise CommandError('No available doctors found; run seed_data first')
+        specializations = sorted(set(DoctorProfile.objects.values_list('specialization', flat=True)))
+
+        slots = TimeSlot.objects.filter(
+            is_booked=False, date__gt=timezone.localdate(), doctor__is_available=True
+        ).values_list('doctor_id', 'date', 'start_time')[:2000]
+        free_slots = [
+            {'doctor': doctor_id, 'appointment_date': date.isoformat(),
+             'appointment_time': start.isoformat(), 'reason': 'Load test'}
+            for doctor_id, date, start in slots
+        ]
+        if not free_slots and not options['read_only']:
+            raise CommandError('No free time slots to book; run seed_data first or pass --read-only')
+
+        return {
+            'tokens': tokens,
+            'doctor_ids': doctor_ids,
+            'doctor_weights': [1 / (rank + 1) ** DOCTOR_SKEW for rank in range(len(doctor_ids))],
+            'specializations': specializations,
+            'free_slots': free_slots,
+        }
+
+    def run(self, ctx, scenarios, options, count, duration, seed_offset=0):
+        """
+        Send count requests (or keep going for duration seconds) from
+        --concurrency threads; returns {name: [(ms, ok)]} and the wall time
+        """
+        results = {}
+        lock = threading.Lock()
+        remaining = [count]
+        deadline = time.perf_counter() + duration if duration else None
+        weights = [scenario.weight for scenario in scenarios]
+
+        def claim():
+            if deadline is not None:
+                return time.perf_counter() < deadline
+            with lock:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker(number):
+            rng = random.Random(options['seed'] + seed_offset + number)
+            client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+            samples = []
+            try:
+                while claim():
+                    scenario = rng.choices(scenarios, weights)[0]
+                    samples += self.send(client, scenario, ctx, rng)
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connection.close()
+            with lock:
+                for name, sample in samples:
+                    results.setdefault(name, []).append(sample)
+
+        started = time.perf_counter()
+        if options['concurrency'] <= 1:
+            worker(0)
+        else:
+            threads = [threading.Thread(target=worker, args=(number,)) for number in range(options['concurrency'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return results, time.perf_counter() - started
+
+    def send(self, client, scenario, ctx, rng):
+        """
+        Make one request (two for a booking that gets cancelled again) and
+        return [(name, (milliseconds, ok))]
+        """
+        user_id, token = rng.choice(ctx['tokens'][scenario.role])
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        method, path, data = scenario.build(ctx, rng)
+
+        started = time.perf_counter()
+        if method == 'post':
+            response = client.post(path, data, content_type='application/json', **headers)
+        else:
+            response = client.get(path, data, **headers)
+        samples = [(scenario.name, ((time.perf_counter() - started) * 1000, response.status_code in scenario.statuses))]
+
+        if scenario.write and response.status_code == 201:
+            # The create response has no id; look it up outside the timing
+            appointment_id = Appointment.objects.filter(
+                patient_id=user_id, doctor_id=data['doctor'], appointment_date=data['appointment_date'],
+                appointment_time=data['appointment_time'], status='PENDING'
+            ).values_list('id', flat=True).first()
+            started = time.perf_counter()
+            response = client.post(f'{path}{appointment_id}/cancel/', **headers)
+            samples.append(('appointments.cancel', ((time.perf_counter() - started) * 1000, response.status_code == 200)))
+        return samples
+
+    def summarize(self, samples, elapsed):
+        ordered = sorted(ms for ms, _ in samples)
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for _, ok in samples if not ok),
+            'p50': round(percentile(ordered, 0.50), 3),
+            'p95': round(percentile(ordered, 0.95), 3),
+            'p99': round(percentile(ordered, 0.99), 3),
+            'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def report(self, results, elapsed, options):
+        return {
+            'options': {
+                key: options[key] for key in ('requests', 'duration', 'warmup', 'concurrency', 'users', 'read_only', 'seed')
+            },
+            'database': connection.vendor,
+            'elapsed': round(elapsed, 3),
+            'total': self.summarize([sample for samples in results.values() for sample in samples], elapsed),
+            'endpoints': {name: self.summarize(results[name], elapsed) for name in sorted(results)},
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"endpoint":<26} {"requests":>8} {"errors":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8}'
+        )
+        rows = list(report['endpoints'].items()) + [('total', report['total'])]
+        for name, row in rows:
+            self.stdout.write(
+                f'{name:<26} {row["requests"]:>8} {row["errors"]:>6} {row["p50"]:>8.2f} '
+                f'{row["p95"]:>8.2f} {row["p99"]:>8.2f} {row["rps"]:>8.1f}'
+            )
+
+    def compare(self, report, options):
+        """
+        Print p95 changes against the baseline and return the regressions
+        """
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        failures = []
+        self.stdout.write(f'\n{"endpoint":<26} {"base p95":>9} {"p95":>9} {"change":>8}')
+        for name, row in report['endpoints'].items():
+            base = baseline.get('endpoints', {}).get(name)
+            if not base or min(row['requests'], base['requests']) < options['min_samples'] or not base['p95']:
+                continue
+            change = (row['p95'] / base['p95'] - 1) * 100
+            regressed = change > options['max_regression']
+            self.stdout.write(
+                f'{name:<26} {base["p95"]:>9.2f} {row["p95"]:>9.2f} {change:>+7.1f}%' + ('  REGRESSION' if regressed else '')
+            )
+            if regressed:
+                failures.append(f'{name} p95 {change:+.0f}%')
+        return failures
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from appointments.attachments import purge
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned attachment uploads and attachment files no longer referenced by any record'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--upload-hours', type=float, default=24,
+                            help='Delete uploads that received no chunk for this long')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep unreferenced files at least this long after their last upload')
+
+    def handle(self, *args, **options):
+        uploads, blobs = purge(
+            timedelta(hours=options['upload_hours']),
+            timedelta(hours=options['grace_hours']),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Deleted {uploads} abandoned uploads and {blobs} unreferenced files'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments.stats import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the appointment status counters and repair any drift'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = rebuild_counters()
+
+        if repaired:
+            self.stdout.write(self.style.WARNING(f'Repaired {repaired} drifted appointment counters'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Appointment counters are up to date'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments.ratings import rebuild_doctor_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute every doctor's stored rating aggregates from their reviews"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = rebuild_doctor_ratings()
+
+        if repaired:
+            self.stdout.write(self.style.WARNING(f'Repaired rating aggregates for {repaired} doctors'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Doctor rating aggregates are up to date'))
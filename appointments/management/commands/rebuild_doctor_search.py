@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text doctor search index from the doctor profiles'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} doctors'))
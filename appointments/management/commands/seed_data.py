@@ -0,0 +1,278 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from appointments.availability import time_of_minute
+from appointments.models import Appointment, MedicalRecord, Review, TimeSlot
+from appointments.ratings import rebuild_doctor_ratings
+from appointments.scheduling import WEEKDAYS
+from appointments.stats import rebuild_counters
+from users.models import UserProfile, DoctorProfile
+from users.search import rebuild_search_index
+
+FIRST_NAMES = [
+    'Anna', 'Ben', 'Carla', 'David', 'Elena', 'Farid', 'Grace', 'Hugo', 'Ines', 'Jonas', 'Kira', 'Liam',
+    'Maya', 'Noah', 'Olga', 'Pavel', 'Rosa', 'Sami', 'Tara', 'Viktor', 'Wen', 'Yusuf', 'Zoe', 'Amir',
+]
+LAST_NAMES = [
+    'Smith', 'Garcia', 'Muller', 'Rossi', 'Novak', 'Kowalski', 'Silva', 'Jensen', 'Dubois', 'Tanaka',
+    'Okafor', 'Haddad', 'Larsen', 'Costa', 'Ivanova', 'Schmidt', 'Moreau', 'Berg', 'Nguyen', 'Patel',
+]
+# Share of doctors per specialization
+SPECIALIZATION_WEIGHTS = {
+    'GENERAL': 30, 'PEDIATRICS': 15, 'CARDIOLOGY': 12, 'DERMATOLOGY': 12,
+    'ORTHOPEDICS': 12, 'PSYCHIATRY': 10, 'NEUROLOGY': 9,
+}
+BIO_WORDS = [
+    'heart', 'skin', 'migraine', 'asthma', 'diabetes', 'sports', 'injury', 'children', 'anxiety',
+    'allergy', 'arthritis', 'sleep', 'nutrition', 'vaccination', 'rehabilitation', 'epilepsy',
+]
+REASONS = ['Check-up', 'Follow-up', 'Persistent cough', 'Back pain', 'Headache', 'Rash', 'Vaccination', 'Chest pain']
+DIAGNOSES = ['Common cold', 'Hypertension', 'Migraine', 'Eczema', 'Lower back strain', 'Seasonal allergy', 'Healthy']
+RATING_WEIGHTS = {5: 45, 4: 30, 3: 12, 2: 7, 1: 6}
+BATCH_SIZE = 5000
+APPOINTMENT_CHUNK = 20000
+
+
+def zipf_weights(count, skew):
+    """
+    Popularity weights for count items, in random order: a few are picked
+    far more often than the rest
+    """
+    weights = [1 / (rank + 1) ** skew for rank in range(count)]
+    random.shuffle(weights)
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed patients, doctors, time slots, appointments, medical records and reviews at '
+        'a configurable scale with skewed popularity, then rebuild the derived tables'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--appointments', type=int, default=50000)
+        parser.add_argument('--past-days', type=int, default=365, help='History spread over this many days')
+        parser.add_argument('--future-days', type=int, default=30, help='Time slots and bookings ahead')
+        parser.add_argument('--future-share', type=float, default=0.2, help='Share of appointments in the future')
+        parser.add_argument('--record-rate', type=float, default=0.6,
+                            help='Share of completed appointments with a medical record')
+        parser.add_argument('--review-rate', type=float, default=0.3,
+                            help='Share of completed appointments with a review')
+        parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of doctor popularity')
+        parser.add_argument('--password', default='password', help='Password of every seeded user')
+        parser.add_argument('--prefix', default='seed', help='Username prefix of seeded users')
+        parser.add_argument('--clear', action='store_true', help='Delete users seeded with this prefix first')
+        parser.add_argument('--seed', type=int, default=21)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=f'{prefix}_')
+        if options['clear']:
+            deleted = existing.delete()[0]
+            self.stdout.write(f'Deleted {deleted} previously seeded rows')
+        elif existing.exists():
+            raise CommandError(f'Users prefixed "{prefix}_" already exist; pass --clear or another --prefix')
+
+        start = time.perf_counter()
+        # bulk_create sends no post_save, so the UserProfile rows the User
+        # signal would create are written here, and the counters, ratings
+        # and search index are rebuilt at the end
+        with transaction.atomic():
+            password = make_password(options['password'])
+            patient_ids = self.seed_patients(options, password)
+            doctors = self.seed_doctors(options, password)
+            self.step(start, f'{len(patient_ids)} patients and {len(doctors)} doctors')
+
+            active = self.seed_appointments(options, patient_ids, doctors)
+            self.step(start, f'{options["appointments"]} appointments with records and reviews')
+
+            slots = self.seed_time_slots(options, doctors, active)
+            self.step(start, f'{slots} time slots')
+
+            rebuild_counters()
+            rebuild_doctor_ratings()
+            rebuild_search_index()
+            self.step(start, 'rebuilt counters, ratings and the search index')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - start:.1f}s; log in as {prefix}_patient_0, {prefix}_doctor_0 '
+            f'or {prefix}_admin with password "{options["password"]}"'
+        ))
+
+    def step(self, start, message):
+        self.stdout.write(f'{time.perf_counter() - start:7.1f}s  {message}')
+
+    def create_users(self, usernames, password, role):
+        users = User.objects.bulk_create([
+            User(
+                username=username,
+                first_name=random.choice(FIRST_NAMES),
+                last_name=random.choice(LAST_NAMES),
+                email=f'{username}@example.com',
+                password=password,
+                is_staff=role == 'ADMIN',
+                is_superuser=role == 'ADMIN',
+            )
+            for username in usernames
+        ], batch_size=BATCH_SIZE)
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=user, role=role) for user in users
+        ], batch_size=BATCH_SIZE)
+        return users, profiles
+
+    def seed_patients(self, options, password):
+        prefix = options['prefix']
+        self.create_users([f'{prefix}_admin'], password, 'ADMIN')
+        users, _ = self.create_users(
+            [f'{prefix}_patient_{i}' for i in range(options['patients'])], password, 'PATIENT'
+        )
+        return [user.id for user in users]
+
+    def seed_doctors(self, options, password):
+        prefix = options['prefix']
+        _, profiles = self.create_users(
+            [f'{prefix}_doctor_{i}' for i in range(options['doctors'])], password, 'DOCTOR'
+        )
+        specializations = list(SPECIALIZATION_WEIGHTS)
+        weights = list(SPECIALIZATION_WEIGHTS.values())
+        doctors = []
+        for i, profile in enumerate(profiles):
+            first_hour = random.choice([7, 8, 8, 9, 9, 9, 10])
+            days = WEEKDAYS[:5] if random.random() < 0.8 else WEEKDAYS[:6]
+            if random.random() < 0.3:
+                days = random.sample(days, len(days) - 1)
+            doctors.append(DoctorProfile(
+                user_profile=profile,
+                specialization=random.choices(specializations, weights)[0],
+                license_number=f'{prefix.upper()}-{i:07d}',
+                years_of_experience=random.randint(1, 35),
+                consultation_fee=random.choice([50, 75, 100, 120, 150, 200]),
+                bio=' '.join(random.sample(BIO_WORDS, 4)),
+                available_days=[day for day in WEEKDAYS if day in days],
+                available_time_start=time_of_minute(first_hour * 60),
+                available_time_end=time_of_minute((first_hour + random.choice([6, 8, 8, 9])) * 60),
+                is_available=random.random() < 0.95,
+            ))
+        return DoctorProfile.objects.bulk_create(doctors, batch_size=BATCH_SIZE)
+
+    def schedule(self, doctor):
+        """
+        The doctor's weekday numbers and 30-minute slot start minutes
+        """
+        weekdays = {WEEKDAYS.index(day) for day in doctor.available_days}
+        first = doctor.available_time_start.hour * 60 + doctor.available_time_start.minute
+        last = doctor.available_time_end.hour * 60 + doctor.available_time_end.minute
+        return weekdays, list(range(first, last - 30 + 1, 30))
+
+    def seed_appointments(self, options, patient_ids, doctors):
+        """
+        Write appointments in chunks together with their records and
+        reviews; returns the (doctor_id, date, minute) of active ones
+        """
+        today = timezone.localdate()
+        schedules = {doctor.id: self.schedule(doctor) for doctor in doctors}
+        doctor_weights = zipf_weights(len(doctors), options['skew'])
+        patient_weights = zipf_weights(len(patient_ids), 0.8)
+        ratings, rating_weights = list(RATING_WEIGHTS), list(RATING_WEIGHTS.values())
+        taken = set()
+        active = set()
+
+        remaining = options['appointments']
+        while remaining > 0:
+            count = min(remaining, APPOINTMENT_CHUNK)
+            remaining -= count
+            picked_doctors = random.choices(doctors, doctor_weights, k=count)
+            picked_patients = random.choices(patient_ids, patient_weights, k=count)
+
+            appointments = []
+            for doctor, patient_id in zip(picked_doctors, picked_patients):
+                weekdays, minutes = schedules[doctor.id]
+                if not weekdays or not minutes:
+                    continue
+                for _ in range(5):
+                    future = random.random() < options['future_share']
+                    offset = random.randint(1, options['future_days']) if future else -random.randint(1, options['past_days'])
+                    date = today + timedelta(days=offset)
+                    while date.weekday() not in weekdays:
+                        date += timedelta(days=1)
+                    # Mornings fill up first
+                    minute = minutes[min(int(random.expovariate(3 / len(minutes))), len(minutes) - 1)]
+                    if (doctor.id, date, minute) not in taken:
+                        break
+                else:
+                    continue
+                taken.add((doctor.id, date, minute))
+
+                if date > today:
+                    status = random.choices(['PENDING', 'CONFIRMED', 'CANCELLED'], [50, 40, 10])[0]
+                else:
+                    status = random.choices(['COMPLETED', 'CANCELLED'], [85, 15])[0]
+                if status in ('PENDING', 'CONFIRMED'):
+                    active.add((doctor.id, date, minute))
+                appointments.append(Appointment(
+                    patient_id=patient_id,
+                    doctor_id=doctor.id,
+                    appointment_date=date,
+                    appointment_time=time_of_minute(minute),
+                    status=status,
+                    reason=random.choice(REASONS),
+                ))
+            Appointment.objects.bulk_create(appointments, batch_size=BATCH_SIZE)
+
+            completed = [appointment for appointment in appointments if appointment.status == 'COMPLETED']
+            MedicalRecord.objects.bulk_create([
+                MedicalRecord(
+                    patient_id=appointment.patient_id,
+                    doctor_id=appointment.doctor_id,
+                    appointment=appointment,
+                    diagnosis=random.choice(DIAGNOSES),
+                    prescription=random.choice([None, 'Rest and fluids', 'Ibuprofen 400mg', 'Follow-up in 2 weeks']),
+                )
+                for appointment in completed if random.random() < options['record_rate']
+            ], batch_size=BATCH_SIZE)
+            Review.objects.bulk_create([
+                Review(
+                    patient_id=appointment.patient_id,
+                    doctor_id=appointment.doctor_id,
+                    appointment=appointment,
+                    rating=random.choices(ratings, rating_weights)[0],
+                    comment=random.choice([None, 'Very helpful', 'Long wait', 'Friendly and thorough']),
+                )
+                for appointment in completed if random.random() < options['review_rate']
+            ], batch_size=BATCH_SIZE)
+        return active
+
+    def seed_time_slots(self, options, doctors, active):
+        today = timezone.localdate()
+        created = 0
+        slots = []
+        for doctor in doctors:
+            weekdays, minutes = self.schedule(doctor)
+            for offset in range(1, options['future_days'] + 1):
+                date = today + timedelta(days=offset)
+                if date.weekday() not in weekdays:
+                    continue
+                for minute in minutes:
+                    slots.append(TimeSlot(
+                        doctor_id=doctor.id,
+                        date=date,
+                        start_time=time_of_minute(minute),
+                        end_time=time_of_minute(minute + 30),
+                        is_booked=(doctor.id, date, minute) in active,
+                    ))
+            if len(slots) >= APPOINTMENT_CHUNK:
+                TimeSlot.objects.bulk_create(slots, batch_size=BATCH_SIZE)
+                created += len(slots)
+                slots = []
+        TimeSlot.objects.bulk_create(slots, batch_size=BATCH_SIZE)
+        return created + len(slots)
@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -25,7 +27,25 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
-        unique_together = ['doctor', 'appointment_date', 'appointment_time']
+        constraints = [
+            # Only active appointments hold a slot, so a cancelled or
+            # completed one doesn't block it from being booked again
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='appt_active_slot_uniq',
+            ),
+        ]
+        indexes = [
+            # Patient list with date range filters
+            models.Index(fields=['patient', 'appointment_date'], name='appt_patient_date_idx'),
+            # Doctor upcoming / status-filtered lists
+            models.Index(fields=['doctor', 'status', 'appointment_date'], name='appt_doctor_status_date_idx'),
+            # Admin upcoming list
+            models.Index(fields=['status', 'appointment_date'], name='appt_status_date_idx'),
+            # Default ordering and keyset pagination over all appointments
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appt_date_time_idx'),
+        ]
         verbose_name = 'Appointment'
         verbose_name_plural = 'Appointments'
 
@@ -49,8 +69,61 @@ class Appointment(models.Model):
             raise ValidationError("This doctor is not currently available")
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        # Slot conflicts are checked against the availability index by the
+        # serializers and enforced by the database constraint, so skip the
+        # extra uniqueness queries full_clean() would run.
+        self.full_clean(validate_unique=False, validate_constraints=False)
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            raise ValidationError("This time slot is already booked")
+
+
+class AppointmentCounter(models.Model):
+    """
+    Denormalized appointment counts per scope and status
+    """
+    SCOPE_CHOICES = (
+        ('GLOBAL', 'Global'),
+        ('PATIENT', 'Patient'),
+        ('DOCTOR', 'Doctor'),
+    )
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    scope_id = models.BigIntegerField(default=0)  # User id for patients, DoctorProfile id for doctors
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['scope', 'scope_id', 'status']
+        verbose_name = 'Appointment Counter'
+        verbose_name_plural = 'Appointment Counters'
+
+    def __str__(self):
+        return f"{self.scope} {self.scope_id} - {self.status}: {self.count}"
+
+
+class AppointmentStatusChange(models.Model):
+    """
+    One row per appointment status transition
+    """
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    to_status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['changed_at', 'id']
+        indexes = [
+            models.Index(fields=['appointment', 'changed_at'], name='status_change_appt_idx'),
+        ]
+        verbose_name = 'Appointment Status Change'
+        verbose_name_plural = 'Appointment Status Changes'
+
+    def __str__(self):
+        return f"Appointment {self.appointment_id}: {self.from_status} -> {self.to_status}"
 
 
 class MedicalRecord(models.Model):
@@ -67,6 +140,10 @@ class MedicalRecord(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='record_patient_created_idx'),
+            models.Index(fields=['doctor', 'created_at'], name='record_doctor_created_idx'),
+        ]
         verbose_name = 'Medical Record'
         verbose_name_plural = 'Medical Records'
 
@@ -74,6 +151,57 @@ class MedicalRecord(models.Model):
         return f"{self.patient.username} - {self.created_at.strftime('%Y-%m-%d')}"
 
 
+class MedicalRecordAttachment(models.Model):
+    """
+    A file attached to a medical record
+
+    The content lives in the attachment store under its SHA-256, so
+    attachments with the same content share one file on disk.
+    """
+    record = models.ForeignKey(MedicalRecord, on_delete=models.CASCADE, related_name='files')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, default='application/octet-stream')
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, db_index=True)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = 'Medical Record Attachment'
+        verbose_name_plural = 'Medical Record Attachments'
+
+    def __str__(self):
+        return f"{self.filename} ({self.size} bytes)"
+
+
+class AttachmentUpload(models.Model):
+    """
+    An attachment upload in progress; chunks are appended to a part file
+    until offset reaches size
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    record = models.ForeignKey(MedicalRecord, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, default='application/octet-stream')
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='upload_updated_idx'),
+        ]
+        verbose_name = 'Attachment Upload'
+        verbose_name_plural = 'Attachment Uploads'
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes)"
+
+
 class TimeSlot(models.Model):
     """
     Represents available time slots for doctors
@@ -84,10 +212,20 @@ class TimeSlot(models.Model):
     end_time = models.TimeField()
     is_booked = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date', 'start_time']
         unique_together = ['doctor', 'date', 'start_time']
+        indexes = [
+            # Available slot listing; partial so it only holds free slots and
+            # matches the "NOT is_booked" predicate Django generates
+            models.Index(
+                fields=['date', 'start_time'],
+                condition=models.Q(is_booked=False),
+                name='slot_free_date_idx',
+            ),
+        ]
         verbose_name = 'Time Slot'
         verbose_name_plural = 'Time Slots'
 
@@ -124,6 +262,10 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['doctor', 'rating'], name='review_doctor_rating_idx'),
+            models.Index(fields=['doctor', 'created_at'], name='review_doctor_created_idx'),
+        ]
         verbose_name = 'Review'
         verbose_name_plural = 'Reviews'
 
@@ -0,0 +1,144 @@
+"""
+Opt-in keyset (cursor) pagination.
+
+Views keep the default page-number pagination unless the client asks for
+cursor mode with ?pagination=cursor or follows a ?cursor= link. In cursor
+mode the view's keyset_ordering is applied and each page is fetched with a
+WHERE clause on the last row's ordering values instead of an OFFSET, and no
+COUNT(*) is run, so every page costs the same as the first.
+"""
+import base64
+import json
+from collections import OrderedDict
+from functools import partial
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator for a queryset whose row count the view already knows
+    """
+
+    def __init__(self, *args, count, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count = count
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    PageNumberPagination with an opt-in keyset mode driven by view.keyset_ordering
+
+    keyset_ordering must end with a unique field (usually 'id') so that every
+    row has a distinct position.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def wants_cursor(self, request, view=None):
+        """
+        Whether the request is paged in cursor mode
+        """
+        return bool(getattr(view, 'keyset_ordering', None)) and (
+            self.cursor_query_param in request.query_params or
+            request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_ordering = getattr(view, 'keyset_ordering', None)
+        self.cursor_mode = self.wants_cursor(request, view)
+        if not self.cursor_mode:
+            count = getattr(view, 'list_count', None)
+            if count is not None:
+                self.django_paginator_class = partial(CountedPaginator, count=count)
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.keyset_ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = self.decode_cursor(cursor, queryset.model)
+            queryset = queryset.filter(self.keyset_filter(values))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def keyset_filter(self, values):
+        """
+        Build the "comes after this position" condition for the ordering
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.keyset_ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        # Redundant bound on the leading column so the database can use an
+        # index range scan instead of evaluating the OR chain row by row.
+        first = self.keyset_ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+
+    def encode_cursor(self, row):
+        # Rows are model instances, or dicts when a values() fast path is used
+        names = [field.lstrip('-') for field in self.keyset_ordering]
+        if isinstance(row, dict):
+            values = [row[name] for name in names]
+        else:
+            values = [getattr(row, name) for name in names]
+        payload = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.keyset_ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.keyset_ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        if not self.cursor_mode:
+            return super().get_paginated_response_schema(schema)
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,72 @@
+"""
+Admin changelist pagination without a full-table COUNT(*).
+
+An exact COUNT(*) has to visit every row, which is what made the admin
+appointment list slow. EstimatedCountPaginator asks the database for its
+row estimate instead when the changelist is unfiltered and the table has
+more than ADMIN_ESTIMATED_COUNT_THRESHOLD rows; filtered lists and small
+tables are still counted exactly. The last pages of an estimated list may
+be short or empty.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def get_threshold():
+    return getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 50000)
+
+
+def estimate_count(model, using='default'):
+    """
+    Return the database's estimate of a table's row count, or None
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+                row = cursor.fetchone()
+                # -1 until the table has been vacuumed or analyzed
+                if row and row[0] >= 0:
+                    return row[0]
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s", [table]
+                )
+                row = cursor.fetchone()
+                if row and row[0] is not None:
+                    return row[0]
+            elif connection.vendor == 'sqlite':
+                # SQLite keeps no estimate unless ANALYZE has run; the rowid
+                # range is read from the primary key index and is close
+                # enough while few rows have been deleted.
+                pk = model._meta.pk
+                if pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+                    column = connection.ops.quote_name(pk.column)
+                    cursor.execute(
+                        f"SELECT MAX({column}) - MIN({column}) + 1 FROM {connection.ops.quote_name(table)}"
+                    )
+                    row = cursor.fetchone()
+                    return row[0] or 0
+    except DatabaseError:
+        pass
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses estimate_count() for large unfiltered querysets
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.distinct and not query.is_sliced:
+            estimate = estimate_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= get_threshold():
+                return estimate
+        return super().count
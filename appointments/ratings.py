@@ -0,0 +1,122 @@
+"""
+Denormalized doctor rating aggregates.
+
+DoctorProfile stores the review count, rating sum, average and a per-star
+histogram. Review signals apply each create/edit/delete as one UPDATE on the
+doctor row, so rating stats and rating-ordered listings never aggregate over
+the reviews table. rebuild_doctor_ratings() recomputes everything. Every
+change also invalidates the cached doctor directory (users.response_cache),
+which shows the averages.
+"""
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from users.models import DoctorProfile
+from users.response_cache import bump_version
+from .models import Review
+
+STARS = range(1, 6)
+
+
+def _histogram_field(rating):
+    return f'rating_{rating}_count'
+
+
+def apply_rating_change(doctor_id, old_rating=None, new_rating=None):
+    """
+    Move one review between rating buckets on a doctor's aggregates
+
+    old_rating is None for a new review, new_rating is None for a deleted one.
+    """
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+
+    updates = {}
+    if old_rating is not None:
+        field = _histogram_field(old_rating)
+        updates[field] = F(field) - 1
+    if new_rating is not None:
+        field = _histogram_field(new_rating)
+        updates[field] = updates.get(field, F(field)) + 1
+
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    # The right-hand side of an UPDATE sees the old row, so the average is
+    # computed from the old values plus the deltas.
+    updates.update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        average_rating=Case(
+            When(rating_count=-count_delta, then=Value(0.0)),
+            default=Cast(new_sum, FloatField()) / new_count,
+            output_field=FloatField(),
+        ),
+    )
+    DoctorProfile.objects.filter(id=doctor_id).update(**updates)
+    bump_version()
+
+
+def rating_stats(doctor):
+    """
+    Build the review statistics response from a doctor's stored aggregates
+    """
+    return {
+        'total_reviews': doctor.rating_count,
+        'average_rating': doctor.average_rating,
+        'rating_distribution': {
+            f'{rating}_star': getattr(doctor, _histogram_field(rating))
+            for rating in reversed(STARS)
+        }
+    }
+
+
+def _rating_aggregates():
+    aggregates = {
+        'rating_count': Count('id'),
+        'rating_sum': Coalesce(Sum('rating'), 0),
+    }
+    for rating in STARS:
+        aggregates[_histogram_field(rating)] = Count('id', filter=Q(rating=rating))
+    return aggregates
+
+
+def _with_average(totals):
+    totals['average_rating'] = totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else 0
+    return totals
+
+
+def recompute_doctor_rating(doctor_id):
+    """
+    Recompute one doctor's rating aggregates with a single aggregate query
+    """
+    totals = _with_average(Review.objects.filter(doctor_id=doctor_id).aggregate(**_rating_aggregates()))
+    DoctorProfile.objects.filter(id=doctor_id).update(**totals)
+    bump_version()
+
+
+def rebuild_doctor_ratings():
+    """
+    Recompute every doctor's rating aggregates from the reviews table
+
+    Returns the number of doctors whose stored aggregates were wrong.
+    """
+    totals = {
+        row.pop('doctor_id'): _with_average(row)
+        for row in Review.objects.order_by().values('doctor_id').annotate(**_rating_aggregates())
+    }
+
+    fields = ['rating_count', 'rating_sum', 'average_rating'] + [_histogram_field(r) for r in STARS]
+    empty = dict.fromkeys(fields, 0)
+    drifted = []
+
+    for doctor in DoctorProfile.objects.only(*fields).iterator():
+        expected = totals.get(doctor.id, empty)
+        if any(getattr(doctor, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(doctor, field, value)
+            drifted.append(doctor)
+
+    DoctorProfile.objects.bulk_update(drifted, fields, batch_size=500)
+    if drifted:
+        bump_version()
+    return len(drifted)
@@ -0,0 +1,155 @@
+"""
+Bulk expansion of DoctorProfile weekly schedules into TimeSlot rows.
+
+Slots are generated in memory, checked for overlaps against the doctor's
+existing slots with one minute-resolution bitmap per doctor-day, and written
+with bulk_create. Existing slots are loaded once per chunk of doctors rather
+than once per slot, and each chunk is written in its own transaction. Slots starting at the time of an active appointment are
+created already booked. The doctors' lists in the free slot index are
+dropped once the new slots commit.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import ACTIVE_STATUSES, get_slot_minutes, time_of_minute
+from .freeslots import free_slot_index
+from .models import Appointment, TimeSlot
+from users.models import DoctorProfile
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DOCTOR_CHUNK_SIZE = 200
+BATCH_SIZE = 5000
+
+
+def _minutes(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value, '%H:%M').time()
+    return value.hour * 60 + value.minute
+
+
+def _interval_mask(start, end):
+    return ((1 << (end - start)) - 1) << start
+
+
+def generate_time_slots(doctors, start_date, end_date, slot_minutes=None,
+                        weekdays=None, interval_weeks=1, exclude_dates=()):
+    """
+    Create TimeSlot rows for each doctor's weekly schedule between two dates
+
+    weekdays overrides DoctorProfile.available_days, interval_weeks repeats the
+    schedule every N weeks counted from start_date, and exclude_dates skips
+    holidays. Slots overlapping an existing slot, or starting in the past, are
+    skipped. Returns the number of slots actually inserted.
+    """
+    slot_minutes = slot_minutes or get_slot_minutes()
+    exclude_dates = set(exclude_dates)
+    now = timezone.localtime()
+    created = 0
+
+    doctors = list(doctors)
+    for offset in range(0, len(doctors), DOCTOR_CHUNK_SIZE):
+        with transaction.atomic():
+            created += _generate_chunk(
+                doctors[offset:offset + DOCTOR_CHUNK_SIZE], start_date, end_date, slot_minutes,
+                weekdays, interval_weeks, exclude_dates, now
+            )
+
+    doctor_ids = [doctor.id for doctor in doctors]
+
+    def apply():
+        for doctor_id in doctor_ids:
+            free_slot_index.invalidate(doctor_id)
+
+    transaction.on_commit(apply)
+    return created
+
+
+def _generate_chunk(chunk, start_date, end_date, slot_minutes, weekdays, interval_weeks, exclude_dates, now):
+    """
+    Create one chunk of doctors' slots and return how many were inserted
+
+    Runs in a transaction holding the doctors' rows, so another generation
+    for the same doctors waits for it and the recount after the insert sees
+    only this chunk's rows (bar single slots created through the API in
+    the meantime).
+    """
+    today = now.date()
+    current_minute = now.hour * 60 + now.minute
+    list(DoctorProfile.objects.select_for_update().filter(id__in=[doctor.id for doctor in chunk]).values_list('id'))
+    occupied, existing = _load_occupied(chunk, start_date, end_date)
+    booked = _load_booked(chunk, start_date, end_date)
+    slots = []
+
+    for doctor in chunk:
+        days = {WEEKDAYS.index(day) for day in (weekdays or doctor.available_days or []) if day in WEEKDAYS}
+        if not days:
+            continue
+
+        first = _minutes(doctor.available_time_start)
+        last = _minutes(doctor.available_time_end)
+        starts = list(range(first, last - slot_minutes + 1, slot_minutes))
+
+        date = max(start_date, today)
+        while date <= end_date:
+            week = (date - start_date).days // 7
+            if date.weekday() in days and week % interval_weeks == 0 and date not in exclude_dates:
+                bitmap = occupied.get((doctor.id, date), 0)
+                for start in starts:
+                    if date == today and start < current_minute:
+                        continue
+                    end = start + slot_minutes
+                    if bitmap & _interval_mask(start, end):
+                        continue
+                    slots.append(TimeSlot(
+                        doctor_id=doctor.id,
+                        date=date,
+                        start_time=time_of_minute(start),
+                        end_time=time_of_minute(end),
+                        is_booked=(doctor.id, date, start) in booked,
+                    ))
+            date += timedelta(days=1)
+
+    if not slots:
+        return 0
+
+    # ignore_conflicts covers slots created concurrently through the API;
+    # the rows it skips aren't reported, so count the chunk's slots again
+    TimeSlot.objects.bulk_create(slots, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return TimeSlot.objects.filter(
+        doctor_id__in=[doctor.id for doctor in chunk], date__gte=start_date, date__lte=end_date
+    ).count() - existing
+
+
+def _load_occupied(doctors, start_date, end_date):
+    """
+    Build an occupancy bitmap per (doctor_id, date) from existing slots,
+    and return it with the number of slots read
+    """
+    occupied = {}
+    count = 0
+    rows = TimeSlot.objects.filter(
+        doctor__in=[doctor.id for doctor in doctors],
+        date__gte=start_date,
+        date__lte=end_date
+    ).values_list('doctor_id', 'date', 'start_time', 'end_time')
+
+    for doctor_id, date, start_time, end_time in rows:
+        key = (doctor_id, date)
+        occupied[key] = occupied.get(key, 0) | _interval_mask(_minutes(start_time), _minutes(end_time))
+        count += 1
+    return occupied, count
+
+
+def _load_booked(doctors, start_date, end_date):
+    """
+    Return the (doctor_id, date, minute) starts of active appointments
+    """
+    rows = Appointment.objects.filter(
+        doctor__in=[doctor.id for doctor in doctors],
+        appointment_date__gte=start_date,
+        appointment_date__lte=end_date,
+        status__in=ACTIVE_STATUSES
+    ).values_list('doctor_id', 'appointment_date', 'appointment_time')
+    return {(doctor_id, date, _minutes(time)) for doctor_id, date, time in rows}
@@ -1,18 +1,70 @@
+import functools
+from contextlib import contextmanager
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Appointment, MedicalRecord, TimeSlot, Review
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .models import (
+    Appointment, AttachmentUpload, MedicalRecord, MedicalRecordAttachment, TimeSlot, Review
+)
+from .availability import availability_index
+from .batch import MAX_BATCH_SIZE
+from .booking import book_appointment
+from .fastpath import FlatSerializer, full_name_or_username
+from .sparse import SparseFieldsMixin
+from .transitions import ACTIONS
+from .scheduling import WEEKDAYS
+from users.models import DoctorProfile
 from users.serializers import UserSerializer, DoctorProfileSerializer
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+@contextmanager
+def model_validation_errors():
+    """
+    Re-raise Django ValidationErrors from saving a model (a slot taken
+    after validate() passed, say) as DRF ones, so they answer 400
+    """
+    try:
+        yield
+    except DjangoValidationError as error:
+        raise serializers.ValidationError(error.messages)
+
+
+def validate_slot_is_free(data, instance=None):
+    """
+    Reject bookings for a slot that already has an active appointment
+    """
+    doctor = data['doctor']
+    appointment_date = data['appointment_date']
+    appointment_time = data['appointment_time']
+
+    if instance and (instance.doctor_id, instance.appointment_date, instance.appointment_time) == \
+            (doctor.id, appointment_date, appointment_time):
+        return
+
+    if not availability_index.is_free(doctor.id, appointment_date, appointment_time):
+        raise serializers.ValidationError("This time slot is already booked")
+
+
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField()
     doctor_name = serializers.SerializerMethodField()
     doctor_details = DoctorProfileSerializer(source='doctor', read_only=True)
+
+    expandable_fields = ('doctor_details',)
+    compiled_method_fields = {
+        'patient_name': full_name_or_username('patient'),
+        'doctor_name': full_name_or_username('doctor__user_profile__user'),
+    }
     
     class Meta:
         model = Appointment
         fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        # Status only changes through the confirm/complete/cancel actions,
+        # which enforce the state machine in appointments.transitions
+        read_only_fields = ['id', 'status', 'created_at', 'updated_at']
+        # Slot uniqueness is checked in validate() against the availability index
+        validators = []
 
     def get_patient_name(self, obj):
         return obj.patient.get_full_name() or obj.patient.username
@@ -37,36 +89,49 @@ class AppointmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("This doctor is not currently available")
         
         # Check if slot is already booked
-        existing = Appointment.objects.filter(
-            doctor=data['doctor'],
-            appointment_date=data['appointment_date'],
-            appointment_time=data['appointment_time'],
-            status__in=['PENDING', 'CONFIRMED']
-        )
-        
-        if self.instance:
-            existing = existing.exclude(id=self.instance.id)
-        
-        if existing.exists():
-            raise serializers.ValidationError("This time slot is already booked")
-        
+        validate_slot_is_free(data, self.instance)
+
         return data
 
+    def update(self, instance, validated_data):
+        with model_validation_errors():
+            return super().update(instance, validated_data)
+
+
+@functools.lru_cache(maxsize=128)
+def get_appointment_flat_serializer(sparse=None):
+    """
+    AppointmentSerializer compiled into a values()-based fast path for reads,
+    once per requested field set
+    """
+    return FlatSerializer(AppointmentSerializer(sparse=sparse))
+
 
 class AppointmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = ['doctor', 'appointment_date', 'appointment_time', 'reason']
+        validators = []
+
+    def validate(self, data):
+        validate_slot_is_free(data)
+        return data
 
     def create(self, validated_data):
         # Set patient from request user
-        validated_data['patient'] = self.context['request'].user
-        return super().create(validated_data)
+        validated_data['patient_id'] = self.context['request'].user.id
+        with model_validation_errors():
+            return book_appointment(**validated_data)
 
 
-class MedicalRecordSerializer(serializers.ModelSerializer):
+class MedicalRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField()
     doctor_name = serializers.SerializerMethodField()
+
+    compiled_method_fields = {
+        'patient_name': full_name_or_username('patient'),
+        'doctor_name': full_name_or_username('doctor__user_profile__user'),
+    }
     
     class Meta:
         model = MedicalRecord
@@ -80,13 +145,34 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
         return obj.doctor.user_profile.user.get_full_name() or obj.doctor.user_profile.user.username
 
 
-class TimeSlotSerializer(serializers.ModelSerializer):
+class MedicalRecordAttachmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MedicalRecordAttachment
+        fields = ['id', 'record', 'filename', 'content_type', 'size', 'sha256', 'uploaded_by', 'created_at']
+        read_only_fields = fields
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+    size = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = AttachmentUpload
+        fields = ['id', 'record', 'filename', 'content_type', 'size', 'offset', 'sha256', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'record', 'offset', 'created_at', 'updated_at']
+
+
+class TimeSlotSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     doctor_name = serializers.SerializerMethodField()
+
+    compiled_method_fields = {
+        'doctor_name': full_name_or_username('doctor__user_profile__user'),
+    }
     
     class Meta:
         model = TimeSlot
         fields = '__all__'
-        read_only_fields = ['id', 'is_booked', 'created_at']
+        read_only_fields = ['id', 'is_booked', 'created_at', 'updated_at']
 
     def get_doctor_name(self, obj):
         return obj.doctor.user_profile.user.get_full_name() or obj.doctor.user_profile.user.username
@@ -110,9 +196,91 @@ class TimeSlotSerializer(serializers.ModelSerializer):
         return data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class TimeSlotGenerationSerializer(serializers.Serializer):
+    WEEKDAY_CHOICES = [(day, day) for day in WEEKDAYS]
+
+    doctors = serializers.PrimaryKeyRelatedField(queryset=DoctorProfile.objects.all(), many=True, required=False)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    slot_minutes = serializers.IntegerField(min_value=5, max_value=480, required=False)
+    weekdays = serializers.ListField(child=serializers.ChoiceField(choices=WEEKDAY_CHOICES), required=False)
+    interval_weeks = serializers.IntegerField(min_value=1, default=1)
+    exclude_dates = serializers.ListField(child=serializers.DateField(), required=False, default=list)
+
+    def validate(self, data):
+        """
+        Validate the generation range
+        """
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("End date must be on or after start date")
+
+        if (data['end_date'] - data['start_date']).days > 366:
+            raise serializers.ValidationError("Slots can be generated for at most one year at a time")
+
+        return data
+
+
+class EarliestSlotQuerySerializer(serializers.Serializer):
+    specialization = serializers.ChoiceField(choices=DoctorProfile.SPECIALIZATION_CHOICES, required=False)
+    doctors = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=500)
+    after = serializers.DateTimeField(required=False)
+    time_from = serializers.TimeField(required=False)
+    time_to = serializers.TimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, data):
+        """
+        Validate the time-of-day window
+        """
+        if 'time_from' in data and 'time_to' in data and data['time_to'] <= data['time_from']:
+            raise serializers.ValidationError("time_to must be after time_from")
+        return data
+
+
+class AppointmentBatchFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, required=False)
+    date = serializers.DateField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+
+class AppointmentBatchSerializer(serializers.Serializer):
+    ACTION_CHOICES = ['book'] + list(ACTIONS)
+
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=MAX_BATCH_SIZE
+    )
+    filter = AppointmentBatchFilterSerializer(required=False)
+    appointments = serializers.ListField(
+        child=serializers.DictField(), required=False, allow_empty=False, max_length=MAX_BATCH_SIZE
+    )
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        """
+        Check that the targets match the action
+        """
+        if data['action'] == 'book':
+            if 'appointments' not in data:
+                raise serializers.ValidationError("Provide the appointments to book")
+        elif ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Provide either ids or a filter")
+
+        if 'ids' in data:
+            # Drop duplicates, keeping the order
+            data['ids'] = list(dict.fromkeys(data['ids']))
+        return data
+
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField()
     doctor_name = serializers.SerializerMethodField()
+
+    compiled_method_fields = {
+        'patient_name': full_name_or_username('patient'),
+        'doctor_name': full_name_or_username('doctor__user_profile__user'),
+    }
     
     class Meta:
         model = Review
@@ -134,14 +302,14 @@ class ReviewSerializer(serializers.ModelSerializer):
         if appointment and appointment.status != 'COMPLETED':
             raise serializers.ValidationError("Can only review completed appointments")
         
-        if appointment and appointment.patient != self.context['request'].user:
+        if appointment and appointment.patient_id != self.context['request'].user.id:
             raise serializers.ValidationError("You can only review your own appointments")
         
         return data
 
     def create(self, validated_data):
         # Set patient from request user
-        validated_data['patient'] = self.context['request'].user
+        validated_data['patient_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
 
@@ -0,0 +1,155 @@
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .availability import availability_index, ACTIVE_STATUSES
+from .booking import claim_slot, release_slot
+from .freeslots import free_slot_index
+from .models import Appointment, AppointmentStatusChange, Review, TimeSlot
+from .ratings import apply_rating_change, recompute_doctor_rating
+from .stats import record_transition
+
+TRACKED_FIELDS = ('patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'status')
+
+
+def _tracked_state(appointment):
+    # Read straight from __dict__ so deferred fields are never loaded here;
+    # a partially loaded appointment has no known state.
+    values = appointment.__dict__
+    if any(field not in values for field in TRACKED_FIELDS):
+        return None
+    return {field: values[field] for field in TRACKED_FIELDS}
+
+
+def _slot_key(state):
+    if state and state['status'] in ACTIVE_STATUSES and state['doctor_id']:
+        return (state['doctor_id'], state['appointment_date'], state['appointment_time'])
+    return None
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    """Remember the appointment's slot and status as loaded"""
+    instance._original_state = _tracked_state(instance)
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_delete, sender=Appointment)
+def load_appointment_state(sender, instance, **kwargs):
+    """
+    Read a partially loaded appointment's slot and status from the database
+    before it is saved or deleted, so the change is synced like any other
+    """
+    if instance._original_state is None and not instance._state.adding:
+        instance._original_state = Appointment.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=Appointment)
+def sync_appointment_state_on_save(sender, instance, created, **kwargs):
+    """
+    Update the status counters and TimeSlot claims (in the save's
+    transaction) and move the appointment's slot in the availability and
+    free slot indexes (after commit)
+    """
+    old_state = None if created else instance._original_state
+    new_state = _tracked_state(instance)
+    if new_state is None:
+        # Saved from a partially loaded instance: read back what was saved
+        instance.refresh_from_db(fields=['patient', 'doctor', 'appointment_date', 'appointment_time', 'status'])
+        new_state = _tracked_state(instance)
+    instance._original_state = new_state
+
+    if old_state is None or old_state['status'] != new_state['status'] or \
+            old_state['patient_id'] != new_state['patient_id'] or \
+            old_state['doctor_id'] != new_state['doctor_id']:
+        record_transition(old_state, new_state)
+
+    if old_state is not None and old_state['status'] != new_state['status']:
+        # Status edited through a plain save(), e.g. the admin or a PUT
+        AppointmentStatusChange.objects.create(
+            appointment=instance, from_status=old_state['status'], to_status=new_state['status']
+        )
+
+    old_slot = _slot_key(old_state)
+    new_slot = _slot_key(new_state)
+    if old_slot == new_slot:
+        return
+
+    if old_slot:
+        release_slot(*old_slot)
+    if new_slot and not getattr(instance, '_slot_claimed', False):
+        claim_slot(*new_slot)
+    instance._slot_claimed = False
+
+    def apply():
+        if old_slot:
+            availability_index.release(*old_slot)
+            free_slot_index.release([old_slot])
+        if new_slot:
+            availability_index.occupy(*new_slot)
+            free_slot_index.occupy(*new_slot)
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_delete, sender=Appointment)
+def sync_appointment_state_on_delete(sender, instance, **kwargs):
+    """Remove a deleted appointment from the counters, slots and availability indexes"""
+    old_state = instance._original_state
+    if old_state is None:
+        return
+
+    record_transition(old_state, None)
+
+    old_slot = _slot_key(old_state)
+    if old_slot:
+        release_slot(*old_slot)
+
+        def apply():
+            availability_index.release(*old_slot)
+            free_slot_index.release([old_slot])
+
+        transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def sync_free_slot_index(sender, instance, **kwargs):
+    """Drop the doctor's free slots from the index after a TimeSlot changes"""
+    transaction.on_commit(lambda: free_slot_index.invalidate(instance.doctor_id))
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """Remember the review's doctor and rating as loaded"""
+    values = instance.__dict__
+    instance._original_rating = (values.get('doctor_id'), values.get('rating'))
+
+
+@receiver(post_save, sender=Review)
+def sync_doctor_rating_on_save(sender, instance, created, **kwargs):
+    """Apply a created or edited review to the doctor's rating aggregates"""
+    old_doctor_id, old_rating = (None, None) if created else instance._original_rating
+    instance._original_rating = (instance.doctor_id, instance.rating)
+
+    if old_rating is None and not created:
+        # Saved from a partially loaded review, so the old rating is unknown.
+        for doctor_id in {old_doctor_id, instance.doctor_id} - {None}:
+            recompute_doctor_rating(doctor_id)
+        return
+
+    if old_doctor_id == instance.doctor_id:
+        if old_rating != instance.rating:
+            apply_rating_change(instance.doctor_id, old_rating, instance.rating)
+    else:
+        if old_doctor_id is not None:
+            apply_rating_change(old_doctor_id, old_rating, None)
+        apply_rating_change(instance.doctor_id, None, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def sync_doctor_rating_on_delete(sender, instance, **kwargs):
+    """Remove a deleted review from the doctor's rating aggregates"""
+    doctor_id, rating = instance._original_rating
+    if rating is not None:
+        apply_rating_change(doctor_id, rating, None)
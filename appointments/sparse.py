@@ -0,0 +1,150 @@
+"""
+Sparse fieldsets (?fields=) and on-demand expansion (?expand=) for reads.
+
+    ?fields=id,status,doctor_details.specialization
+    ?expand=doctor_details.user_profile
+
+Without either parameter responses are unchanged. Once a client sends one,
+only the listed fields are returned (all fields if ?fields= is absent) and
+nested objects named in a serializer's `expandable_fields` are left out
+unless they appear in ?expand= or ?fields=. Dotted names apply to nested
+serializers. The viewset mixin also trims the queryset to match, loading
+only the needed columns with only() and joining only the relations that
+are rendered.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+from .fastpath import FlatSerializer
+
+
+def parse_field_tree(value):
+    """
+    Parse "a,b.c,b.d" into {'a': {}, 'b': {'c': {}, 'd': {}}}
+    """
+    tree = {}
+    for item in value.split(','):
+        node = tree
+        for part in item.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _freeze(tree):
+    if tree is None:
+        return None
+    return tuple(sorted((name, _freeze(child)) for name, child in tree.items()))
+
+
+class SparseSpec:
+    """
+    The requested fields (None for all) and expansions for one serializer
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand or {}
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        fields = parse_field_tree(params['fields']) if 'fields' in params else None
+        return cls(fields, parse_field_tree(params.get('expand', '')))
+
+    def includes(self, name, expandable):
+        if self.fields is not None:
+            return name in self.fields
+        return not expandable or name in self.expand
+
+    def child(self, name):
+        fields = self.fields.get(name) if self.fields is not None else None
+        return SparseSpec(fields or None, self.expand.get(name))
+
+    def key(self):
+        return (_freeze(self.fields), _freeze(self.expand))
+
+    def __eq__(self, other):
+        return isinstance(other, SparseSpec) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin applying a SparseSpec passed as the `sparse` kwarg
+
+    expandable_fields names the nested serializers that are omitted in
+    sparse mode unless requested.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, sparse=None, **kwargs):
+        self._sparse = sparse
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self._sparse
+        if spec is None:
+            return fields
+
+        kept = {}
+        for name, field in fields.items():
+            if not spec.includes(name, name in self.expandable_fields):
+                continue
+            if isinstance(field, SparseFieldsMixin):
+                field._sparse = spec.child(name)
+            kept[name] = field
+        return kept
+
+
+def queryset_paths(serializer):
+    """
+    Return the only() columns and select_related() relations a serializer
+    instance reads
+    """
+    paths = FlatSerializer(serializer).paths
+    relations = set()
+    for path in paths:
+        parts = path.split('__')[:-1]
+        relations.update('__'.join(parts[:i]) for i in range(1, len(parts) + 1))
+
+    # The foreign keys being traversed must be loaded too
+    columns = set(paths) | relations
+    return sorted(columns), sorted(relations)
+
+
+class SparseFieldsViewMixin:
+    """
+    Viewset mixin passing ?fields= / ?expand= to the serializer on reads and
+    trimming the queryset to the columns and joins it needs
+    """
+
+    def get_sparse_spec(self):
+        # Writes always validate against the full serializer
+        if self.request.method not in SAFE_METHODS:
+            return None
+        return SparseSpec.from_request(self.request)
+
+    def get_serializer(self, *args, **kwargs):
+        spec = self.get_sparse_spec()
+        if spec is not None and issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            kwargs.setdefault('sparse', spec)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_sparse_spec() is None or not issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            return queryset
+
+        columns, relations = queryset_paths(self.get_serializer())
+        relations = [r for r in relations if not any(other.startswith(r + '__') for other in relations)]
+        # Keep the keyset pagination columns so cursors don't hit deferred fields
+        ordering = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', None) or ()]
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only('pk', *columns, *ordering)
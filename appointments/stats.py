@@ -0,0 +1,168 @@
+"""
+Incrementally maintained appointment statistics.
+
+AppointmentCounter holds one row per (scope, scope_id, status). Status
+transitions adjust the affected rows with a single UPDATE inside the same
+transaction as the appointment write. Transitions only touch scopes that are
+already initialized; a scope without counter rows is recomputed from the
+appointments table with one conditional-aggregation query the first time its
+stats are read, with its counter rows locked so that transitions committing
+meanwhile are applied on top of the recomputed counts rather than lost.
+rebuild_counters() recomputes every scope and repairs drift.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, When
+
+from .models import Appointment, AppointmentCounter
+
+STATUSES = [status for status, _ in Appointment.STATUS_CHOICES]
+GLOBAL_SCOPE = ('GLOBAL', 0)
+
+
+def _status_counts():
+    return {
+        status.lower(): Count('id', filter=Q(status=status))
+        for status in STATUSES
+    }
+
+
+def _scopes(state):
+    return [GLOBAL_SCOPE, ('PATIENT', state['patient_id']), ('DOCTOR', state['doctor_id'])]
+
+
+def record_transition(old_state, new_state):
+    """
+    Move an appointment between status counters
+
+    Either state may be None for creation or deletion. States are dicts with
+    patient_id, doctor_id and status.
+    """
+    record_transitions([(old_state, new_state)])
+
+
+def record_transitions(transitions):
+    """
+    Apply many (old_state, new_state) transitions with a single UPDATE
+    """
+    deltas = defaultdict(int)
+    for old_state, new_state in transitions:
+        if old_state:
+            for scope, scope_id in _scopes(old_state):
+                deltas[(scope, scope_id, old_state['status'])] -= 1
+        if new_state:
+            for scope, scope_id in _scopes(new_state):
+                deltas[(scope, scope_id, new_state['status'])] += 1
+
+    conditions = Q()
+    whens = []
+    for (scope, scope_id, status), delta in deltas.items():
+        if delta:
+            condition = Q(scope=scope, scope_id=scope_id, status=status)
+            conditions |= condition
+            whens.append(When(condition, then=F('count') + delta))
+
+    if whens:
+        AppointmentCounter.objects.filter(conditions).update(
+            count=Case(*whens, default=F('count'))
+        )
+
+
+def _scope_queryset(scope, scope_id):
+    if scope == 'PATIENT':
+        return Appointment.objects.filter(patient_id=scope_id)
+    if scope == 'DOCTOR':
+        return Appointment.objects.filter(doctor_id=scope_id)
+    return Appointment.objects.all()
+
+
+def _save_counts(rows):
+    AppointmentCounter.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['scope', 'scope_id', 'status'],
+        update_fields=['count'],
+    )
+
+
+def recompute_counters(scope, scope_id=0):
+    """
+    Recompute one scope's counters with a single aggregate query
+
+    The scope's rows are created (if missing) and locked before the
+    aggregate runs, so a transition updating them waits until the
+    recomputed counts are committed and then applies its delta to them.
+    """
+    with transaction.atomic():
+        AppointmentCounter.objects.bulk_create([
+            AppointmentCounter(scope=scope, scope_id=scope_id, status=status) for status in STATUSES
+        ], ignore_conflicts=True)
+        list(AppointmentCounter.objects.select_for_update().filter(scope=scope, scope_id=scope_id).values_list('pk'))
+
+        totals = _scope_queryset(scope, scope_id).aggregate(**_status_counts())
+        counts = {status: totals[status.lower()] for status in STATUSES}
+        _save_counts([
+            AppointmentCounter(scope=scope, scope_id=scope_id, status=status, count=count)
+            for status, count in counts.items()
+        ])
+    return counts
+
+
+def get_appointment_stats(scope, scope_id=0):
+    """
+    Return appointment counts by status for a scope
+    """
+    counts = dict(
+        AppointmentCounter.objects.filter(scope=scope, scope_id=scope_id).values_list('status', 'count')
+    )
+    if len(counts) < len(STATUSES):
+        counts = recompute_counters(scope, scope_id)
+
+    return {
+        'total_appointments': sum(counts.values()),
+        'pending_appointments': counts['PENDING'],
+        'confirmed_appointments': counts['CONFIRMED'],
+        'completed_appointments': counts['COMPLETED'],
+        'cancelled_appointments': counts['CANCELLED'],
+    }
+
+
+def rebuild_counters():
+    """
+    Recompute every scope's counters and repair drift
+
+    Returns the number of counter rows whose stored value was wrong or missing.
+    """
+    expected = {}
+
+    totals = Appointment.objects.aggregate(**_status_counts())
+    for status in STATUSES:
+        expected[('GLOBAL', 0, status)] = totals[status.lower()]
+
+    for scope, field in (('PATIENT', 'patient_id'), ('DOCTOR', 'doctor_id')):
+        rows = Appointment.objects.order_by().values(field).annotate(**_status_counts())
+        for row in rows:
+            for status in STATUSES:
+                expected[(scope, row[field], status)] = row[status.lower()]
+
+    stored = {
+        (scope, scope_id, status): count
+        for scope, scope_id, status, count in AppointmentCounter.objects.values_list(
+            'scope', 'scope_id', 'status', 'count'
+        ).iterator()
+    }
+
+    drifted = [
+        AppointmentCounter(scope=scope, scope_id=scope_id, status=status, count=count)
+        for (scope, scope_id, status), count in expected.items()
+        if stored.get((scope, scope_id, status)) != count
+    ]
+    _save_counts(drifted)
+
+    # Scopes with no appointments left (deleted patients or doctors)
+    stale = [key for key in stored if key not in expected]
+    for scope, scope_id, status in stale:
+        AppointmentCounter.objects.filter(scope=scope, scope_id=scope_id, status=status).delete()
+
+    return len(drifted) + len(stale)
@@ -0,0 +1,98 @@
+"""
+Streaming NDJSON responses for list endpoints.
+
+Requesting ?format=ndjson (or Accept: application/x-ndjson) on a viewset that
+uses NDJSONStreamMixin streams one JSON object per line. Rows are read with
+QuerySet.iterator(chunk_size=...) and serialized as they are produced, so
+memory stays flat no matter how many rows match and the first bytes go out
+as soon as the first chunk is fetched.
+"""
+import csv
+import io
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+def ndjson_line(item):
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list as one JSON document per line (used for error responses
+    and non-streamed data; lists are normally streamed by NDJSONStreamMixin)
+    """
+    media_type = NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(ndjson_line(item) for item in items)
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Lets ?format=csv / Accept: text/csv select CSV on views that stream CSV
+    themselves; anything rendered through it (such as errors) is written
+    as key,value lines
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data.items() if isinstance(data, dict) else enumerate(data if isinstance(data, list) else [data])
+        text = io.StringIO()
+        writer = csv.writer(text)
+        for key, value in items:
+            writer.writerow([key, value])
+        return text.getvalue().encode('utf-8')
+
+
+class NDJSONStreamMixin:
+    """
+    Adds a streaming NDJSON mode to a viewset's list and list-like actions
+    """
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
+    stream_chunk_size = 500
+
+    def wants_stream(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return isinstance(renderer, NDJSONRenderer)
+
+    def iter_representations(self, queryset):
+        serializer = self.get_serializer()
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            yield serializer.to_representation(obj)
+
+    def stream_queryset(self, queryset):
+        lines = (ndjson_line(item) for item in self.iter_representations(queryset))
+        response = StreamingHttpResponse(lines, content_type=NDJSON_MEDIA_TYPE)
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def list_response(self, queryset):
+        """
+        Stream the queryset as NDJSON if requested, else return a plain list
+        """
+        if self.wants_stream():
+            return self.stream_queryset(queryset)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        if self.wants_stream():
+            return self.stream_queryset(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,193 @@
+from datetime import time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from users.authentication import ClaimsRefreshToken
+from users.models import DoctorProfile
+from appointments.availability import availability_index
+from appointments.models import Appointment, AppointmentCounter, AppointmentStatusChange, TimeSlot
+from appointments.transitions import ACTION_ROLES, ACTIONS, ALLOWED_TRANSITIONS
+
+
+class DoubleBookingTests(TestCase):
+    """
+    Booking a slot that is already taken answers 400, whether validate()
+    catches it or the slot is claimed by another request after validation
+    """
+
+    def setUp(self):
+        availability_index.clear()
+        doctor_user = User.objects.create_user('doctor', password='password')
+        doctor_user.profile.role = 'DOCTOR'
+        doctor_user.profile.save()
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=doctor_user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+            available_time_start=time(9), available_time_end=time(17),
+        )
+        self.date = timezone.localdate() + timedelta(days=7)
+        TimeSlot.objects.create(doctor=self.doctor, date=self.date, start_time=time(10), end_time=time(10, 30))
+
+    def client_for(self, username):
+        user = User.objects.create_user(username, password='password')
+        token = ClaimsRefreshToken.for_user(user).access_token
+        return Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def book(self, client, at='10:00'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post('/api/appointments/appointments/', {
+                'doctor': self.doctor.id,
+                'appointment_date': self.date.isoformat(),
+                'appointment_time': at,
+                'reason': 'Checkup',
+            }, content_type='application/json')
+
+    def test_second_booking_is_rejected(self):
+        self.assertEqual(self.book(self.client_for('first')).status_code, 201)
+
+        response = self.book(self.client_for('second'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_booking_that_loses_the_race_is_rejected(self):
+        self.assertEqual(self.book(self.client_for('first')).status_code, 201)
+
+        # As if the second request had validated before the first one booked
+        with mock.patch('appointments.serializers.validate_slot_is_free'):
+            response = self.book(self.client_for('second'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('This time slot is already booked', response.json())
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_booking_without_a_time_slot_is_rejected_by_the_constraint(self):
+        # There is no TimeSlot at 11:00, so only appt_active_slot_uniq stops
+        # the second booking
+        self.assertEqual(self.book(self.client_for('first'), '11:00').status_code, 201)
+
+        with mock.patch('appointments.serializers.validate_slot_is_free'):
+            response = self.book(self.client_for('second'), '11:00')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_cancelled_appointment_frees_the_slot(self):
+        for at in ('10:00', '11:00'):
+            with self.subTest(at=at):
+                client = self.client_for(f'first-{at}')
+                self.assertEqual(self.book(client, at).status_code, 201)
+                appointment = Appointment.objects.get(appointment_time=at, status='PENDING')
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = client.post(f'/api/appointments/appointments/{appointment.id}/cancel/')
+                self.assertEqual(response.status_code, 200)
+
+                self.assertEqual(self.book(self.client_for(f'second-{at}'), at).status_code, 201)
+                self.assertEqual(Appointment.objects.filter(appointment_time=at, status='PENDING').count(), 1)
+
+
+class StatusUpdateTests(TestCase):
+    """
+    Status only changes along ALLOWED_TRANSITIONS: a disallowed action is
+    answered with 400, updates can't set status at all, and neither changes
+    the appointment, its history or the counters
+    """
+
+    def setUp(self):
+        doctor_user = User.objects.create_user('doctor', password='password')
+        doctor_user.profile.role = 'DOCTOR'
+        doctor_user.profile.save()
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=doctor_user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        self.patient = User.objects.create_user('patient', password='password')
+        self.date = timezone.localdate() + timedelta(days=7)
+        self.doctor_client = self.client_for(User.objects.get(pk=doctor_user.pk))
+        self.patient_client = self.client_for(self.patient)
+
+    def client_for(self, user):
+        token = ClaimsRefreshToken.for_user(user).access_token
+        return Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def appointment(self, status):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=self.date,
+            appointment_time=time(10), status=status
+        )
+
+    def snapshot(self, appointment):
+        appointment.refresh_from_db()
+        return (
+            appointment.status, appointment.notes, appointment.updated_at,
+            AppointmentStatusChange.objects.count(),
+            sorted(AppointmentCounter.objects.values_list('scope', 'scope_id', 'status', 'count')),
+        )
+
+    def test_disallowed_transitions_are_rejected(self):
+        for old_status, allowed in ALLOWED_TRANSITIONS.items():
+            for action, (new_status, error) in ACTIONS.items():
+                if new_status in allowed:
+                    continue
+                with self.subTest(old_status=old_status, action=action):
+                    appointment = self.appointment(old_status)
+                    before = self.snapshot(appointment)
+
+                    response = self.doctor_client.post(
+                        f'/api/appointments/appointments/{appointment.id}/{action}/', {'notes': 'Changed'},
+                        content_type='application/json'
+                    )
+
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': error})
+                    self.assertEqual(self.snapshot(appointment), before)
+                    appointment.delete()
+
+    def test_patients_cannot_take_doctor_actions(self):
+        for action in ACTION_ROLES:
+            for batch in (False, True):
+                with self.subTest(action=action, batch=batch):
+                    appointment = self.appointment('PENDING')
+                    before = self.snapshot(appointment)
+
+                    if batch:
+                        response = self.patient_client.post('/api/appointments/appointments/batch/', {
+                            'action': action, 'ids': [appointment.id],
+                        }, content_type='application/json')
+                    else:
+                        response = self.patient_client.post(
+                            f'/api/appointments/appointments/{appointment.id}/{action}/'
+                        )
+
+                    self.assertEqual(response.status_code, 403)
+                    self.assertEqual(response.json(), {'error': f'Only doctors and admins can {action} appointments'})
+                    self.assertEqual(self.snapshot(appointment), before)
+                    appointment.delete()
+
+        appointment = self.appointment('PENDING')
+        response = self.patient_client.post(f'/api/appointments/appointments/{appointment.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_updates_ignore_status(self):
+        for old_status in ALLOWED_TRANSITIONS:
+            for new_status in ALLOWED_TRANSITIONS:
+                if new_status == old_status:
+                    continue
+                with self.subTest(old_status=old_status, new_status=new_status):
+                    appointment = self.appointment(old_status)
+
+                    response = self.patient_client.put(f'/api/appointments/appointments/{appointment.id}/', {
+                        'patient': self.patient.id,
+                        'doctor': self.doctor.id,
+                        'appointment_date': self.date.isoformat(),
+                        'appointment_time': '10:00',
+                        'status': new_status,
+                    }, content_type='application/json')
+
+                    self.assertEqual(response.status_code, 200)
+                    appointment.refresh_from_db()
+                    self.assertEqual(appointment.status, old_status)
+                    appointment.delete()
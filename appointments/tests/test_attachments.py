@@ -0,0 +1,60 @@
+import io
+import os
+import tempfile
+from datetime import time
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from appointments.attachments import UploadError, attachment_store, start_upload, write_chunk
+from appointments.models import AttachmentUpload, MedicalRecord, MedicalRecordAttachment
+from users.models import DoctorProfile
+
+
+class WriteChunkTests(TestCase):
+    """
+    A chunk is only written while its upload's row is locked at the offset
+    the chunk starts at; a chunk for an offset the upload has moved past is
+    answered with 409 and leaves the part file alone
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        attachments = override_settings(ATTACHMENT_ROOT=root.name)
+        attachments.enable()
+        self.addCleanup(attachments.disable)
+
+        doctor_user = User.objects.create_user('doctor', password='password')
+        doctor = DoctorProfile.objects.create(
+            user_profile=doctor_user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        patient = User.objects.create_user('patient', password='password')
+        self.record = MedicalRecord.objects.create(patient=patient, doctor=doctor, diagnosis='Checkup')
+
+    def test_chunks_complete_the_upload(self):
+        upload = start_upload(self.record, 'scan.txt', 8)
+
+        self.assertEqual(write_chunk(upload, 0, io.BytesIO(b'1234'), 4).offset, 4)
+        attachment = write_chunk(upload, 4, io.BytesIO(b'5678'), 4)
+
+        self.assertIsInstance(attachment, MedicalRecordAttachment)
+        with attachment_store.open(attachment.sha256) as blob:
+            self.assertEqual(blob.read(), b'12345678')
+
+    def test_chunk_at_a_stale_offset_is_rejected(self):
+        upload = start_upload(self.record, 'scan.txt', 8)
+        # Another client sent the first chunk after this one read the upload
+        stale = AttachmentUpload.objects.get(pk=upload.pk)
+        write_chunk(upload, 0, io.BytesIO(b'1234'), 4)
+
+        with self.assertRaises(UploadError) as raised:
+            write_chunk(stale, 0, io.BytesIO(b'abcd'), 4)
+
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(stale.offset, 4)
+        self.assertEqual(AttachmentUpload.objects.get(pk=upload.pk).offset, 4)
+        with open(attachment_store.part_path(upload.id), 'rb') as part:
+            self.assertEqual(part.read(), b'1234')
+        self.assertEqual(os.path.getsize(attachment_store.part_path(upload.id)), 4)
@@ -0,0 +1,46 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from users.authentication import ClaimsRefreshToken
+from users.models import DoctorProfile
+from appointments.models import Appointment
+
+
+class ConditionalListTests(TestCase):
+    """
+    Paginated lists drop the validator for cursor pages; upcoming is never
+    paginated, so ?pagination=cursor doesn't change its answer
+    """
+
+    def setUp(self):
+        doctor_user = User.objects.create_user('doctor', password='password')
+        doctor = DoctorProfile.objects.create(
+            user_profile=doctor_user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        patient = User.objects.create_user('patient', password='password')
+        Appointment.objects.create(
+            patient=patient, doctor=doctor, appointment_date=timezone.localdate() + timedelta(days=7),
+            appointment_time=time(10), status='PENDING',
+        )
+        token = ClaimsRefreshToken.for_user(patient).access_token
+        self.client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_cursor_pages_have_no_validator(self):
+        response = self.client.get('/api/appointments/appointments/', {'pagination': 'cursor'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_upcoming_ignores_the_pagination_mode(self):
+        path = '/api/appointments/appointments/upcoming/'
+        for params in ({}, {'pagination': 'cursor'}):
+            with self.subTest(params=params):
+                etag = self.client.get(path, params)['ETag']
+
+                response = self.client.get(path, params, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(response.status_code, 304)
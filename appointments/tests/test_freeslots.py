@@ -0,0 +1,78 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import DoctorProfile
+from appointments.availability import availability_index
+from appointments.freeslots import FreeSlotIndex, free_slot_index
+from appointments.models import Appointment, TimeSlot
+from appointments.transitions import transition
+
+EVERY_DAY = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class FreeSlotIndexTests(TestCase):
+    """
+    The earliest free slots and a doctor's free slots agree: a slot is free
+    when no active appointment starts at it, however the appointment was
+    made
+    """
+
+    def setUp(self):
+        availability_index.clear()
+        free_slot_index.clear()
+        self.addCleanup(free_slot_index.clear)
+        self.doctors = [self.doctor(number) for number in range(2)]
+        self.patient = User.objects.create_user('patient', password='password')
+        self.date = timezone.localdate() + timedelta(days=7)
+        TimeSlot.objects.bulk_create([
+            TimeSlot(doctor=doctor, date=self.date, start_time=time(hour, minute), end_time=time(hour, minute + 29))
+            for doctor in self.doctors
+            for hour, minute in ((10, 0), (10, 30))
+        ])
+
+    def doctor(self, number):
+        user = User.objects.create_user(f'doctor{number}', password='password')
+        return DoctorProfile.objects.create(
+            user_profile=user.profile, specialization='GENERAL', license_number=f'LIC-{number}',
+            available_days=EVERY_DAY, available_time_start=time(10), available_time_end=time(11),
+        )
+
+    def earliest(self, index=free_slot_index):
+        return [(slot[3], slot[1]) for slot in index.earliest([self.doctors[0].id], 10)]
+
+    def test_appointment_without_a_claimed_slot_is_not_free(self):
+        # bulk_create skips the signals, so the TimeSlot stays unbooked
+        Appointment.objects.bulk_create([Appointment(
+            patient=self.patient, doctor=self.doctors[0], appointment_date=self.date,
+            appointment_time=time(10), status='PENDING',
+        )])
+
+        self.assertEqual(availability_index.free_slots(self.doctors[0], self.date), [time(10, 30)])
+        self.assertEqual(self.earliest(), [(self.doctors[0].id, time(10, 30))])
+
+    def test_booking_and_cancelling_follow_the_availability_index(self):
+        self.assertEqual(len(self.earliest()), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                patient=self.patient, doctor=self.doctors[0], appointment_date=self.date,
+                appointment_time=time(10, 30), status='PENDING',
+            )
+        self.assertEqual(self.earliest(), [(self.doctors[0].id, time(10))])
+        self.assertEqual(availability_index.free_slots(self.doctors[0], self.date), [time(10)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(appointment, 'cancel')
+        self.assertEqual(self.earliest(), [(self.doctors[0].id, time(10)), (self.doctors[0].id, time(10, 30))])
+        self.assertEqual(availability_index.free_slots(self.doctors[0], self.date), [time(10), time(10, 30)])
+
+    def test_slots_held_are_bounded(self):
+        index = FreeSlotIndex(max_slots=3)
+
+        found = index.earliest([doctor.id for doctor in self.doctors], 10)
+
+        self.assertEqual(len(found), 4)
+        self.assertEqual(len(index), 1)
@@ -0,0 +1,495 @@
+import io
+import logging
+import tempfile
+from contextlib import nullcontext
+from datetime import time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+
+from appointments.attachments import start_upload, write_chunk
+from appointments.availability import availability_index
+from appointments.freeslots import free_slot_index
+from appointments.models import Appointment, MedicalRecord, Review, TimeSlot
+from appointments.ratings import rebuild_doctor_ratings
+from appointments.stats import rebuild_counters
+from users.authentication import ClaimsRefreshToken
+from users.cache import user_cache
+from users.models import UserProfile, DoctorProfile
+from users.response_cache import bump_version
+from users.search import rebuild_search_index
+
+# urlconf -> where config.urls mounts it
+URLCONFS = {
+    'appointments.urls': '/api/appointments',
+    'users.urls': '/api/users',
+}
+ROLES = ('PATIENT', 'DOCTOR', 'ADMIN')
+ANONYMOUS = ('ANONYMOUS',)
+PASSWORD = 'Budget-check-1'
+# Rows of each kind per fixture user at the two sizes; the large size is
+# past the default page size so every list returns a full page
+SMALL, LARGE = 3, 15
+
+# (urlconf, route name, method) -> most queries any role may run; cached
+# doctor directory reads and writes that change it include a read or bump
+# of the directory version (users.response_cache)
+BUDGETS = {
+    ('appointments.urls', 'api-root', 'GET'): 0,
+    ('appointments.urls', 'appointment-list', 'GET'): 2,
+    ('appointments.urls', 'appointment-list', 'POST'): 10,
+    ('appointments.urls', 'appointment-detail', 'GET'): 1,
+    ('appointments.urls', 'appointment-detail', 'PATCH'): 9,
+    ('appointments.urls', 'appointment-detail', 'DELETE'): 7,
+    ('appointments.urls', 'appointment-confirm', 'POST'): 6,
+    ('appointments.urls', 'appointment-complete', 'POST'): 7,
+    ('appointments.urls', 'appointment-cancel', 'POST'): 7,
+    ('appointments.urls', 'appointment-batch', 'POST'): 7,
+    ('appointments.urls', 'appointment-upcoming', 'GET'): 2,
+    ('appointments.urls', 'appointment-stats', 'GET'): 1,
+    ('appointments.urls', 'medical-record-list', 'GET'): 2,
+    ('appointments.urls', 'medical-record-list', 'POST'): 6,
+    ('appointments.urls', 'medical-record-detail', 'GET'): 1,
+    ('appointments.urls', 'medical-record-detail', 'PATCH'): 2,
+    ('appointments.urls', 'medical-record-detail', 'DELETE'): 4,
+    ('appointments.urls', 'medical-record-export', 'GET'): 3,
+    ('appointments.urls', 'medical-record-uploads', 'POST'): 2,
+    ('appointments.urls', 'medical-record-upload', 'GET'): 2,
+    # The chunk is written in a savepoint holding the upload's row
+    ('appointments.urls', 'medical-record-upload', 'PATCH'): 10,
+    ('appointments.urls', 'medical-record-upload', 'DELETE'): 3,
+    ('appointments.urls', 'medical-record-attachments', 'GET'): 2,
+    ('appointments.urls', 'medical-record-attachment', 'GET'): 2,
+    ('appointments.urls', 'medical-record-attachment', 'DELETE'): 3,
+    ('appointments.urls', 'time-slot-list', 'GET'): 2,
+    ('appointments.urls', 'time-slot-list', 'POST'): 5,
+    ('appointments.urls', 'time-slot-detail', 'GET'): 1,
+    ('appointments.urls', 'time-slot-detail', 'PATCH'): 6,
+    ('appointments.urls', 'time-slot-detail', 'DELETE'): 2,
+    ('appointments.urls', 'time-slot-available', 'GET'): 1,
+    ('appointments.urls', 'time-slot-earliest', 'GET'): 2,
+    # Each chunk of doctors is generated in a savepoint holding their rows
+    ('appointments.urls', 'time-slot-generate', 'POST'): 6,
+    ('appointments.urls', 'review-list', 'GET'): 2,
+    ('appointments.urls', 'review-list', 'POST'): 9,
+    ('appointments.urls', 'review-detail', 'GET'): 1,
+    ('appointments.urls', 'review-detail', 'PATCH'): 2,
+    ('appointments.urls', 'review-detail', 'DELETE'): 4,
+    ('appointments.urls', 'review-doctor-stats', 'GET'): 1,
+    ('users.urls', 'api-root', 'GET'): 0,
+    ('users.urls', 'register', 'POST'): 9,
+    ('users.urls', 'register-doctor', 'POST'): 14,
+    ('users.urls', 'login', 'POST'): 3,
+    ('users.urls', 'logout', 'POST'): 0,
+    ('users.urls', 'token-refresh', 'POST'): 2,
+    ('users.urls', 'current-user', 'GET'): 0,
+    ('users.urls', 'auth-cache-stats', 'GET'): 0,
+    ('users.urls', 'userprofile-list', 'GET'): 2,
+    ('users.urls', 'userprofile-detail', 'GET'): 1,
+    # Writes re-read the user's is_active, which the profile save before evicted
+    ('users.urls', 'userprofile-detail', 'PATCH'): 4,
+    ('users.urls', 'userprofile-me', 'GET'): 0,
+    ('users.urls', 'userprofile-update-profile', 'PATCH'): 10,
+    ('users.urls', 'doctor-list', 'GET'): 3,
+    ('users.urls', 'doctor-detail', 'GET'): 1,
+    ('users.urls', 'doctor-detail', 'PATCH'): 7,
+    ('users.urls', 'doctor-search', 'GET'): 2,
+    ('users.urls', 'doctor-availability', 'GET'): 2,
+    # Two validator aggregates run before the calendar is built
+    ('users.urls', 'doctor-calendar', 'GET'): 5,
+    ('users.urls', 'doctor-free-slots', 'GET'): 1,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Case:
+    """
+    One request to make: kwargs(ctx, role) gives the URL kwargs and
+    data(ctx, role) the body (or query params for GET)
+    """
+
+    def __init__(self, urlconf, name, method, kwargs=None, data=None, roles=ROLES, content_type='application/json',
+                 headers=None):
+        self.urlconf = urlconf
+        self.name = name
+        self.method = method
+        self.kwargs = kwargs or (lambda ctx, role: {})
+        self.data = data or (lambda ctx, role: None)
+        self.roles = roles
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @property
+    def key(self):
+        return (self.urlconf, self.name, self.method)
+
+    def path(self, ctx, role):
+        return URLCONFS[self.urlconf] + reverse(self.name, urlconf=self.urlconf, kwargs=self.kwargs(ctx, role))
+
+
+def appointments_case(name, method, **options):
+    return Case('appointments.urls', name, method, **options)
+
+
+def users_case(name, method, **options):
+    return Case('users.urls', name, method, **options)
+
+
+def appointment(ctx, role):
+    return {'pk': ctx['appointment'].id}
+
+
+def record(ctx, role):
+    return {'pk': ctx['record'].id}
+
+
+def doctor(ctx, role):
+    return {'pk': ctx['doctor'].id}
+
+
+CASES = [
+    appointments_case('api-root', 'GET'),
+    appointments_case('appointment-list', 'GET'),
+    appointments_case('appointment-list', 'POST', data=lambda ctx, role: {
+        'doctor': ctx['doctor'].id, 'appointment_date': ctx['free_date'].isoformat(),
+        'appointment_time': '10:00', 'reason': 'Budget check',
+    }),
+    appointments_case('appointment-detail', 'GET', kwargs=appointment),
+    # A full body: a partial update without the slot fields fails validation
+    appointments_case('appointment-detail', 'PATCH', kwargs=appointment, data=lambda ctx, role: {
+        'doctor': ctx['doctor'].id, 'appointment_date': ctx['appointment'].appointment_date.isoformat(),
+        'appointment_time': ctx['appointment'].appointment_time.isoformat(), 'reason': 'Updated',
+    }),
+    appointments_case('appointment-detail', 'DELETE', kwargs=appointment),
+    appointments_case('appointment-confirm', 'POST', kwargs=appointment),
+    appointments_case('appointment-complete', 'POST', kwargs=appointment),
+    appointments_case('appointment-cancel', 'POST', kwargs=appointment),
+    appointments_case('appointment-batch', 'POST', data=lambda ctx, role: {
+        'action': 'cancel', 'ids': [ctx['appointment'].id],
+    }),
+    appointments_case('appointment-upcoming', 'GET'),
+    appointments_case('appointment-stats', 'GET'),
+    appointments_case('medical-record-list', 'GET'),
+    # Only doctors can create records
+    appointments_case('medical-record-list', 'POST', roles=('DOCTOR',), data=lambda ctx, role: {
+        'patient': ctx['users']['PATIENT'].id, 'doctor': ctx['doctor'].id, 'appointment': ctx['unreviewed'].id,
+        'diagnosis': 'Budget check',
+    }),
+    appointments_case('medical-record-detail', 'GET', kwargs=record),
+    appointments_case('medical-record-detail', 'PATCH', kwargs=record, data=lambda ctx, role: {'notes': 'Updated'}),
+    appointments_case('medical-record-detail', 'DELETE', kwargs=record),
+    appointments_case('medical-record-export', 'GET'),
+    appointments_case('medical-record-uploads', 'POST', kwargs=record, data=lambda ctx, role: {
+        'filename': 'scan.txt', 'size': 8,
+    }),
+    appointments_case('medical-record-upload', 'GET', kwargs=lambda ctx, role: {
+        'pk': ctx['record'].id, 'upload_id': ctx['upload'].id,
+    }),
+    appointments_case('medical-record-upload', 'PATCH', kwargs=lambda ctx, role: {
+        'pk': ctx['record'].id, 'upload_id': ctx['upload'].id,
+    }, data=lambda ctx, role: b'12345678', content_type='application/octet-stream',
+        headers={'HTTP_CONTENT_RANGE': 'bytes 0-7/8'}),
+    appointments_case('medical-record-upload', 'DELETE', kwargs=lambda ctx, role: {
+        'pk': ctx['record'].id, 'upload_id': ctx['upload'].id,
+    }),
+    appointments_case('medical-record-attachments', 'GET', kwargs=record),
+    appointments_case('medical-record-attachment', 'GET', kwargs=lambda ctx, role: {
+        'pk': ctx['record'].id, 'attachment_id': ctx['attachment'].id,
+    }),
+    appointments_case('medical-record-attachment', 'DELETE', kwargs=lambda ctx, role: {
+        'pk': ctx['record'].id, 'attachment_id': ctx['attachment'].id,
+    }),
+    appointments_case('time-slot-list', 'GET', data=lambda ctx, role: {'doctor': ctx['doctor'].id}),
+    appointments_case('time-slot-list', 'POST', data=lambda ctx, role: {
+        'doctor': ctx['doctor'].id, 'date': ctx['free_date'].isoformat(), 'start_time': '15:00', 'end_time': '15:30',
+    }),
+    appointments_case('time-slot-detail', 'GET', kwargs=lambda ctx, role: {'pk': ctx['slot'].id}),
+    # A full body: validate() compares start_time and end_time
+    appointments_case('time-slot-detail', 'PATCH', kwargs=lambda ctx, role: {'pk': ctx['slot'].id},
+                      data=lambda ctx, role: {
+                          'doctor': ctx['doctor'].id, 'date': ctx['slot'].date.isoformat(),
+                          'start_time': '11:00', 'end_time': '11:30',
+                      }),
+    appointments_case('time-slot-detail', 'DELETE', kwargs=lambda ctx, role: {'pk': ctx['slot'].id}),
+    appointments_case('time-slot-available', 'GET'),
+    appointments_case('time-slot-earliest', 'GET', data=lambda ctx, role: {'specialization': 'CARDIOLOGY'}),
+    appointments_case('time-slot-generate', 'POST', data=lambda ctx, role: {
+        'start_date': ctx['free_date'].isoformat(), 'end_date': (ctx['free_date'] + timedelta(days=6)).isoformat(),
+    }),
+    appointments_case('review-list', 'GET'),
+    appointments_case('review-list', 'POST', data=lambda ctx, role: {
+        'doctor': ctx['doctor'].id, 'appointment': ctx['unreviewed'].id, 'rating': 5,
+    }),
+    appointments_case('review-detail', 'GET', kwargs=lambda ctx, role: {'pk': ctx['review'].id}),
+    appointments_case('review-detail', 'PATCH', kwargs=lambda ctx, role: {'pk': ctx['review'].id},
+                      data=lambda ctx, role: {'comment': 'Updated'}),
+    appointments_case('review-detail', 'DELETE', kwargs=lambda ctx, role: {'pk': ctx['review'].id}),
+    appointments_case('review-doctor-stats', 'GET', kwargs=lambda ctx, role: {'doctor_id': ctx['doctor'].id}),
+
+    users_case('api-root', 'GET'),
+    users_case('register', 'POST', roles=ANONYMOUS, data=lambda ctx, role: {
+        'username': 'budget_new', 'email': 'budget_new@example.com', 'password': PASSWORD,
+        'password2': PASSWORD, 'first_name': 'New', 'last_name': 'Patient',
+    }),
+    users_case('register-doctor', 'POST', roles=ANONYMOUS, data=lambda ctx, role: {
+        'username': 'budget_new_doctor', 'email': 'budget_new_doctor@example.com', 'password': PASSWORD,
+        'password2': PASSWORD, 'first_name': 'New', 'last_name': 'Doctor', 'specialization': 'GENERAL',
+        'license_number': 'BUDGET-NEW',
+    }),
+    users_case('login', 'POST', roles=ANONYMOUS, data=lambda ctx, role: {
+        'username': ctx['users']['PATIENT'].username, 'password': PASSWORD,
+    }),
+    users_case('logout', 'POST', data=lambda ctx, role: {'refresh_token': ctx['refresh'][role]}),
+    users_case('token-refresh', 'POST', roles=ANONYMOUS, data=lambda ctx, role: {
+        'refresh': ctx['refresh']['PATIENT'],
+    }),
+    users_case('current-user', 'GET'),
+    users_case('auth-cache-stats', 'GET'),
+    users_case('userprofile-list', 'GET'),
+    users_case('userprofile-detail', 'GET', kwargs=lambda ctx, role: {'pk': ctx['profiles'][role]}),
+    users_case('userprofile-detail', 'PATCH', kwargs=lambda ctx, role: {'pk': ctx['profiles'][role]},
+               data=lambda ctx, role: {'phone': '555-0100'}),
+    users_case('userprofile-me', 'GET'),
+    users_case('userprofile-update-profile', 'PATCH', data=lambda ctx, role: {'phone': '555-0100'}),
+    users_case('doctor-list', 'GET'),
+    users_case('doctor-detail', 'GET', kwargs=doctor),
+    users_case('doctor-detail', 'PATCH', kwargs=doctor, data=lambda ctx, role: {'bio': 'Updated'}),
+    users_case('doctor-search', 'GET', data=lambda ctx, role: {'q': 'cardiology'}),
+    users_case('doctor-availability', 'GET', kwargs=doctor),
+    users_case('doctor-calendar', 'GET', kwargs=doctor, data=lambda ctx, role: {'view': 'month'}),
+    users_case('doctor-free-slots', 'GET', kwargs=doctor, data=lambda ctx, role: {
+        'date': ctx['free_date'].isoformat(),
+    }),
+]
+
+
+def route_names(patterns):
+    """
+    Yield the name of every route in a urlconf's patterns
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+def clear_caches():
+    user_cache.clear()
+    availability_index.clear()
+    free_slot_index.clear()
+
+
+def seed():
+    """
+    Create a patient, a doctor and an admin (plus other doctors for the
+    doctor lists) and the objects the detail routes act on
+    """
+    password = make_password(PASSWORD)
+    today = timezone.localdate()
+
+    def create_user(username, role):
+        user = User.objects.create(username=username, password=password, first_name='Budget',
+                                   last_name=role.title(), is_staff=role == 'ADMIN')
+        # The post_save signal created a patient profile
+        UserProfile.objects.filter(user=user).update(role=role)
+        return User.objects.select_related('profile').get(pk=user.pk)
+
+    users = {role: create_user(f'budget_{role.lower()}', role) for role in ROLES}
+    doctors = [
+        DoctorProfile.objects.create(
+            user_profile=(users['DOCTOR'] if number == 0 else create_user(f'budget_doctor_{number}', 'DOCTOR')).profile,
+            specialization='CARDIOLOGY',
+            license_number=f'BUDGET-{number}',
+            bio='Budget check cardiology',
+            available_days=['MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY', 'SUNDAY'],
+            available_time_start=time(8),
+            available_time_end=time(18),
+        )
+        for number in range(4)
+    ]
+    users['DOCTOR'] = User.objects.select_related('profile__doctor_profile').get(pk=users['DOCTOR'].pk)
+
+    refresh = {role: ClaimsRefreshToken.for_user(user) for role, user in users.items()}
+    ctx = {
+        'users': users,
+        'doctor': doctors[0],
+        'doctors': doctors,
+        'profiles': {role: user.profile.id for role, user in users.items()},
+        'tokens': {role: str(token.access_token) for role, token in refresh.items()},
+        'refresh': {role: str(token) for role, token in refresh.items()},
+        'free_date': today + timedelta(days=200),
+        'rows': 0,
+    }
+    patient = users['PATIENT']
+
+    ctx['appointment'] = Appointment.objects.create(
+        patient=patient, doctor=doctors[0], appointment_date=today + timedelta(days=100),
+        appointment_time=time(9), status='PENDING', reason='Budget check',
+    )
+    past = today - timedelta(days=100)
+    ctx['unreviewed'], reviewed = Appointment.objects.bulk_create([
+        Appointment(patient=patient, doctor=doctors[0], appointment_date=past, appointment_time=time(hour),
+                    status='COMPLETED')
+        for hour in (9, 10)
+    ])
+    ctx['record'] = MedicalRecord.objects.create(
+        patient=patient, doctor=doctors[0], appointment=reviewed, diagnosis='Budget check'
+    )
+    ctx['review'] = Review.objects.create(patient=patient, doctor=doctors[0], appointment=reviewed, rating=4)
+    ctx['slot'] = TimeSlot.objects.create(
+        doctor=doctors[0], date=ctx['free_date'], start_time=time(10), end_time=time(10, 30)
+    )
+
+    ctx['upload'] = start_upload(ctx['record'], 'scan.txt', 8, uploaded_by_id=patient.id)
+    upload = start_upload(ctx['record'], 'report.txt', 8, uploaded_by_id=patient.id)
+    ctx['attachment'] = write_chunk(upload, 0, io.BytesIO(b'87654321'), 8)
+    return ctx
+
+def add_rows(ctx, count):
+    """
+    Give the fixture patient and doctor count more appointments, records,
+    reviews and free slots (and the other doctors the same), and add
+    count more patients for the admin's lists
+    """
+    today = timezone.localdate()
+    patient = ctx['users']['PATIENT']
+    start = ctx['rows']
+    ctx['rows'] += count
+
+    patients = User.objects.bulk_create([
+        User(username=f'budget_patient_{number}') for number in range(start, start + count)
+    ])
+    UserProfile.objects.bulk_create([UserProfile(user=user, role='PATIENT') for user in patients])
+
+    for doctor in ctx['doctors']:
+        upcoming = Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, appointment_date=today + timedelta(days=number + 1),
+                        appointment_time=time(12), status='CONFIRMED' if number % 2 else 'PENDING')
+            for number in range(start, start + count)
+        ])
+        completed = Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, appointment_date=today - timedelta(days=number + 1),
+                        appointment_time=time(12), status='COMPLETED')
+            for number in range(start, start + count)
+        ])
+        MedicalRecord.objects.bulk_create([
+            MedicalRecord(patient=patient, doctor=doctor, appointment=appointment, diagnosis='Checkup')
+            for appointment in completed
+        ])
+        Review.objects.bulk_create([
+            Review(patient=patient, doctor=doctor, appointment=appointment, rating=number % 5 + 1)
+            for number, appointment in enumerate(completed)
+        ])
+        TimeSlot.objects.bulk_create([
+            TimeSlot(doctor=doctor, date=appointment.appointment_date, start_time=time(13), end_time=time(13, 30))
+            for appointment in upcoming
+        ])
+
+    # bulk_create skips the signals that keep these up to date
+    rebuild_counters()
+    rebuild_doctor_ratings()
+    rebuild_search_index()
+    clear_caches()
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Call every route in appointments/urls.py and users/urls.py as each role
+    with SMALL and then LARGE rows per fixture user; a route may run no more
+    queries than its budget, and no more on more data
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        attachments = override_settings(ATTACHMENT_ROOT=root.name)
+        attachments.enable()
+        self.addCleanup(attachments.disable)
+
+        # Expected 4xx answers (a patient confirming an appointment) aren't logged
+        request_logger = logging.getLogger('django.request')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.ERROR)
+
+        clear_caches()
+        self.addCleanup(clear_caches)
+
+    def test_every_route_has_a_budget(self):
+        names = {
+            (urlconf, name)
+            for urlconf in URLCONFS
+            for name in route_names(__import__(urlconf, fromlist=['urlpatterns']).urlpatterns)
+        }
+        self.assertEqual(names - {(case.urlconf, case.name) for case in CASES}, set())
+        self.assertEqual({case.key for case in CASES} ^ set(BUDGETS), set())
+
+    def test_routes_stay_within_budget(self):
+        ctx = seed()
+        add_rows(ctx, SMALL)
+        small = {}
+        for case in CASES:
+            for role in case.roles:
+                self.warm(case, role, ctx)
+                queries = CaptureQueriesContext(connection)
+                response = self.call(case, role, ctx, queries)
+                small[(case.key, role)] = response.status_code, queries.captured_queries
+
+        add_rows(ctx, LARGE - SMALL)
+        for case in CASES:
+            for role in case.roles:
+                with self.subTest(f'{case.method} {case.name} as {role.lower()}'):
+                    status, queries = small[(case.key, role)]
+                    self.assertLess(status, 500)
+                    self.assertLessEqual(
+                        len(queries), BUDGETS[case.key], '\n'.join(query['sql'] for query in queries)
+                    )
+
+                    self.warm(case, role, ctx)
+                    response = self.call(case, role, ctx, self.assertNumQueries(len(queries)))
+                    self.assertLess(response.status_code, 500)
+
+    def warm(self, case, role, ctx):
+        """
+        Fill the in-process caches, then have the doctor directory
+        responses rendered afresh by the call that is counted
+        """
+        self.call(case, role, ctx, nullcontext())
+        bump_version()
+
+    def call(self, case, role, ctx, queries):
+        """
+        Make a request in a rolled-back savepoint, with the queries context
+        (counting or asserting the statements) around just the request, and
+        return the response
+        """
+        client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+        headers = dict(case.headers)
+        if role in ctx['tokens']:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {ctx["tokens"][role]}'
+        path = case.path(ctx, role)
+        data = case.data(ctx, role)
+
+        try:
+            with transaction.atomic():
+                with queries:
+                    if case.method == 'GET':
+                        response = client.get(path, data, **headers)
+                    else:
+                        response = getattr(client, case.method.lower())(
+                            path, data, content_type=case.content_type, **headers
+                        )
+                    if response.streaming:
+                        # Streamed rows are queried while the body is read
+                        b''.join(response.streaming_content)
+                raise Rollback
+        except Rollback:
+            pass
+        return response
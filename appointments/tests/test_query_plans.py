@@ -0,0 +1,155 @@
+import random
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from appointments.models import Appointment, MedicalRecord, TimeSlot, Review
+from appointments.views import AppointmentViewSet, MedicalRecordViewSet, TimeSlotViewSet, ReviewViewSet
+from users.models import UserProfile, DoctorProfile
+from users.views import DoctorProfileViewSet
+
+# Tables that grow with usage; a full scan of any of them on a hot path fails the test
+HOT_TABLES = {
+    Appointment._meta.db_table,
+    MedicalRecord._meta.db_table,
+    TimeSlot._meta.db_table,
+    Review._meta.db_table,
+}
+
+SQLITE_STEP = re.compile(r'\b(SCAN|SEARCH) (?:TABLE )?(\w+)(.*)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def full_table_scans(plan):
+    """
+    Return the hot tables an EXPLAIN plan reads without an index
+    """
+    if connection.vendor == 'postgresql':
+        tables = set(POSTGRES_SCAN.findall(plan))
+    else:
+        tables = set()
+        for step, table, detail in SQLITE_STEP.findall(plan):
+            # A SCAN without an index reads the whole table; a SEARCH with
+            # ANY(column) is a skip-scan that walks a whole index instead.
+            if (step == 'SCAN' and 'USING' not in detail) or 'ANY(' in detail:
+                tables.add(table)
+    return sorted(tables & HOT_TABLES)
+
+
+def seed(patients=300, doctors=60, appointments=6000, slots=6000, reviews=1500):
+    rng = random.Random(6)
+    today = timezone.now().date()
+
+    users = User.objects.bulk_create([
+        User(username=f'plan_{i}') for i in range(patients + doctors + 1)
+    ])
+    roles = ['PATIENT'] * patients + ['DOCTOR'] * doctors + ['ADMIN']
+    profiles = UserProfile.objects.bulk_create([
+        UserProfile(user=user, role=role) for user, role in zip(users, roles)
+    ])
+    doctor_profiles = DoctorProfile.objects.bulk_create([
+        DoctorProfile(user_profile=profile, specialization='GENERAL', license_number=f'PLAN-{i}')
+        for i, profile in enumerate(profiles[patients:patients + doctors])
+    ])
+    patient_users = users[:patients]
+
+    rows = set()
+    while len(rows) < appointments:
+        rows.add((rng.randrange(doctors), rng.randrange(-180, 60), rng.randrange(9 * 2, 17 * 2)))
+    appointment_objs = Appointment.objects.bulk_create([
+        Appointment(
+            patient=rng.choice(patient_users),
+            doctor=doctor_profiles[doctor],
+            appointment_date=today + timedelta(days=day),
+            appointment_time=f'{half_hour // 2:02d}:{half_hour % 2 * 30:02d}',
+            status='COMPLETED' if day < 0 else rng.choice(['PENDING', 'CONFIRMED', 'CANCELLED']),
+        )
+        for doctor, day, half_hour in rows
+    ], batch_size=1000)
+
+    rows = set()
+    while len(rows) < slots:
+        rows.add((rng.randrange(doctors), rng.randrange(-30, 90), rng.randrange(9 * 2, 17 * 2)))
+    TimeSlot.objects.bulk_create([
+        TimeSlot(
+            doctor=doctor_profiles[doctor],
+            date=today + timedelta(days=day),
+            start_time=f'{half_hour // 2:02d}:{half_hour % 2 * 30:02d}',
+            end_time=f'{half_hour // 2:02d}:{half_hour % 2 * 30 + 29:02d}',
+            is_booked=rng.random() < 0.7,
+        )
+        for doctor, day, half_hour in rows
+    ], batch_size=1000)
+
+    completed = [a for a in appointment_objs if a.status == 'COMPLETED'][:reviews]
+    Review.objects.bulk_create([
+        Review(patient_id=a.patient_id, doctor_id=a.doctor_id, appointment=a, rating=rng.randint(1, 5))
+        for a in completed
+    ], batch_size=1000)
+    MedicalRecord.objects.bulk_create([
+        MedicalRecord(patient_id=a.patient_id, doctor_id=a.doctor_id, appointment=a, diagnosis='Checkup')
+        for a in completed
+    ], batch_size=1000)
+
+    # A patient and a doctor that actually have data, plus the admin
+    return {
+        'PATIENT': User.objects.get(pk=completed[0].patient_id),
+        'DOCTOR': doctor_profiles[0].user_profile.user,
+        'ADMIN': users[-1],
+    }
+
+
+def hot_queries(users):
+    today = timezone.now().date()
+    doctor = users['DOCTOR'].profile.doctor_profile
+    return [
+        # (label, viewset, queryset method, action, role, query params)
+        ('appointment-list patient', AppointmentViewSet, 'get_queryset', 'list', 'PATIENT', {}),
+        ('appointment-list patient date range', AppointmentViewSet, 'get_queryset', 'list', 'PATIENT',
+         {'start_date': today, 'end_date': today + timedelta(days=30)}),
+        ('appointment-list doctor status', AppointmentViewSet, 'get_queryset', 'list', 'DOCTOR',
+         {'status': 'PENDING'}),
+        ('appointment-list admin status', AppointmentViewSet, 'get_queryset', 'list', 'ADMIN',
+         {'status': 'PENDING', 'start_date': today}),
+        ('appointment-upcoming patient', AppointmentViewSet, 'get_upcoming_queryset', 'upcoming', 'PATIENT', {}),
+        ('appointment-upcoming doctor', AppointmentViewSet, 'get_upcoming_queryset', 'upcoming', 'DOCTOR', {}),
+        ('appointment-upcoming admin', AppointmentViewSet, 'get_upcoming_queryset', 'upcoming', 'ADMIN', {}),
+        ('medical-record-list patient', MedicalRecordViewSet, 'get_queryset', 'list', 'PATIENT', {}),
+        ('time-slot-list doctor date', TimeSlotViewSet, 'get_queryset', 'list', 'PATIENT',
+         {'doctor': doctor.id, 'date': today + timedelta(days=1)}),
+        ('time-slot-list available', TimeSlotViewSet, 'get_queryset', 'list', 'PATIENT', {}),
+        ('time-slot-available', TimeSlotViewSet, 'get_available_queryset', 'available', 'PATIENT', {}),
+        ('review-list doctor', ReviewViewSet, 'get_queryset', 'list', 'ADMIN', {'doctor': doctor.id}),
+        ('review-list patient', ReviewViewSet, 'get_queryset', 'list', 'PATIENT', {}),
+        ('doctor-list by rating', DoctorProfileViewSet, 'get_queryset', 'list', 'PATIENT', {'ordering': '-rating'}),
+    ]
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN each viewset's hot querysets over seeded data; none of them may
+    fall back to a full scan of a table that grows with usage
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_an_index(self):
+        factory = APIRequestFactory()
+        for label, viewset, method, action, role, params in hot_queries(self.users):
+            with self.subTest(label):
+                request = Request(factory.get('/', params))
+                request.user = self.users[role]
+                view = viewset(request=request, format_kwarg=None, args=(), kwargs={}, action=action)
+                plan = getattr(view, method)().explain()
+
+                self.assertEqual(full_table_scans(plan), [], plan)
@@ -0,0 +1,38 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import DoctorProfile
+from appointments.models import TimeSlot
+from appointments.scheduling import generate_time_slots
+
+
+class GenerateTimeSlotsTests(TestCase):
+    """
+    generate_time_slots reports the slots it inserted, not those another
+    call (or an earlier one) already created
+    """
+
+    def setUp(self):
+        self.doctors = []
+        for number in range(3):
+            user = User.objects.create_user(f'doctor{number}', password='password')
+            self.doctors.append(DoctorProfile.objects.create(
+                user_profile=user.profile, specialization='GENERAL', license_number=f'LIC-{number}',
+                available_days=['Monday', 'Wednesday'], available_time_start=time(9), available_time_end=time(11),
+            ))
+        self.start = timezone.localdate() + timedelta(days=1)
+        self.end = self.start + timedelta(days=13)
+
+    def test_counts_only_inserted_slots(self):
+        created = generate_time_slots(self.doctors[:2], self.start, self.end)
+
+        # Two Mondays and two Wednesdays, four half-hour slots a day
+        self.assertEqual(created, 2 * 4 * 4)
+        self.assertEqual(TimeSlot.objects.count(), created)
+
+        self.assertEqual(generate_time_slots(self.doctors, self.start, self.end), 4 * 4)
+        self.assertEqual(generate_time_slots(self.doctors, self.start, self.end), 0)
+        self.assertEqual(TimeSlot.objects.count(), 3 * 4 * 4)
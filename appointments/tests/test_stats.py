@@ -0,0 +1,59 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import DoctorProfile
+from appointments.models import Appointment, AppointmentCounter
+from appointments.stats import GLOBAL_SCOPE, get_appointment_stats, rebuild_counters, recompute_counters
+from appointments.transitions import transition
+
+
+class AppointmentCounterTests(TestCase):
+    """
+    The counters stay exact through saves of partially loaded appointments
+    and recomputes, without dropping scopes the change didn't touch
+    """
+
+    def setUp(self):
+        doctor_user = User.objects.create_user('doctor', password='password')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=doctor_user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        self.patient = User.objects.create_user('patient', password='password')
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=timezone.localdate() + timedelta(days=7),
+            appointment_time=time(10), status='PENDING',
+        )
+        self.scopes = [GLOBAL_SCOPE, ('PATIENT', self.patient.id), ('DOCTOR', self.doctor.id)]
+        for scope in self.scopes:
+            get_appointment_stats(*scope)
+
+    def counter_ids(self):
+        return sorted(AppointmentCounter.objects.values_list('id', flat=True))
+
+    def test_partially_loaded_save_is_applied_as_a_transition(self):
+        before = self.counter_ids()
+        appointment = Appointment.objects.only('id', 'status').get(pk=self.appointment.pk)
+        appointment.status = 'CANCELLED'
+
+        appointment.save()
+
+        # No scope was dropped to be recomputed, and none drifted
+        self.assertEqual(self.counter_ids(), before)
+        self.assertEqual(rebuild_counters(), 0)
+        for scope in self.scopes:
+            stats = get_appointment_stats(*scope)
+            self.assertEqual((stats['pending_appointments'], stats['cancelled_appointments']), (0, 1))
+
+    def test_transitions_apply_on_top_of_a_recompute(self):
+        AppointmentCounter.objects.filter(scope='DOCTOR').update(count=5)
+
+        self.assertEqual(recompute_counters('DOCTOR', self.doctor.id)['PENDING'], 1)
+        transition(self.appointment, 'confirm')
+
+        stats = get_appointment_stats('DOCTOR', self.doctor.id)
+        self.assertEqual((stats['pending_appointments'], stats['confirmed_appointments']), (0, 1))
+        self.assertEqual(rebuild_counters(), 0)
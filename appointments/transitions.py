@@ -0,0 +1,146 @@
+"""
+Appointment status state machine.
+
+    PENDING -> CONFIRMED -> COMPLETED
+       |           |
+       +-----------+------> CANCELLED
+
+(a pending appointment can also be completed directly). Transitions are
+applied with an UPDATE guarded by the current status that writes only
+status, notes and updated_at, so they skip Appointment.save() and its
+creation-time validation: completing yesterday's appointment is allowed,
+and nothing else on the row is rewritten. Because update() sends no
+signals, apply_side_effects() keeps the status counters, TimeSlot claims
+and the availability and free slot indexes in step and records each transition in
+AppointmentStatusChange.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import ACTIVE_STATUSES, availability_index
+from .booking import release_slots
+from .freeslots import free_slot_index
+from .models import Appointment, AppointmentStatusChange
+from .stats import record_transitions
+
+ALLOWED_TRANSITIONS = {
+    'PENDING': ('CONFIRMED', 'COMPLETED', 'CANCELLED'),
+    'CONFIRMED': ('COMPLETED', 'CANCELLED'),
+    'COMPLETED': (),
+    'CANCELLED': (),
+}
+
+# action -> (target status, error when the appointment's status doesn't allow it)
+ACTIONS = {
+    'confirm': ('CONFIRMED', 'Only pending appointments can be confirmed'),
+    'complete': ('COMPLETED', 'Only pending or confirmed appointments can be completed'),
+    'cancel': ('CANCELLED', 'Cannot cancel completed or already cancelled appointments'),
+}
+
+# action -> roles that may take it; other actions are open to every role
+ACTION_ROLES = {
+    'confirm': ('DOCTOR', 'ADMIN'),
+    'complete': ('DOCTOR', 'ADMIN'),
+}
+
+STATE_FIELDS = ('id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'status')
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+class TransitionNotPermitted(Exception):
+    """
+    Raised when the acting user's role may not take an action
+    """
+
+
+def check_role(action, role):
+    """
+    Raise TransitionNotPermitted if role may not take action; a role of
+    None is a change made by the system rather than for a user
+    """
+    if role is not None and role not in ACTION_ROLES.get(action, (role,)):
+        raise TransitionNotPermitted(f'Only doctors and admins can {action} appointments')
+
+
+def can_transition(old_status, new_status):
+    return new_status in ALLOWED_TRANSITIONS.get(old_status, ())
+
+
+def sources(new_status):
+    """
+    Statuses an appointment can move to new_status from
+    """
+    return tuple(status for status, targets in ALLOWED_TRANSITIONS.items() if new_status in targets)
+
+
+def apply_side_effects(rows, new_status, changed_by_id=None):
+    """
+    Update everything derived from appointment status after rows (dicts of
+    STATE_FIELDS, as they were before the change) moved to new_status
+    """
+    rows = list(rows)
+    record_transitions((row, dict(row, status=new_status)) for row in rows)
+
+    AppointmentStatusChange.objects.bulk_create([
+        AppointmentStatusChange(
+            appointment_id=row['id'],
+            from_status=row['status'],
+            to_status=new_status,
+            changed_by_id=changed_by_id,
+        )
+        for row in rows
+    ])
+
+    if new_status in ACTIVE_STATUSES:
+        return
+    slots = [
+        (row['doctor_id'], row['appointment_date'], row['appointment_time'])
+        for row in rows
+        if row['status'] in ACTIVE_STATUSES
+    ]
+    if not slots:
+        return
+    release_slots(slots)
+
+    def apply():
+        for slot in slots:
+            availability_index.release(*slot)
+        free_slot_index.release(slots)
+
+    transaction.on_commit(apply)
+
+
+def transition(appointment, action, notes=None, changed_by_id=None, role=None):
+    """
+    Apply an ACTIONS action to one appointment and update it in memory
+
+    Raises TransitionNotPermitted if role may not take the action, and
+    InvalidTransition if the appointment's status doesn't allow it,
+    including when another request changed the status first.
+    """
+    check_role(action, role)
+    new_status, error = ACTIONS[action]
+    old_status = appointment.status
+    if not can_transition(old_status, new_status):
+        raise InvalidTransition(error)
+
+    changes = {'status': new_status, 'updated_at': timezone.now()}
+    if notes is not None:
+        changes['notes'] = notes
+
+    with transaction.atomic():
+        updated = Appointment.objects.filter(pk=appointment.pk, status=old_status).update(**changes)
+        if not updated:
+            raise InvalidTransition(error)
+        apply_side_effects([{field: getattr(appointment, field) for field in STATE_FIELDS}], new_status, changed_by_id)
+
+    for field, value in changes.items():
+        setattr(appointment, field, value)
+    # Keep the signal snapshot in step so a later save() doesn't count this
+    # transition again
+    if appointment._original_state is not None:
+        appointment._original_state = dict(appointment._original_state, status=new_status)
+    return appointment
@@ -1,44 +1,69 @@
+import re
+from functools import partial
+
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Count, Avg
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 
-from .models import Appointment, MedicalRecord, TimeSlot, Review
+from .models import Appointment, AttachmentUpload, MedicalRecord, MedicalRecordAttachment, TimeSlot, Review
+from .attachments import (
+    UploadError, attachment_response, cancel_upload, parse_content_range, start_upload, write_chunk
+)
+from .conditional import ConditionalListMixin
+from .fastpath import FlatReadMixin
+from .pagination import KeysetPagination
+from .sparse import SparseFieldsViewMixin
+from .streaming import CSVRenderer, NDJSONRenderer, NDJSONStreamMixin
+from .export import export_stream
 from .serializers import (
     AppointmentSerializer, AppointmentCreateSerializer,
     MedicalRecordSerializer, TimeSlotSerializer,
-    ReviewSerializer, AppointmentStatsSerializer
+    ReviewSerializer, AppointmentStatsSerializer,
+    TimeSlotGenerationSerializer, AppointmentBatchSerializer, EarliestSlotQuerySerializer,
+    MedicalRecordAttachmentSerializer, AttachmentUploadSerializer,
+    get_appointment_flat_serializer
 )
+from .freeslots import free_slot_index, free_time_slots
+from .batch import MAX_BATCH_SIZE, BatchConflict, apply_status_change, book_appointments
+from .scheduling import generate_time_slots
+from .transitions import InvalidTransition, TransitionNotPermitted, transition
+from .ratings import rating_stats
+from .stats import get_appointment_stats
+from users.models import DoctorProfile
+from users.authentication import user_role, user_doctor_id
 from users.permissions import IsDoctor, IsPatient, IsDoctorOrAdmin
 
+GZIP_ENCODING = re.compile(r'\bgzip\b')
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+
+class AppointmentViewSet(ConditionalListMixin, FlatReadMixin, SparseFieldsViewMixin, NDJSONStreamMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointments
     """
     queryset = Appointment.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-appointment_date', '-appointment_time', 'id')
+    flat_read_actions = ('list', 'upcoming')
 
     def get_serializer_class(self):
         if self.action == 'create':
             return AppointmentCreateSerializer
         return AppointmentSerializer
 
+    def get_flat_serializer(self):
+        return get_appointment_flat_serializer(self.get_sparse_spec())
+
     def get_queryset(self):
         """
         Filter appointments based on user role
         """
-        user = self.request.user
-        queryset = Appointment.objects.select_related('patient', 'doctor__user_profile__user')
-
-        if hasattr(user, 'profile'):
-            if user.profile.role == 'PATIENT':
-                queryset = queryset.filter(patient=user)
-            elif user.profile.role == 'DOCTOR':
-                queryset = queryset.filter(doctor__user_profile__user=user)
-            # ADMIN sees all appointments
+        queryset = self.get_scoped_queryset().select_related('patient', 'doctor__user_profile__user')
 
         # Filter by status
         status_filter = self.request.query_params.get('status', None)
@@ -55,101 +80,185 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_scoped_queryset(self):
+        """
+        Appointments the current user may see, based on their role
+        """
+        user = self.request.user
+        queryset = Appointment.objects.all()
+
+        role = user_role(user)
+        if role == 'PATIENT':
+            queryset = queryset.filter(patient_id=user.id)
+        elif role == 'DOCTOR':
+            queryset = queryset.filter(doctor_id=user_doctor_id(user))
+        # ADMIN sees all appointments
+
+        return queryset
+
     def perform_create(self, serializer):
         """
         Set the patient to the current user when creating appointment
         """
-        serializer.save(patient=self.request.user)
+        serializer.save(patient_id=self.request.user.id)
 
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """
         Confirm a pending appointment (Doctor/Admin only)
         """
-        appointment = self.get_object()
-        
-        if appointment.status != 'PENDING':
-            return Response({
-                'error': 'Only pending appointments can be confirmed'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        appointment.status = 'CONFIRMED'
-        appointment.save()
-
-        return Response({
-            'message': 'Appointment confirmed successfully',
-            'appointment': AppointmentSerializer(appointment).data
-        })
+        return self.transition_response('confirm', 'Appointment confirmed successfully')
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """
         Mark appointment as completed (Doctor/Admin only)
         """
-        appointment = self.get_object()
-        
-        if appointment.status not in ['PENDING', 'CONFIRMED']:
-            return Response({
-                'error': 'Only pending or confirmed appointments can be completed'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        appointment.status = 'COMPLETED'
-        appointment.notes = request.data.get('notes', appointment.notes)
-        appointment.save()
-
-        return Response({
-            'message': 'Appointment completed successfully',
-            'appointment': AppointmentSerializer(appointment).data
-        })
+        return self.transition_response(
+            'complete', 'Appointment completed successfully', notes=request.data.get('notes')
+        )
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """
         Cancel an appointment
         """
+        return self.transition_response('cancel', 'Appointment cancelled successfully')
+
+    def transition_response(self, action_name, message, notes=None):
+        """
+        Apply a status transition to the current appointment
+        """
         appointment = self.get_object()
-        
-        if appointment.status in ['COMPLETED', 'CANCELLED']:
+
+        try:
+            transition(
+                appointment, action_name, notes=notes, changed_by_id=self.request.user.id,
+                role=user_role(self.request.user)
+            )
+        except TransitionNotPermitted as error:
             return Response({
-                'error': 'Cannot cancel completed or already cancelled appointments'
+                'error': str(error)
+            }, status=status.HTTP_403_FORBIDDEN)
+        except InvalidTransition as error:
+            return Response({
+                'error': str(error)
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        appointment.status = 'CANCELLED'
-        appointment.save()
-
         return Response({
-            'message': 'Appointment cancelled successfully',
+            'message': message,
             'appointment': AppointmentSerializer(appointment).data
         })
 
-    @action(detail=False, methods=['get'])
-    def upcoming(self, request):
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
         """
-        Get upcoming appointments for the current user
+        Book, confirm, complete or cancel many appointments in one transaction
+        (confirm and complete are Doctor/Admin only)
         """
-        user = request.user
+        serializer = AppointmentBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        action_name = data['action']
+
+        if action_name == 'book':
+            results = self.batch_book(data['appointments'])
+        else:
+            queryset = self.get_scoped_queryset()
+            if 'filter' in data:
+                queryset = self.filter_batch_queryset(queryset, data['filter'])
+                if queryset.count() > MAX_BATCH_SIZE:
+                    return Response({
+                        'error': f'The filter matches more than {MAX_BATCH_SIZE} appointments'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                results = apply_status_change(
+                    queryset, action_name, ids=data.get('ids'), notes=data.get('notes'),
+                    changed_by_id=request.user.id, role=user_role(request.user)
+                )
+            except TransitionNotPermitted as error:
+                return Response({
+                    'error': str(error)
+                }, status=status.HTTP_403_FORBIDDEN)
+            except BatchConflict:
+                return Response({
+                    'error': 'Some appointments changed during the operation, please retry'
+                }, status=status.HTTP_409_CONFLICT)
+
+        succeeded = sum(1 for result in results if result['success'])
+        return Response({
+            'action': action_name,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results,
+        })
+
+    def batch_book(self, items):
+        """
+        Validate each item like a single booking and book the valid ones
+        """
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = AppointmentCreateSerializer(data=item, context=self.get_serializer_context())
+            if serializer.is_valid():
+                valid.append((index, dict(serializer.validated_data, patient_id=self.request.user.id)))
+            else:
+                results[index] = {'index': index, 'success': False, 'errors': serializer.errors}
+
+        booked = book_appointments([fields for _, fields in valid])
+        for (index, _), result in zip(valid, booked):
+            results[index] = dict(result, index=index)
+        return results
+
+    def filter_batch_queryset(self, queryset, filters):
+        if 'status' in filters:
+            queryset = queryset.filter(status=filters['status'])
+        if 'date' in filters:
+            queryset = queryset.filter(appointment_date=filters['date'])
+        if 'start_date' in filters:
+            queryset = queryset.filter(appointment_date__gte=filters['start_date'])
+        if 'end_date' in filters:
+            queryset = queryset.filter(appointment_date__lte=filters['end_date'])
+        return queryset
+
+    def get_upcoming_queryset(self):
+        """
+        Upcoming pending/confirmed appointments for the current user
+        """
+        user = self.request.user
+        role = user_role(user)
         today = timezone.now().date()
+        queryset = Appointment.objects.select_related('patient', 'doctor__user_profile__user')
         
-        if hasattr(user, 'profile') and user.profile.role == 'PATIENT':
-            appointments = Appointment.objects.filter(
-                patient=user,
+        if role == 'PATIENT':
+            appointments = queryset.filter(
+                patient_id=user.id,
                 appointment_date__gte=today,
                 status__in=['PENDING', 'CONFIRMED']
             ).order_by('appointment_date', 'appointment_time')
-        elif hasattr(user, 'profile') and user.profile.role == 'DOCTOR':
-            appointments = Appointment.objects.filter(
-                doctor__user_profile__user=user,
+        elif role == 'DOCTOR':
+            appointments = queryset.filter(
+                doctor_id=user_doctor_id(user),
                 appointment_date__gte=today,
                 status__in=['PENDING', 'CONFIRMED']
             ).order_by('appointment_date', 'appointment_time')
         else:
-            appointments = Appointment.objects.filter(
+            appointments = queryset.filter(
                 appointment_date__gte=today,
                 status__in=['PENDING', 'CONFIRMED']
             ).order_by('appointment_date', 'appointment_time')
 
-        serializer = self.get_serializer(appointments, many=True)
-        return Response(serializer.data)
+        return appointments
+
+    @action(detail=False, methods=['get'])
+    def upcoming(self, request):
+        """
+        Get upcoming appointments for the current user
+        """
+        queryset = self.filter_queryset(self.get_upcoming_queryset())
+        return self.conditional_response(queryset, partial(self.list_response, queryset), paginated=False)
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -157,33 +266,28 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         Get appointment statistics
         """
         user = request.user
+        role = user_role(user)
         
-        if hasattr(user, 'profile') and user.profile.role == 'PATIENT':
-            queryset = Appointment.objects.filter(patient=user)
-        elif hasattr(user, 'profile') and user.profile.role == 'DOCTOR':
-            queryset = Appointment.objects.filter(doctor__user_profile__user=user)
+        if role == 'PATIENT':
+            stats = get_appointment_stats('PATIENT', user.id)
+        elif role == 'DOCTOR':
+            stats = get_appointment_stats('DOCTOR', user_doctor_id(user))
         else:
-            queryset = Appointment.objects.all()
-
-        stats = {
-            'total_appointments': queryset.count(),
-            'pending_appointments': queryset.filter(status='PENDING').count(),
-            'confirmed_appointments': queryset.filter(status='CONFIRMED').count(),
-            'completed_appointments': queryset.filter(status='COMPLETED').count(),
-            'cancelled_appointments': queryset.filter(status='CANCELLED').count(),
-        }
+            stats = get_appointment_stats('GLOBAL')
 
         serializer = AppointmentStatsSerializer(stats)
         return Response(serializer.data)
 
 
-class MedicalRecordViewSet(viewsets.ModelViewSet):
+class MedicalRecordViewSet(ConditionalListMixin, SparseFieldsViewMixin, NDJSONStreamMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing medical records
     """
     queryset = MedicalRecord.objects.all()
     serializer_class = MedicalRecordSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
         """
@@ -192,12 +296,12 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         user = self.request.user
         queryset = MedicalRecord.objects.select_related('patient', 'doctor__user_profile__user')
 
-        if hasattr(user, 'profile'):
-            if user.profile.role == 'PATIENT':
-                queryset = queryset.filter(patient=user)
-            elif user.profile.role == 'DOCTOR':
-                queryset = queryset.filter(Q(doctor__user_profile__user=user) | Q(patient=user))
-            # ADMIN sees all records
+        role = user_role(user)
+        if role == 'PATIENT':
+            queryset = queryset.filter(patient_id=user.id)
+        elif role == 'DOCTOR':
+            queryset = queryset.filter(Q(doctor_id=user_doctor_id(user)) | Q(patient_id=user.id))
+        # ADMIN sees all records
 
         return queryset
 
@@ -205,13 +309,127 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         """
         Set the doctor to the current user's doctor profile when creating record
         """
-        if hasattr(self.request.user, 'profile') and hasattr(self.request.user.profile, 'doctor_profile'):
-            serializer.save(doctor=self.request.user.profile.doctor_profile)
+        doctor_id = user_doctor_id(self.request.user)
+        if doctor_id is not None:
+            serializer.save(doctor_id=doctor_id)
         else:
             raise ValidationError("Only doctors can create medical records")
 
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream the appointments, medical records and reviews the user can
+        see as NDJSON (?format=ndjson) or CSV (?format=csv), gzipped when
+        the client accepts it; ?patient= and ?doctor= narrow the export
+        """
+        user = request.user
+        role = user_role(user)
+        if role == 'PATIENT':
+            scope = Q(patient_id=user.id)
+        elif role == 'DOCTOR':
+            scope = Q(doctor_id=user_doctor_id(user)) | Q(patient_id=user.id)
+        else:
+            scope = None
+
+        filters = {}
+        for param in ('patient', 'doctor'):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                filters[f'{param}_id'] = int(value)
+            except ValueError:
+                return Response({'error': f'{param} must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        output_format = request.accepted_renderer.format
+        compress = bool(GZIP_ENCODING.search(request.headers.get('Accept-Encoding', '')))
+        response = StreamingHttpResponse(
+            export_stream(output_format, compress, scope=scope, **filters),
+            content_type=request.accepted_renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="medical-history.{output_format}"'
+        response['X-Accel-Buffering'] = 'no'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
 
-class TimeSlotViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def uploads(self, request, pk=None):
+        """
+        Start a chunked upload of an attachment ({filename, size,
+        content_type, sha256}); the chunks are then sent to the upload
+        """
+        record = self.get_object()
+        serializer = AttachmentUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = start_upload(record, uploaded_by_id=request.user.id, **serializer.validated_data)
+        except UploadError as error:
+            return Response({'error': str(error)}, status=error.status)
+        return Response(AttachmentUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'patch', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})')
+    def upload(self, request, pk=None, upload_id=None):
+        """
+        GET an upload's offset to resume it, PATCH the next chunk as the raw
+        body with a "Content-Range: bytes first-last/total" header, or
+        DELETE it; the chunk completing the upload returns the attachment
+        """
+        record = self.get_object()
+        try:
+            upload = AttachmentUpload.objects.get(pk=upload_id, record=record)
+        except AttachmentUpload.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.method == 'GET':
+            return Response(AttachmentUploadSerializer(upload).data)
+        if request.method == 'DELETE':
+            cancel_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            offset, length = parse_content_range(request.headers.get('Content-Range'), upload.size)
+            # Read from the request stream so the chunk is never buffered whole
+            result = write_chunk(upload, offset, request.stream, length)
+        except UploadError as error:
+            return Response({'error': str(error), 'offset': upload.offset}, status=error.status)
+
+        if isinstance(result, MedicalRecordAttachment):
+            return Response(MedicalRecordAttachmentSerializer(result).data, status=status.HTTP_201_CREATED)
+        return Response(AttachmentUploadSerializer(result).data)
+
+    @action(detail=True, methods=['get'])
+    def attachments(self, request, pk=None):
+        """
+        List a record's attachments
+        """
+        record = self.get_object()
+        return Response(MedicalRecordAttachmentSerializer(record.files.all(), many=True).data)
+
+    @action(detail=True, methods=['get', 'delete'], url_path=r'attachments/(?P<attachment_id>[0-9]+)')
+    def attachment(self, request, pk=None, attachment_id=None):
+        """
+        Download an attachment (Range requests supported) or DELETE it
+        """
+        record = self.get_object()
+        try:
+            attachment = record.files.get(pk=attachment_id)
+        except MedicalRecordAttachment.DoesNotExist:
+            return Response({'error': 'Attachment not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.method == 'DELETE':
+            attachment.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return attachment_response(
+            attachment,
+            range_header=request.headers.get('Range'),
+            if_range=request.headers.get('If-Range'),
+            as_attachment=request.query_params.get('inline') != 'true',
+        )
+
+
+class TimeSlotViewSet(SparseFieldsViewMixin, NDJSONStreamMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing time slots
     """
@@ -242,28 +460,104 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('date', 'start_time')
 
-    @action(detail=False, methods=['get'])
-    def available(self, request):
+    def get_available_queryset(self):
         """
-        Get all available (unbooked) time slots
+        All future unbooked time slots
         """
         today = timezone.now().date()
-        slots = TimeSlot.objects.filter(
+        return TimeSlot.objects.select_related('doctor__user_profile__user').filter(
             is_booked=False,
             date__gte=today
         ).order_by('date', 'start_time')
-        
-        serializer = self.get_serializer(slots, many=True)
-        return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Get all available (unbooked) time slots
+        """
+        return self.list_response(self.filter_queryset(self.get_available_queryset()))
+
+    @action(detail=False, methods=['get'])
+    def earliest(self, request):
+        """
+        Get the earliest free slots of available doctors, optionally limited
+        to a specialization, a set of doctors and a time-of-day window
+        """
+        serializer = EarliestSlotQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        doctors = DoctorProfile.objects.filter(is_available=True)
+        if 'specialization' in data:
+            doctors = doctors.filter(specialization=data['specialization'])
+        if data.get('doctors'):
+            doctors = doctors.filter(id__in=data['doctors'])
+
+        found = free_slot_index.earliest(
+            doctors.values_list('id', flat=True),
+            data['limit'],
+            after=data.get('after'),
+            time_from=data.get('time_from'),
+            time_to=data.get('time_to'),
+        )
+        slot_ids = [slot[4] for slot in found]
+        slots = {
+            slot.id: slot
+            for slot in self.filter_queryset(
+                free_time_slots(TimeSlot.objects.select_related('doctor__user_profile__user').filter(id__in=slot_ids))
+            )
+        }
+        # Slots booked by another process since the index was loaded
+        for doctor_id in {slot[3] for slot in found if slot[4] not in slots}:
+            free_slot_index.invalidate(doctor_id)
+
+        return Response(self.get_serializer([slots[slot_id] for slot_id in slot_ids if slot_id in slots], many=True).data)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsDoctorOrAdmin])
+    def generate(self, request):
+        """
+        Expand doctors' weekly schedules into time slots for a date range
+        (Doctor/Admin only; doctors can only generate their own slots)
+        """
+        serializer = TimeSlotGenerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if user_role(request.user) == 'DOCTOR':
+            doctor_id = user_doctor_id(request.user)
+            if doctor_id is None:
+                return Response({
+                    'error': 'Doctor profile not found'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            doctors = list(DoctorProfile.objects.filter(id=doctor_id))
+        else:
+            doctors = data.get('doctors') or DoctorProfile.objects.filter(is_available=True)
+
+        created = generate_time_slots(
+            doctors,
+            data['start_date'],
+            data['end_date'],
+            slot_minutes=data.get('slot_minutes'),
+            weekdays=data.get('weekdays'),
+            interval_weeks=data['interval_weeks'],
+            exclude_dates=data['exclude_dates'],
+        )
+
+        return Response({
+            'message': 'Time slots generated successfully',
+            'created': created,
+        }, status=status.HTTP_201_CREATED)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+
+class ReviewViewSet(ConditionalListMixin, SparseFieldsViewMixin, NDJSONStreamMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing reviews
     """
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
         """
@@ -277,8 +571,8 @@ class ReviewViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(doctor_id=doctor_id)
         
         # Filter by patient (only show own reviews to patients)
-        if hasattr(self.request.user, 'profile') and self.request.user.profile.role == 'PATIENT':
-            queryset = queryset.filter(patient=self.request.user)
+        if user_role(self.request.user) == 'PATIENT':
+            queryset = queryset.filter(patient_id=self.request.user.id)
         
         return queryset
 
@@ -287,18 +581,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
         """
         Get review statistics for a specific doctor
         """
-        reviews = Review.objects.filter(doctor_id=doctor_id)
-        
-        stats = {
-            'total_reviews': reviews.count(),
-            'average_rating': reviews.aggregate(Avg('rating'))['rating__avg'] or 0,
-            'rating_distribution': {
-                '5_star': reviews.filter(rating=5).count(),
-                '4_star': reviews.filter(rating=4).count(),
-                '3_star': reviews.filter(rating=3).count(),
-                '2_star': reviews.filter(rating=2).count(),
-                '1_star': reviews.filter(rating=1).count(),
-            }
-        }
-        
-        return Response(stats)
\ No newline at end of file
+        try:
+            doctor = DoctorProfile.objects.get(id=doctor_id)
+        except (DoctorProfile.DoesNotExist, ValueError):
+            return Response({
+                'error': 'Doctor not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(rating_stats(doctor))
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""
+Per-request SQL and latency metrics.
+
+RequestMetricsMiddleware times every request and the SQL it runs (through
+a database execute wrapper), adds the numbers to the response as a
+Server-Timing header and records them in in-process histograms labelled
+with the matched route name (e.g. appointment-list, doctor-availability)
+and method. metrics_view serves the histograms in the Prometheus text
+format at /metrics.
+
+With METRICS_DETECT_N_PLUS_ONE on, the middleware also remembers every
+statement a request runs; one that runs METRICS_N_PLUS_ONE_THRESHOLD or
+more times with different parameters is logged as a likely N+1 together
+with the serializer field that was being rendered when it ran. This walks
+the stack on every query, so it is meant for development.
+
+Each worker process keeps its own histograms. Queries run while a
+streaming response is consumed happen after the middleware has returned
+and are not counted.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+UNMATCHED = 'unmatched'
+
+
+def get_detect_n_plus_one():
+    return getattr(settings, 'METRICS_DETECT_N_PLUS_ONE', False)
+
+
+def get_n_plus_one_threshold():
+    return getattr(settings, 'METRICS_N_PLUS_ONE_THRESHOLD', 5)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for number, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[number] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe request histograms and counters keyed by (route, method)
+    """
+
+    HISTOGRAMS = (
+        ('http_request_duration_seconds', 'Time spent handling the request', DURATION_BUCKETS),
+        ('http_request_sql_duration_seconds', 'Time spent in SQL queries per request', DURATION_BUCKETS),
+        ('http_request_sql_queries', 'SQL queries run per request', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {name: {} for name, _, _ in self.HISTOGRAMS}
+            self._responses = Counter()
+            self._n_plus_one = Counter()
+
+    def observe(self, route, method, status, duration, sql_duration, sql_queries):
+        labels = (route, method)
+        with self._lock:
+            for (name, _, buckets), value in zip(self.HISTOGRAMS, (duration, sql_duration, sql_queries)):
+                histogram = self._histograms[name].get(labels)
+                if histogram is None:
+                    histogram = self._histograms[name][labels] = Histogram(buckets)
+                histogram.observe(value)
+            self._responses[(route, method, str(status))] += 1
+
+    def flag_n_plus_one(self, route, source):
+        with self._lock:
+            self._n_plus_one[(route, source)] += 1
+
+    def render(self):
+        """
+        Return everything in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP http_responses_total Responses by route, method and status',
+                '# TYPE http_responses_total counter',
+            ]
+            for (route, method, status), count in sorted(self._responses.items()):
+                lines.append(f'http_responses_total{{{labels(route=route, method=method, status=status)}}} {count}')
+
+            for name, description, _ in self.HISTOGRAMS:
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for (route, method), histogram in sorted(self._histograms[name].items()):
+                    label = labels(route=route, method=method)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum:.6f}'.rstrip('0').rstrip('.'))
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+            lines += [
+                '# HELP http_n_plus_one_total Requests that repeated a query, by route and serializer field',
+                '# TYPE http_n_plus_one_total counter',
+            ]
+            for (route, source), count in sorted(self._n_plus_one.items()):
+                lines.append(f'http_n_plus_one_total{{{labels(route=route, source=source)}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def labels(**values):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in values.items()
+    )
+    return ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+registry = MetricsRegistry()
+
+
+def serializer_field_at_query():
+    """
+    Name the serializer field ("AppointmentSerializer.doctor_name") being
+    rendered by the innermost Serializer.to_representation on the stack
+    """
+    from rest_framework.serializers import Serializer
+
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            serializer = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if isinstance(serializer, Serializer) and field is not None:
+                return f'{type(serializer).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts and times queries, and with
+    detect set remembers each statement's parameters and source field
+    """
+
+    def __init__(self, detect=False):
+        self.detect = detect
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            if self.detect:
+                params_seen, sources = self.statements.setdefault(sql, (set(), Counter()))
+                params_seen.add(repr(params))
+                sources[serializer_field_at_query()] += 1
+
+    def repeated(self, threshold):
+        """
+        Yield (sql, times, source field) for statements run threshold or
+        more times with different parameters
+        """
+        for sql, (params_seen, sources) in self.statements.items():
+            if len(params_seen) >= threshold:
+                source = sources.most_common(1)[0][0]
+                yield sql, sum(sources.values()), source
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    return match.url_name or match.route or UNMATCHED
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency and SQL metrics for every request; should come first
+    in MIDDLEWARE so the total covers the other middleware too
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(detect=get_detect_n_plus_one())
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        route = route_name(request)
+        registry.observe(route, request.method, response.status_code, duration, recorder.duration, recorder.count)
+        response['Server-Timing'] = (
+            f'sql;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", '
+            f'total;dur={duration * 1000:.2f}'
+        )
+
+        if recorder.detect:
+            for sql, times, source in recorder.repeated(get_n_plus_one_threshold()):
+                registry.flag_n_plus_one(route, source or 'unknown')
+                logger.warning(
+                    'Possible N+1 on %s %s (%s): query ran %d times from %s: %s',
+                    request.method, request.path, route, times, source or 'outside a serializer field', sql
+                )
+        return response
+
+
+def metrics_view(request):
+    """
+    Request metrics in the Prometheus text format, for METRICS_ALLOWED_IPS
+    and logged-in staff
+    """
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,8 +1,14 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Files written at runtime (uploads, caches) are kept outside the checkout
+DATA_DIR = Path(os.environ.get('DATA_DIR', Path.home() / '.healthcare-appointments'))
+
 SECRET_KEY = 'django-insecure-dev-key-change-in-production'
 
 DEBUG = True
@@ -28,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -95,10 +102,14 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Let the frontend read list ETags and send them back in If-None-Match
+CORS_EXPOSE_HEADERS = ['ETag']
+CORS_ALLOW_HEADERS = [*default_headers, 'if-none-match']
+
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -107,6 +118,52 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# Appointment booking
+APPOINTMENT_SLOT_MINUTES = 30
+AVAILABILITY_INDEX_TTL = 60  # seconds before a doctor-day is reloaded from the DB
+AVAILABILITY_INDEX_MAX_ENTRIES = 50000
+FREE_SLOT_INDEX_TTL = 60  # seconds before a doctor's free slots are reloaded from the DB
+FREE_SLOT_INDEX_MAX_ENTRIES = 20000
+FREE_SLOT_INDEX_MAX_SLOTS = 50000  # free slots held across all doctors
+
+# Medical record attachments (appointments.attachments)
+ATTACHMENT_ROOT = Path(os.environ.get('ATTACHMENT_ROOT', DATA_DIR / 'attachments'))
+ATTACHMENT_MAX_SIZE = 2 * 1024 ** 3  # bytes
+
+# Admin changelists count unfiltered tables larger than this from the
+# database's row estimate instead of COUNT(*) (appointments.paginators)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 50000
+
+# Request metrics (config.metrics), served at /metrics
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # staff users may also read them
+METRICS_DETECT_N_PLUS_ONE = DEBUG  # log statements repeated within a request
+METRICS_N_PLUS_ONE_THRESHOLD = 5  # times with different parameters
+
+# Doctor list and availability response cache (users.response_cache); the
+# file-based cache is shared by all workers on a host, and the version that
+# invalidates it is kept in the database
+DOCTOR_DIRECTORY_CACHE = 'doctor_directory'
+DOCTOR_DIRECTORY_CACHE_TTL = 300  # seconds, for changes made without signals
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'doctor_directory': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'doctor-directory',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'doctor_directory_shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': DATA_DIR / 'cache' / 'doctor-directory',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Authenticated-user cache (users.cache)
+USER_CACHE_TTL = 60  # seconds before a cached user is reloaded from the DB
+USER_CACHE_MAX_ENTRIES = 10000
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -126,4 +183,5 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.ClaimsTokenRefreshSerializer',
 }
\ No newline at end of file
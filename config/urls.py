@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 
+from .metrics import metrics_view
+
 def api_root(request):
     return JsonResponse({
         'message': 'Healthcare Appointment System API',
@@ -11,12 +13,14 @@ def api_root(request):
             'auth': '/api/auth/',
             'users': '/api/users/',
             'appointments': '/api/appointments/',
+            'metrics': '/metrics',
         }
     })
 
 urlpatterns = [
     path('', api_root, name='api-root'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/auth/', include('users.urls')),
     path('api/users/', include('users.urls')),
     path('api/appointments/', include('appointments.urls')),
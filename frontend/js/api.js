@@ -1,8 +1,18 @@
 // API Service
 const API = {
+    // ETag and body of the last response for each GET URL, sent back as
+    // If-None-Match so unchanged lists come back as an empty 304
+    validators: new Map(),
+
+    clearValidators() {
+        this.validators.clear();
+    },
+
     async request(endpoint, options = {}) {
         const url = `${CONFIG.API_BASE_URL}${endpoint}`;
         const token = Auth.getAccessToken();
+        const isGet = !options.method || options.method.toUpperCase() === 'GET';
+        const cached = isGet ? this.validators.get(url) : null;
 
         const headers = {
             'Content-Type': 'application/json',
@@ -13,12 +23,22 @@ const API = {
             headers['Authorization'] = `Bearer ${token}`;
         }
 
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+
         try {
             const response = await fetch(url, {
                 ...options,
-                headers
+                headers,
+                // Validators are handled here, so keep the browser cache out of it
+                cache: isGet ? 'no-store' : options.cache
             });
 
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+
             if (response.status === 401 && !options.skipRefresh) {
                 // Try to refresh token
                 const refreshed = await this.refreshToken();
@@ -36,6 +56,13 @@ const API = {
                 throw data;
             }
 
+            const etag = response.headers.get('ETag');
+            if (isGet && etag) {
+                this.validators.set(url, { etag, data });
+            } else if (isGet) {
+                this.validators.delete(url);
+            }
+
             return data;
         } catch (error) {
             console.error('API Error:', error);
@@ -35,6 +35,9 @@ const Auth = {
         localStorage.removeItem(CONFIG.TOKEN_KEY);
         localStorage.removeItem(CONFIG.REFRESH_TOKEN_KEY);
         localStorage.removeItem(CONFIG.USER_KEY);
+        if (typeof API !== 'undefined') {
+            API.clearValidators();
+        }
     },
 
     logout() {
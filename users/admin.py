@@ -1,13 +1,19 @@
 from django.contrib import admin
 from .models import UserProfile, DoctorProfile
+from appointments.admin import RelatedStrMixin
+from appointments.paginators import EstimatedCountPaginator
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(RelatedStrMixin, admin.ModelAdmin):
     list_display = ['user', 'role', 'phone', 'created_at']
     list_filter = ['role', 'created_at']
     search_fields = ['user__username', 'user__email', 'phone']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('User Information', {
@@ -27,10 +33,14 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(DoctorProfile)
-class DoctorProfileAdmin(admin.ModelAdmin):
+class DoctorProfileAdmin(RelatedStrMixin, admin.ModelAdmin):
     list_display = ['get_doctor_name', 'specialization', 'license_number', 'is_available', 'consultation_fee']
     list_filter = ['specialization', 'is_available']
     search_fields = ['user_profile__user__username', 'user_profile__user__email', 'license_number']
+    list_select_related = ['user_profile__user']
+    autocomplete_fields = ['user_profile']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Doctor Information', {
@@ -46,4 +56,4 @@ class DoctorProfileAdmin(admin.ModelAdmin):
     
     def get_doctor_name(self, obj):
         return obj.user_profile.user.get_full_name() or obj.user_profile.user.username
-    get_doctor_name.short_description = 'Doctor Name'
\ No newline at end of file
+    get_doctor_name.short_description = 'Doctor Name'
@@ -6,4 +6,5 @@ class UsersConfig(AppConfig):
     name = 'users'
     
     def ready(self):
-        import users.models
\ No newline at end of file
+        import users.models
+        import users.signals
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+JWT access tokens carrying the user's role and doctor profile id.
+
+Tokens issued through ClaimsRefreshToken embed `role` and `doctor_id`
+claims. ClaimsJWTAuthentication turns a token carrying them into a
+ClaimsUser without touching the database, so permission checks and
+queryset scoping can use `user_role()` / `user_doctor_id()` and filter on
+ids directly. The profile and User row are still available on a ClaimsUser
+and are loaded lazily the first time something reads them.
+
+Claims are refreshed from the database whenever a new access token is
+minted from a refresh token, so a role change reaches clients within one
+access token lifetime. Tokens issued before the claims existed fall back to
+the regular database lookup.
+
+An `active` claim records User.is_active; tokens minted for a deactivated
+user are rejected. Because a deactivation only shows up in the next token,
+writes (non-safe methods) also check is_active on the User row, read from
+the user cache, so a deactivated user can't change anything with a token
+issued before.
+
+CachedJWTAuthentication additionally serves users and profiles from the
+in-process user cache (users.cache), for tokens without claims and for
+ClaimsUsers whose profile or User row is read.
+"""
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cache import user_cache
+from .models import UserProfile
+
+ROLE_CLAIM = 'role'
+DOCTOR_ID_CLAIM = 'doctor_id'
+ACTIVE_CLAIM = 'active'
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry role, doctor_id and active claims
+    """
+    _claims_loaded = False
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(getattr(user, 'profile', None))
+        return token
+
+    def set_user_claims(self, profile):
+        doctor = getattr(profile, 'doctor_profile', None)
+        self[ROLE_CLAIM] = profile.role if profile else None
+        self[DOCTOR_ID_CLAIM] = doctor.id if doctor else None
+        self[ACTIVE_CLAIM] = profile.user.is_active if profile else False
+        self._claims_loaded = True
+
+    @property
+    def access_token(self):
+        # A token decoded from a refresh request carries the claims from the
+        # time it was issued; reload them so role changes are picked up.
+        if not self._claims_loaded:
+            profile = UserProfile.objects.select_related('user', 'doctor_profile').filter(
+                user_id=self[api_settings.USER_ID_CLAIM]
+            ).first()
+            self.set_user_claims(profile)
+        return super().access_token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsUser:
+    """
+    Lightweight request.user built from token claims
+
+    id, role, doctor_id and is_active need no query. `profile` and `user` load the
+    UserProfile and User rows on first access (through the user cache), and
+    any other attribute is read from the User row.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, validated_token):
+        # simplejwt stores the id as a string
+        self.id = self.pk = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        self.role = validated_token[ROLE_CLAIM]
+        self.doctor_id = validated_token.get(DOCTOR_ID_CLAIM)
+        self.is_active = validated_token.get(ACTIVE_CLAIM, True)
+
+    @cached_property
+    def user(self):
+        user = user_cache.get(self.id)
+        if user is None:
+            raise User.DoesNotExist(f'User {self.id} does not exist')
+        return user
+
+    @cached_property
+    def profile(self):
+        profile = getattr(self.user, 'profile', None)
+        if profile is None:
+            raise AttributeError('profile')
+        return profile
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'profile':
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __str__(self):
+        return f'user {self.id} ({self.role})'
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the role/doctor_id claims instead of
+    loading the user on every request
+
+    A user deactivated after their access token was issued can still read
+    until it expires, but writes check the User row again.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if (result is not None and api_settings.CHECK_USER_IS_ACTIVE and
+                request.method not in SAFE_METHODS and isinstance(result[0], ClaimsUser)):
+            try:
+                is_active = result[0].user.is_active
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if not is_active:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return result
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user = ClaimsUser(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+class CachedJWTAuthentication(ClaimsJWTAuthentication):
+    """
+    ClaimsJWTAuthentication that loads users without claims from the user
+    cache instead of the database
+    """
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM in validated_token or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+
+        user = user_cache.get(User._meta.pk.to_python(user_id))
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+def user_role(user):
+    """
+    The user's role, from the token claims when available
+    """
+    if isinstance(user, ClaimsUser):
+        return user.role
+    profile = getattr(user, 'profile', None)
+    return profile.role if profile else None
+
+
+def user_doctor_id(user):
+    """
+    The user's DoctorProfile id (None if they have none), from the token
+    claims when available
+    """
+    if isinstance(user, ClaimsUser):
+        return user.doctor_id
+    doctor = getattr(getattr(user, 'profile', None), 'doctor_profile', None)
+    return doctor.id if doctor else None
@@ -0,0 +1,166 @@
+"""
+In-process cache of authenticated users.
+
+Maps a user id to the User row with its profile and doctor profile already
+joined, so authenticating a request and reading request.user.profile cost
+no queries once a user has been seen. Entries are dropped by the signals in
+users.signals whenever a User, UserProfile or DoctorProfile is saved or
+deleted, and expire after USER_CACHE_TTL seconds so that changes made by
+other worker processes are picked up. A load that an invalidation overtook
+is returned to its caller but not stored.
+"""
+import copy
+import threading
+import time as time_module
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+
+def copy_instance(instance, copies=None):
+    """
+    Copy a model instance's field values, and the related instances cached
+    on it, without deep-copying; list and dict values (JSONField) are
+    copied one level down
+    """
+    copies = {} if copies is None else copies
+    clone = copies.get(id(instance))
+    if clone is None:
+        clone = copies[id(instance)] = copy.copy(instance)
+        for name, value in list(vars(clone).items()):
+            if isinstance(value, (list, dict)):
+                setattr(clone, name, copy.copy(value))
+        cache = clone._state.fields_cache
+        for name, related in list(cache.items()):
+            if related is not None:
+                cache[name] = copy_instance(related, copies)
+    return clone
+
+
+class UserCache:
+    """
+    Bounded, thread-safe LRU map of user id -> User with hit/miss counters
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._profile_users = {}
+        # user id -> [loads in flight, generation]; invalidating a user bumps
+        # its generation so that a load it overtook isn't stored
+        self._loads = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'USER_CACHE_TTL', 60)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'USER_CACHE_MAX_ENTRIES', 10000)
+
+    def _load(self, user_id):
+        return User.objects.select_related('profile__doctor_profile').filter(pk=user_id).first()
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None and entry[2] is not None:
+            self._profile_users.pop(entry[2], None)
+
+    def get(self, user_id):
+        """
+        Return a private copy of the user (None if it does not exist)
+        """
+        now = time_module.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                # Callers may modify what they get back, e.g. the profile in
+                # update_profile, so never hand out the cached instance.
+                return copy_instance(entry[0])
+            self.misses += 1
+            load = self._loads.setdefault(user_id, [0, 0])
+            load[0] += 1
+            generation = load[1]
+
+        try:
+            user = self._load(user_id)
+        finally:
+            with self._lock:
+                load = self._loads[user_id]
+                load[0] -= 1
+                current = load[1] == generation
+                if not load[0]:
+                    del self._loads[user_id]
+        if user is None or not current:
+            return user
+
+        profile = getattr(user, 'profile', None)
+        with self._lock:
+            self._drop(user_id)
+            self._entries[user_id] = (copy_instance(user), now + self.ttl, profile.pk if profile else None)
+            if profile is not None:
+                self._profile_users[profile.pk] = user_id
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return user
+
+    def _bump(self, user_id):
+        load = self._loads.get(user_id)
+        if load is not None:
+            load[1] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+            self._bump(user_id)
+
+    def invalidate_profile(self, profile_id):
+        """
+        Drop the user owning a UserProfile, if cached
+        """
+        with self._lock:
+            user_id = self._profile_users.get(profile_id)
+            if user_id is not None:
+                self._drop(user_id)
+                self._bump(user_id)
+            else:
+                # Which user a load in flight belongs to isn't known yet
+                for user_id in self._loads:
+                    self._bump(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._profile_users.clear()
+            for user_id in self._loads:
+                self._bump(user_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+user_cache = UserCache()
@@ -49,6 +49,16 @@ class DoctorProfile(models.Model):
     available_time_end = models.TimeField(default='17:00')
     is_available = models.BooleanField(default=True)
 
+    # Review aggregates, maintained incrementally by appointments.ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0, db_index=True)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Dr. {self.user_profile.user.get_full_name()} - {self.specialization}"
 
@@ -57,6 +67,20 @@ class DoctorProfile(models.Model):
         verbose_name_plural = 'Doctor Profiles'
 
 
+class DirectoryVersion(models.Model):
+    """
+    Single-row version of the cached doctor directory (users.response_cache)
+    """
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Doctor directory version {self.version}"
+
+    class Meta:
+        verbose_name = 'Directory Version'
+        verbose_name_plural = 'Directory Version'
+
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Automatically create a UserProfile when a User is created"""
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .authentication import user_role
+
 
 class IsPatient(permissions.BasePermission):
     """
@@ -7,7 +9,7 @@ class IsPatient(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and \
-               hasattr(request.user, 'profile') and request.user.profile.role == 'PATIENT'
+               user_role(request.user) == 'PATIENT'
 
 
 class IsDoctor(permissions.BasePermission):
@@ -16,7 +18,7 @@ class IsDoctor(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and \
-               hasattr(request.user, 'profile') and request.user.profile.role == 'DOCTOR'
+               user_role(request.user) == 'DOCTOR'
 
 
 class IsAdmin(permissions.BasePermission):
@@ -25,7 +27,7 @@ class IsAdmin(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and \
-               hasattr(request.user, 'profile') and request.user.profile.role == 'ADMIN'
+               user_role(request.user) == 'ADMIN'
 
 
 class IsDoctorOrAdmin(permissions.BasePermission):
@@ -34,8 +36,7 @@ class IsDoctorOrAdmin(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and \
-               hasattr(request.user, 'profile') and \
-               request.user.profile.role in ['DOCTOR', 'ADMIN']
+               user_role(request.user) in ['DOCTOR', 'ADMIN']
 
 
 class IsOwnerOrAdmin(permissions.BasePermission):
@@ -44,13 +45,13 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     """
     def has_object_permission(self, request, view, obj):
         # Admin can do anything
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'ADMIN':
+        if user_role(request.user) == 'ADMIN':
             return True
         
         # Check if the object belongs to the user
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
-        elif hasattr(obj, 'patient'):
-            return obj.patient == request.user
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.id
+        elif hasattr(obj, 'patient_id'):
+            return obj.patient_id == request.user.id
         
         return False
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Versioned response cache for the doctor directory.
+
+The doctor list and availability responses are read far more often than
+doctors change, and the same for every user, so their rendered JSON is
+cached under the request's path and query parameters. Every key also
+carries the directory version: the signals in users.signals (and the
+rating updates in appointments.ratings) bump it whenever a DoctorProfile,
+a doctor's UserProfile or User row, or a doctor's ratings change, which
+orphans every cached response at once instead of having to find the keys
+a change affects.
+
+The version is the single DirectoryVersion row, not a cache key: it is
+bumped with an UPDATE in the same transaction as the change, so every
+worker sees the new version exactly when it sees the changed rows, and
+reading it is one primary-key lookup. The responses themselves live in
+the Django cache named by DOCTOR_DIRECTORY_CACHE; the default local-memory
+one is per process, the file-based one in settings is shared by every
+worker on a host. Entries also expire after DOCTOR_DIRECTORY_CACHE_TTL
+seconds, for changes made without signals (bulk_create, queryset.update()).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .models import DirectoryVersion
+
+VERSION_ID = 1
+
+
+def get_cache():
+    return caches[getattr(settings, 'DOCTOR_DIRECTORY_CACHE', 'default')]
+
+
+def get_ttl():
+    return getattr(settings, 'DOCTOR_DIRECTORY_CACHE_TTL', 300)
+
+
+def get_version():
+    version = DirectoryVersion.objects.filter(pk=VERSION_ID).values_list('version', flat=True).first()
+    if version is None:
+        # Start from the clock rather than 1, so a rebuilt database never
+        # comes back to a version that cached entries were stored under
+        version = DirectoryVersion.objects.get_or_create(
+            pk=VERSION_ID, defaults={'version': time.time_ns()}
+        )[0].version
+    return version
+
+
+def bump_version():
+    """
+    Invalidate every cached directory response once the current
+    transaction commits
+    """
+    if not DirectoryVersion.objects.filter(pk=VERSION_ID).update(version=F('version') + 1):
+        get_version()
+
+
+def response_key(request, version):
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    digest = hashlib.sha1(repr((request.get_host(), request.path, params)).encode()).hexdigest()
+    return f'doctor-directory:{version}:{digest}'
+
+
+class DirectoryCacheMixin:
+    """
+    Viewset mixin for serving actions from the directory cache; cached
+    responses must not depend on the requesting user
+    """
+
+    def cached_response(self, request, build):
+        """
+        Return the cached rendering of build()'s response, rendering and
+        storing it on a miss; only successful JSON responses are cached
+        """
+        if not isinstance(getattr(request, 'accepted_renderer', None), JSONRenderer):
+            return build()
+
+        cache = get_cache()
+        key = response_key(request, get_version())
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = self.finalize_response(request, build())
+        if response.status_code == 200 and not response.streaming:
+            response.render()
+            cache.set(key, (response.content, response['Content-Type']), get_ttl())
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,239 @@
+"""
+Full-text doctor search.
+
+Doctors are indexed by name (first, last and username), specialization
+(code and label) and bio in a side table maintained outside the ORM:
+
+* SQLite: an FTS5 virtual table ranked with bm25()
+* PostgreSQL: a tsvector column with a GIN index ranked with ts_rank()
+
+Every query word is matched as a prefix ("card smi" finds "Cardiology",
+"Smith"), all words must match, and name matches outrank specialization
+matches, which outrank bio matches. Other databases fall back to an
+unindexed icontains search.
+
+The table is created after migrate (users.signals) and kept up to date by
+the DoctorProfile and User signals; rebuild_doctor_search rebuilds it.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import DoctorProfile
+
+TABLE = 'users_doctor_search'
+WORD = re.compile(r'\w+', re.UNICODE)
+MAX_QUERY_WORDS = 8
+
+SPECIALIZATION_LABELS = dict(DoctorProfile.SPECIALIZATION_CHOICES)
+
+
+def query_words(query):
+    return WORD.findall(query.lower())[:MAX_QUERY_WORDS]
+
+
+def document_fields(doctor_id, first_name, last_name, username, specialization, bio):
+    """
+    Return the indexed (name, specialization, bio) texts for a doctor
+    """
+    name = ' '.join(part for part in (first_name, last_name, username) if part)
+    specialization = f'{specialization} {SPECIALIZATION_LABELS.get(specialization, "")}'.strip()
+    return doctor_id, name, specialization, bio or ''
+
+
+def _document_rows(doctor_ids=None):
+    queryset = DoctorProfile.objects.order_by('id')
+    if doctor_ids is not None:
+        queryset = queryset.filter(id__in=doctor_ids)
+    rows = queryset.values_list(
+        'id', 'user_profile__user__first_name', 'user_profile__user__last_name',
+        'user_profile__user__username', 'specialization', 'bio'
+    )
+    for row in rows.iterator(chunk_size=2000):
+        yield document_fields(*row)
+
+
+class SQLiteSearchBackend:
+    # The FTS5 rowid is the doctor id, so updates and deletes by doctor
+    # are rowid lookups rather than scans
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "name, specialization, bio, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def delete(self, cursor, doctor_ids):
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(doctor_ids))})", doctor_ids
+        )
+
+    def insert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, name, specialization, bio) VALUES (%s, %s, %s, %s)", rows
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    def search(self, cursor, words, limit, specialization):
+        # Quote each word so FTS5 syntax in user input is never interpreted
+        match = ' '.join(f'"{word}"*' for word in words)
+        sql = (
+            f"SELECT s.rowid FROM {TABLE} s "
+            f"JOIN {DoctorProfile._meta.db_table} d ON d.id = s.rowid "
+            f"WHERE {TABLE} MATCH %s AND d.is_available"
+        )
+        params = [match]
+        if specialization:
+            sql += " AND d.specialization = %s"
+            params.append(specialization)
+        # bm25() is lower for better matches; the weights follow the column order
+        sql += f" ORDER BY bm25({TABLE}, 10.0, 4.0, 1.0) LIMIT %s"
+        params.append(limit)
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    DOCUMENT = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'C')"
+    )
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            f"doctor_id bigint PRIMARY KEY REFERENCES {DoctorProfile._meta.db_table} (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING GIN (document)")
+
+    def delete(self, cursor, doctor_ids):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE doctor_id = ANY(%s)", [list(doctor_ids)])
+
+    def insert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (doctor_id, document) VALUES (%s, {self.DOCUMENT}) "
+            "ON CONFLICT (doctor_id) DO UPDATE SET document = EXCLUDED.document",
+            rows
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TABLE}")
+
+    def search(self, cursor, words, limit, specialization):
+        # Words are \w+ only, so they are safe inside a tsquery
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        sql = (
+            f"SELECT s.doctor_id FROM {TABLE} s "
+            f"JOIN {DoctorProfile._meta.db_table} d ON d.id = s.doctor_id "
+            "WHERE s.document @@ to_tsquery('simple', %s) AND d.is_available"
+        )
+        params = [tsquery]
+        if specialization:
+            sql += " AND d.specialization = %s"
+            params.append(specialization)
+        sql += " ORDER BY ts_rank(s.document, to_tsquery('simple', %s)) DESC, s.doctor_id LIMIT %s"
+        params += [tsquery, limit]
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend():
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def create_search_table():
+    """
+    Create the search table if needed and fill it when it is empty
+    """
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.create_table(cursor)
+        cursor.execute(f"SELECT 1 FROM {TABLE} LIMIT 1")
+        if cursor.fetchone() is None:
+            backend.insert(cursor, list(_document_rows()))
+
+
+def index_doctors(doctor_ids):
+    """
+    Re-index the given doctors (dropping ones that no longer exist)
+    """
+    backend = get_backend()
+    doctor_ids = list(doctor_ids)
+    if backend is None or not doctor_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, doctor_ids)
+        backend.insert(cursor, list(_document_rows(doctor_ids)))
+
+
+def remove_doctors(doctor_ids):
+    backend = get_backend()
+    doctor_ids = list(doctor_ids)
+    if backend is None or not doctor_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, doctor_ids)
+
+
+def rebuild_search_index(batch_size=5000):
+    """
+    Re-index every doctor; returns the number indexed
+    """
+    backend = get_backend()
+    if backend is None:
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        backend.create_table(cursor)
+        backend.clear(cursor)
+        batch = []
+        for row in _document_rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                backend.insert(cursor, batch)
+                count += len(batch)
+                batch = []
+        backend.insert(cursor, batch)
+        count += len(batch)
+    return count
+
+
+def search_doctor_ids(query, limit=20, specialization=None):
+    """
+    Return the ids of available doctors matching query, best match first
+    """
+    words = query_words(query)
+    if not words:
+        return []
+
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            return backend.search(cursor, words, limit, specialization)
+
+    queryset = DoctorProfile.objects.filter(is_available=True)
+    if specialization:
+        queryset = queryset.filter(specialization=specialization)
+    for word in words:
+        queryset = queryset.filter(
+            Q(user_profile__user__first_name__icontains=word) |
+            Q(user_profile__user__last_name__icontains=word) |
+            Q(user_profile__user__username__icontains=word) |
+            Q(specialization__icontains=word) |
+            Q(bio__icontains=word)
+        )
+    return list(queryset.order_by('id').values_list('id', flat=True)[:limit])
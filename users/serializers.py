@@ -1,17 +1,21 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import UserProfile, DoctorProfile
+from appointments.fastpath import full_name_or_username
+from appointments.sparse import SparseFieldsMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
         read_only_fields = ['id']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+
+    expandable_fields = ('user',)
     
     class Meta:
         model = UserProfile
@@ -19,13 +23,22 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class DoctorProfileSerializer(serializers.ModelSerializer):
+class DoctorProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_profile = UserProfileSerializer(read_only=True)
     doctor_name = serializers.SerializerMethodField()
+
+    expandable_fields = ('user_profile',)
+    compiled_method_fields = {
+        'doctor_name': full_name_or_username('user_profile__user'),
+    }
     
     class Meta:
         model = DoctorProfile
         fields = '__all__'
+        read_only_fields = [
+            'rating_count', 'rating_sum', 'average_rating',
+            'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        ]
         
     def get_doctor_name(self, obj):
         return obj.user_profile.user.get_full_name() or obj.user_profile.user.username
@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .cache import user_cache
+from .models import UserProfile, DoctorProfile
+from .response_cache import bump_version
+from .search import create_search_table, index_doctors, remove_doctors
+
+SEARCHED_USER_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+def _invalidate(function, key):
+    # Drop now, and again after commit in case a concurrent request cached
+    # the old rows before this transaction committed.
+    function(key)
+    transaction.on_commit(lambda: function(key))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop a changed user from the authentication cache"""
+    _invalidate(user_cache.invalidate, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Drop the owner of a changed profile from the authentication cache"""
+    _invalidate(user_cache.invalidate, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=DoctorProfile)
+def invalidate_cached_doctor_profile(sender, instance, **kwargs):
+    """Drop the owner of a changed doctor profile from the authentication cache"""
+    _invalidate(user_cache.invalidate_profile, instance.user_profile_id)
+
+
+@receiver([post_save, post_delete], sender=DoctorProfile)
+def invalidate_directory_for_doctor_profile(sender, instance, **kwargs):
+    """Drop cached doctor directory responses"""
+    bump_version()
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_role(sender, instance, **kwargs):
+    """Remember the profile's role as loaded"""
+    instance._original_role = instance.__dict__.get('role')
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_directory_for_profile(sender, instance, **kwargs):
+    """
+    Drop cached doctor directory responses when a doctor's profile changes,
+    including a role change to or from DOCTOR
+    """
+    # Saving a User saves its profile too (users.models), so this also
+    # covers changes to a doctor's user row
+    if 'DOCTOR' in (instance.role, instance._original_role):
+        bump_version()
+    instance._original_role = instance.role
+
+
+@receiver(post_save, sender=DoctorProfile)
+def index_doctor_profile(sender, instance, raw=False, **kwargs):
+    """Re-index a saved doctor for search"""
+    if not raw:
+        index_doctors([instance.pk])
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def unindex_doctor_profile(sender, instance, **kwargs):
+    """Drop a deleted doctor from the search index"""
+    remove_doctors([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_doctor_user(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Re-index a doctor whose name may have changed"""
+    if created or raw or (update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields)):
+        return
+    index_doctors(DoctorProfile.objects.filter(user_profile__user=instance).values_list('id', flat=True))
+
+
+@receiver(post_migrate)
+def create_doctor_search_table(sender, using, **kwargs):
+    """Create (and fill) the doctor search index once the users tables exist"""
+    if sender.name == 'users':
+        create_search_table()
@@ -0,0 +1,138 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from appointments.models import Appointment, TimeSlot
+
+from .authentication import ClaimsRefreshToken
+from .cache import UserCache
+from .models import DoctorProfile
+from .response_cache import bump_version, get_version
+
+
+class DirectoryVersionTests(TestCase):
+    """
+    The directory version lives in the database, so a bump is shared by
+    every worker and takes effect with the change's transaction
+    """
+
+    def setUp(self):
+        caches['doctor_directory'].clear()
+        self.addCleanup(caches['doctor_directory'].clear)
+
+    def test_bump_is_atomic_with_the_change(self):
+        version = get_version()
+
+        with transaction.atomic():
+            bump_version()
+            self.assertEqual(get_version(), version + 1)
+            transaction.set_rollback(True)
+        self.assertEqual(get_version(), version)
+
+        bump_version()
+        self.assertEqual(get_version(), version + 1)
+
+    def test_doctor_change_refreshes_cached_responses(self):
+        user = User.objects.create_user('doctor', password='password')
+        doctor = DoctorProfile.objects.create(
+            user_profile=user.profile, specialization='GENERAL', license_number='LIC-1', bio='Before',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        token = ClaimsRefreshToken.for_user(User.objects.create_user('patient')).access_token
+        client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+        path = f'/api/users/doctors/{doctor.id}/availability/'
+        self.assertEqual(client.get(path)['X-Cache'], 'MISS')
+        self.assertEqual(client.get(path)['X-Cache'], 'HIT')
+
+        doctor.available_days = ['Tuesday']
+        doctor.save()
+
+        response = client.get(path)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['available_days'], ['Tuesday'])
+
+
+class UserCacheTests(TestCase):
+    """
+    Hits hand out copies the caller may modify, and a load overtaken by an
+    invalidation isn't stored
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('doctor', password='password')
+        DoctorProfile.objects.create(
+            user_profile=self.user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        self.cache = UserCache(ttl=60, max_entries=10)
+
+    def test_hits_are_private_copies(self):
+        self.cache.get(self.user.pk)
+
+        with self.assertNumQueries(0):
+            user = self.cache.get(self.user.pk)
+        self.assertIs(user.profile.user, user)
+        user.first_name = 'Changed'
+        user.profile.doctor_profile.available_days.append('Tuesday')
+
+        user = self.cache.get(self.user.pk)
+        self.assertEqual(user.first_name, '')
+        self.assertEqual(user.profile.doctor_profile.available_days, ['Monday'])
+
+    def test_load_overtaken_by_an_invalidation_is_not_stored(self):
+        load = self.cache._load
+
+        def invalidated_load(user_id):
+            user = load(user_id)
+            # The user is saved while the stale row is on its way back
+            self.cache.invalidate(user_id)
+            return user
+
+        self.cache._load = invalidated_load
+        self.assertEqual(self.cache.get(self.user.pk).pk, self.user.pk)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+        self.cache._load = load
+        self.cache.get(self.user.pk)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+
+class DoctorCalendarTests(TestCase):
+    """
+    A current calendar is answered with 304 from its validator alone, and a
+    booking in the range changes the ETag
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('doctor', password='password')
+        self.doctor = DoctorProfile.objects.create(
+            user_profile=user.profile, specialization='GENERAL', license_number='LIC-1',
+            available_days=['Monday'], available_time_start=time(9), available_time_end=time(17),
+        )
+        self.patient = User.objects.create_user('patient', password='password')
+        token = ClaimsRefreshToken.for_user(self.patient).access_token
+        self.client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.date = timezone.localdate() + timedelta(days=7)
+        self.path = f'/api/users/doctors/{self.doctor.id}/calendar/?start={self.date.isoformat()}'
+        TimeSlot.objects.create(doctor=self.doctor, date=self.date, start_time=time(10), end_time=time(10, 30))
+
+    def test_current_calendar_is_not_rebuilt(self):
+        etag = self.client.get(self.path)['ETag']
+
+        # The doctor, then the slot and appointment aggregates
+        with self.assertNumQueries(3):
+            response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=self.date,
+            appointment_time=time(10), status='PENDING',
+        )
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('B', ''.join(day['slots'] for day in response.json()['days']))
@@ -4,7 +4,7 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from .views import (
     UserRegistrationView, DoctorRegistrationView,
-    login_view, logout_view, current_user_view,
+    login_view, logout_view, current_user_view, auth_cache_stats_view,
     UserProfileViewSet, DoctorProfileViewSet
 )
 
@@ -20,6 +20,7 @@ urlpatterns = [
     path('logout/', logout_view, name='logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('me/', current_user_view, name='current-user'),
+    path('auth-cache/stats/', auth_cache_stats_view, name='auth-cache-stats'),
     
     # Router URLs
     path('', include(router.urls)),
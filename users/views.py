@@ -1,3 +1,6 @@
+from datetime import date as date_type, timedelta
+from functools import partial
+
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
@@ -5,6 +8,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.utils import timezone
 
 from .models import UserProfile, DoctorProfile
 from .serializers import (
@@ -12,7 +16,16 @@ from .serializers import (
     UserRegistrationSerializer, DoctorRegistrationSerializer,
     UserProfileUpdateSerializer
 )
+from .authentication import ClaimsRefreshToken, user_role
+from .cache import user_cache
 from .permissions import IsDoctor, IsAdmin, IsDoctorOrAdmin
+from .response_cache import DirectoryCacheMixin
+from .search import search_doctor_ids
+from appointments.availability import availability_index, get_slot_minutes
+from appointments.conditional import etag_matches
+from appointments.freebusy import ENCODINGS, LEGEND, calendar_etag, doctor_calendar
+from appointments.sparse import SparseFieldsViewMixin
+from appointments.streaming import NDJSONStreamMixin
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -29,7 +42,7 @@ class UserRegistrationView(generics.CreateAPIView):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'user': {
@@ -62,7 +75,7 @@ class DoctorRegistrationView(generics.CreateAPIView):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'user': {
@@ -103,7 +116,7 @@ def login_view(request):
         }, status=status.HTTP_401_UNAUTHORIZED)
 
     # Generate JWT tokens
-    refresh = RefreshToken.for_user(user)
+    refresh = ClaimsRefreshToken.for_user(user)
 
     return Response({
         'user': {
@@ -154,7 +167,16 @@ def current_user_view(request):
     }, status=status.HTTP_200_OK)
 
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def auth_cache_stats_view(request):
+    """
+    Hit/miss counters of the authenticated-user cache (Admin only)
+    """
+    return Response(user_cache.stats(), status=status.HTTP_200_OK)
+
+
+class UserProfileViewSet(SparseFieldsViewMixin, NDJSONStreamMixin, viewsets.ModelViewSet):
     """
     ViewSet for user profile operations
     """
@@ -167,9 +189,10 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         Filter queryset based on user role
         """
         user = self.request.user
-        if hasattr(user, 'profile') and user.profile.role == 'ADMIN':
-            return UserProfile.objects.all()
-        return UserProfile.objects.filter(user=user)
+        queryset = UserProfile.objects.select_related('user')
+        if user_role(user) == 'ADMIN':
+            return queryset
+        return queryset.filter(user_id=user.id)
 
     @action(detail=False, methods=['get'])
     def me(self, request):
@@ -198,7 +221,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         })
 
 
-class DoctorProfileViewSet(viewsets.ModelViewSet):
+class DoctorProfileViewSet(DirectoryCacheMixin, SparseFieldsViewMixin, NDJSONStreamMixin, viewsets.ModelViewSet):
     """
     ViewSet for doctor profile operations
     """
@@ -206,6 +229,12 @@ class DoctorProfileViewSet(viewsets.ModelViewSet):
     serializer_class = DoctorProfileSerializer
     permission_classes = [IsAuthenticated]
 
+    ORDERING_FIELDS = {
+        'rating': ['average_rating', 'rating_count', 'id'],
+        '-rating': ['-average_rating', '-rating_count', 'id'],
+    }
+    SEARCH_MAX_RESULTS = 100
+
     def get_queryset(self):
         """
         Filter available doctors
@@ -216,14 +245,53 @@ class DoctorProfileViewSet(viewsets.ModelViewSet):
         specialization = self.request.query_params.get('specialization', None)
         if specialization:
             queryset = queryset.filter(specialization=specialization)
+
+        # Order by the stored rating aggregates, e.g. ?ordering=-rating
+        ordering = self.request.query_params.get('ordering', None)
+        if ordering in self.ORDERING_FIELDS:
+            queryset = queryset.order_by(*self.ORDERING_FIELDS[ordering])
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        List available doctors, served from the directory cache
+        """
+        return self.cached_response(request, partial(super().list, request, *args, **kwargs))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search over doctors' names, specializations and bios,
+        best match first (?q=, optional ?specialization= and ?limit=)
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({
+                'error': 'Please provide a search query (q)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.SEARCH_MAX_RESULTS)
+        except ValueError:
+            limit = 20
+
+        ids = search_doctor_ids(query, limit, request.query_params.get('specialization'))
+        rank = {doctor_id: position for position, doctor_id in enumerate(ids)}
+        doctors = self.filter_queryset(
+            DoctorProfile.objects.select_related('user_profile__user').filter(id__in=ids)
+        )
+        doctors = sorted(doctors, key=lambda doctor: rank[doctor.id])
+        return Response(self.get_serializer(doctors, many=True).data)
+
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         """
-        Get doctor's availability schedule
+        Get doctor's availability schedule, served from the directory cache
         """
+        return self.cached_response(request, self.availability_response)
+
+    def availability_response(self):
         doctor = self.get_object()
         return Response({
             'doctor_id': doctor.id,
@@ -232,4 +300,72 @@ class DoctorProfileViewSet(viewsets.ModelViewSet):
             'available_time_start': doctor.available_time_start,
             'available_time_end': doctor.available_time_end,
             'is_available': doctor.is_available,
+        })
+
+    @action(detail=True, methods=['get'])
+    def calendar(self, request, pk=None):
+        """
+        Get a doctor's free/busy calendar for the week (?view=week, from
+        Monday) or month (?view=month) containing ?start= (default today),
+        one encoded string per day (?encoding=cells or rle)
+        """
+        doctor = self.get_object()
+        try:
+            start = date_type.fromisoformat(request.query_params['start']) \
+                if 'start' in request.query_params else timezone.localdate()
+        except ValueError:
+            return Response({
+                'error': 'Please provide a valid start date (YYYY-MM-DD)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        view = request.query_params.get('view', 'week')
+        encoding = request.query_params.get('encoding', 'cells')
+        if view not in ('week', 'month') or encoding not in ENCODINGS:
+            return Response({
+                'error': 'view must be week or month and encoding one of: ' + ', '.join(ENCODINGS)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if view == 'week':
+            start -= timedelta(days=start.weekday())
+            end = start + timedelta(days=6)
+        else:
+            start = start.replace(day=1)
+            end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+        # The validator is two aggregates; the calendar is only built on a miss
+        etag = calendar_etag(doctor, start, end, encoding)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            days = doctor_calendar(doctor, start, end, encoding)
+            response = Response({
+                'doctor_id': doctor.id,
+                'start': start,
+                'end': end,
+                'slot_minutes': get_slot_minutes(),
+                'encoding': encoding,
+                'legend': LEGEND,
+                'days': [{'date': date, 'slots': cells} for date, cells in days.items()],
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def free_slots(self, request, pk=None):
+        """
+        Get free appointment slots for a doctor on a given date
+        """
+        doctor = self.get_object()
+        try:
+            date = date_type.fromisoformat(request.query_params.get('date', ''))
+        except ValueError:
+            return Response({
+                'error': 'Please provide a valid date (YYYY-MM-DD)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'doctor_id': doctor.id,
+            'date': date,
+            'free_slots': availability_index.free_slots(doctor, date),
         })
\ No newline at end of file